@@ -0,0 +1,149 @@
+import collections
+import json
+import os
+import BRIDGEplate as bp
+
+"""
+BRIDGEadc - ADCplate sample rate table and acquisition planner
+srTable() reads the table ADC.srTable() prints and returns it as a list of
+SampleRate(index, rate, noise, enob) entries. Tables are cached per firmware
+revision, in memory and in CACHE_DIR, and BRIDGEplate.ADCrates is updated from
+them so read deadlines use the plate's own rates.
+
+plan() picks the quietest rate index that still meets a required scan rate (or
+a number of scans in a given time) for a set of inputs and predicts how long
+readSCAN, readBLOCK and stream reads take and whether a stream fits through the
+serial link. Plan.apply() configures the inputs, after which every ADC read gets
+a deadline that matches the plan.
+
+Usage:
+    from BRIDGEplate import *
+    import BRIDGEadc
+    for sr in BRIDGEadc.srTable(0):
+        print(sr.index, sr.rate, sr.noise, sr.enob)
+    p = BRIDGEadc.plan(0, ["S0", "S1", "D0"], rate=50)	#50 scans/s of three inputs
+    print(p)
+    p.apply()
+    ADC.startBLOCK(0, 500)
+    data = ADC.getBLOCK(0)				#waits p.blockTime(500) off the link, then reads
+"""
+
+SampleRate=collections.namedtuple("SampleRate", "index rate noise enob")
+CACHE_DIR=os.path.join(os.path.expanduser("~"), ".cache", "bridgeplate")
+_tables={}							#firmware revision -> [SampleRate]
+COLUMNS=(("rate", ("rate", "sps")), ("noise", ("noise",)), ("enob", ("enob", "bits", "resolution")))
+
+def parseSRTABLE(text):
+    """Parse the text printed by ADC.srTable() into a list of SampleRate ordered by index"""
+    columns=None
+    table=[]
+    for line in text.splitlines():
+        fields=line.replace(",", " ").split()
+        if not fields:
+            continue
+        if not fields[0].isdigit():
+            header=line.lower()
+            found=[]
+            for name, keys in COLUMNS:				#locate the columns by their titles
+                pos=[header.find(key) for key in keys if key in header]
+                if pos:
+                    found.append((min(pos), name))
+            if found:
+                columns=[name for pos, name in sorted(found)]
+            continue
+        try:
+            values=[float(f) for f in fields[1:]]
+        except ValueError:
+            continue
+        names=columns if columns and len(columns)<=len(values) else ["rate", "noise", "enob"]
+        entry=dict(zip(names, values))
+        table.append(SampleRate(int(fields[0]), entry.get("rate"), entry.get("noise"), entry.get("enob")))
+    if not table:
+        raise ValueError("no sample rate table found in srTable() output")
+    return sorted(table)
+
+def _cachePath(fw):
+    return os.path.join(CACHE_DIR, f"srtable-{fw}.json")
+
+def srTable(addr=0, refresh=False):
+    """Return the ADCplate sample rate table as [SampleRate], cached per firmware revision"""
+    fw=bp.ADC.getFWrev(addr)
+    table=None if refresh else _tables.get(fw)
+    if table is None and not refresh:
+        try:
+            with open(_cachePath(fw)) as f:
+                table=[SampleRate(*row) for row in json.load(f)]
+        except (OSError, ValueError, TypeError):
+            table=None
+    if table is None:
+        table=parseSRTABLE(bp.CMDblock("ADC.srTable"))
+        try:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            with open(_cachePath(fw), "w") as f:
+                json.dump([list(sr) for sr in table], f)
+        except OSError:
+            pass						#read-only home, keep the memory cache
+    _tables[fw]=table
+    if [sr.index for sr in table]==list(range(len(table))):
+        bp.ADCrates[:]=[sr.rate for sr in table]		#read deadlines follow the firmware's rates
+    return table
+
+class Plan:
+    def __init__(self, addr, channels, sr, scans):
+        self.addr=addr
+        self.channels=channels					#input numbers 0-15
+        self.index=sr.index					#rate index for configINPUT
+        self.rate=sr.rate					#conversions per second on each input
+        self.noise=sr.noise
+        self.enob=sr.enob
+        self.scans=scans
+        self.scanTime=len(channels)/sr.rate			#seconds per scan of all channels
+        self.scanRate=1/self.scanTime
+        self.link=self.scanRate*len(channels)*bp.VALUE_BYTES*bp.BYTE_TIME	#share of the serial link a stream needs
+
+    def __repr__(self):
+        return (f"Plan(addr={self.addr}, channels={self.channels}, index={self.index}, rate={self.rate} SPS, "
+                f"scanRate={self.scanRate:.4g}/s, duration={self.duration:.4g} s, link={self.link:.0%})")
+
+    @property
+    def duration(self):
+        """Predicted acquisition time of the planned number of scans, seconds"""
+        return self.blockTime(self.scans)
+
+    @property
+    def streamable(self):
+        """True when a stream at this rate fits through the serial link"""
+        return self.link<1.0
+
+    def blockTime(self, scans):
+        return scans*self.scanTime
+
+    def apply(self):
+        """Configure the inputs; ADC read deadlines follow from the tracked configuration"""
+        bp.ADC.setMODE(self.addr, "ADV")
+        cfg=bp._adc(self.addr)
+        for ch in range(16):
+            if ch in self.channels:
+                bp.ADC.configINPUT(self.addr, ch, self.index, 1)
+            elif cfg["enabled"][ch] is not False:		#enabled or not known to be off
+                bp.ADC.disableINPUT(self.addr, ch)
+        return self
+
+def plan(addr, channels, rate=None, duration=None, scans=1, table=None):
+    """Pick the quietest rate index giving at least rate scans/s of channels,
+    or scans scans within duration seconds. channels are 0-15 or 'S0'..'I3'."""
+    channels=sorted({bp._adcChannel(str(ch)) for ch in channels})
+    if not channels:
+        raise ValueError("no input channels given")
+    if rate is None:
+        if duration is None:
+            raise ValueError("give a scan rate or a duration")
+        rate=scans/duration
+    if table is None:
+        table=srTable(addr)
+    need=rate*len(channels)					#conversions per second
+    for sr in sorted(table, key=lambda sr: sr.rate):		#slower rates are quieter
+        if sr.rate>=need:
+            return Plan(addr, channels, sr, scans)
+    fastest=max(sr.rate for sr in table)/len(channels)
+    raise ValueError(f"{rate:.4g} scans/s of {len(channels)} inputs needs {need:.4g} SPS, at most {fastest:.4g} scans/s are possible")
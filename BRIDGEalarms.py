@@ -0,0 +1,155 @@
+import collections
+import sys
+import time
+try:
+    import numpy as np
+except ImportError:
+    print("Error: numpy package not found. Install with: pip install numpy")
+    sys.exit(1)
+import BRIDGEplate as bp
+
+"""
+BRIDGEalarms - alarms and interlocks evaluated on scan results
+An AlarmEngine holds high and low limit rules over the columns of a scan (the
+values of a getADCall(), getIall() or TagTable read, in a fixed order). evaluate()
+checks every rule at once with numpy: a rule raises when its value has been past
+the limit for its delay-on time and clears when it has been back inside the
+limit minus the hysteresis for its delay-off time. Latched rules stay raised
+until ack(). The state of all rules lives in numpy arrays.
+
+A rule's actions (plate commands such as "RELAY2.relayOFF(0,3)") are sent as soon
+as it raises, all in one pipelined window in the SAFETY priority class, so they
+go ahead of data transfers waiting for the link. The reaction time from the scan
+to the last action's acknowledgement is kept for stats(). Actions that time out
+are logged as "failed", passed to onFailure(rule names, error) and sent again on
+every evaluate() until they succeed or the rule changes state.
+
+Usage:
+    from BRIDGEplate import *
+    from BRIDGEtags import Tag, TagTable, linear
+    from BRIDGEalarms import AlarmEngine, Rule
+    table = TagTable([Tag("TT1", "CURRENT", 0, 1, linear(0, 150)), Tag("PT1", "CURRENT", 0, 2, linear(0, 10))])
+    engine = AlarmEngine(table.names, [
+        Rule("TT1 high", "TT1", "hi", 80.0, hysteresis=2.0, on=1.0, actions=["RELAY2.relayOFF(0,3)"]),
+        Rule("PT1 low", "PT1", "lo", 0.5, off=5.0, latch=True, actions=["DAQC2.clrDOUTbit(1,0)"]),
+    ])
+    while True:
+        t = time.monotonic()
+        values, status = table.read()
+        raised, cleared = engine.evaluate(values, t)	#also retries actions that timed out
+        print(engine.active(), engine.pending(), list(engine.log)[-3:], engine.stats())
+"""
+
+HI=1
+LO=-1
+HISTORY=1000							#reaction times kept for stats()
+
+class Rule:
+    def __init__(self, name, column, kind, limit, hysteresis=0.0, on=0.0, off=0.0, latch=False, actions=(), clear=()):
+        if kind not in ("hi", "lo"):
+            raise ValueError(f"rule {name}: kind is 'hi' or 'lo'")
+        self.name=name
+        self.column=column					#column name or index in the scan
+        self.sign=HI if kind=="hi" else LO
+        self.limit=limit
+        self.hysteresis=hysteresis				#clears only this far inside the limit
+        self.on=on						#seconds past the limit before raising
+        self.off=off						#seconds back inside before clearing
+        self.latch=latch					#stay raised until ack()
+        self.actions=list(actions)				#commands sent when raised
+        self.clear=list(clear)					#commands sent when cleared
+
+class AlarmEngine:
+    def __init__(self, columns, rules, onFailure=None):
+        self.columns=list(columns)
+        self.rules=list(rules)
+        self.names=[r.name for r in self.rules]
+        index={name: i for i, name in enumerate(self.columns)}
+        self.col=np.array([index.get(r.column, r.column) for r in self.rules], int)
+        self.sign=np.array([r.sign for r in self.rules], float)
+        self.limit=np.array([r.limit for r in self.rules], float)
+        self.hysteresis=np.array([r.hysteresis for r in self.rules], float)
+        self.on=np.array([r.on for r in self.rules], float)
+        self.off=np.array([r.off for r in self.rules], float)
+        self.latch=np.array([r.latch for r in self.rules], bool)
+        n=len(self.rules)
+        self.raised=np.zeros(n, bool)
+        self.acked=np.zeros(n, bool)				#latched alarm acknowledged
+        self.since=np.full(n, np.nan)				#start of the current excursion or return
+        self.log=collections.deque(maxlen=HISTORY)		#(t, rule name, "raise", "clear" or "failed")
+        self.reaction=collections.deque(maxlen=HISTORY)		#scan time to actions acknowledged, seconds
+        self.unsent={}						#rule index -> commands not yet acknowledged
+        self.onFailure=onFailure
+        self.failures=0
+        self.lastError=None
+
+    def evaluate(self, values, t=None):
+        """Check all rules against one scan taken at time.monotonic() t; return (raised, cleared) rule names"""
+        t=time.monotonic() if t is None else t
+        v=np.asarray(values, float)[self.col]
+        excess=self.sign*(v-self.limit)
+        beyond=excess>0
+        inside=excess<-self.hysteresis
+        valid=~np.isnan(v)					#a missing value changes nothing
+        hold=self.latch&~self.acked
+        moving=np.where(self.raised, inside&~hold, beyond)&valid	#heading for the other state
+        start=moving&np.isnan(self.since)
+        self.since[start]=t
+        self.since[~moving&valid]=np.nan
+        due=moving&(t-self.since>=np.where(self.raised, self.off, self.on))
+        up=np.flatnonzero(due&~self.raised)
+        down=np.flatnonzero(due&self.raised)
+        self.raised[up]=True
+        self.acked[up]=False
+        self.raised[down]=False
+        self.since[due]=np.nan
+        for i in up:
+            self.unsent[i]=self.rules[i].actions
+            self.log.append((t, self.names[i], "raise"))
+        for i in down:
+            self.unsent[i]=self.rules[i].clear		#replaces raise actions that never went out
+            self.log.append((t, self.names[i], "clear"))
+        if any(self.unsent.values()):
+            self._act(t)
+        return [self.names[i] for i in up], [self.names[i] for i in down]
+
+    def _act(self, t):
+        #Send the actions of every rule still waiting for them; keep them for the next scan on failure
+        rules=[i for i in self.unsent if self.unsent[i]]
+        try:
+            with bp.priority(bp.SAFETY):
+                bp.CMDS([cmd for i in rules for cmd in self.unsent[i]])
+        except bp.CMDtimeout as e:
+            self.failures+=1
+            self.lastError=e
+            names=[self.names[i] for i in rules]
+            for name in names:
+                self.log.append((t, name, "failed"))
+            if self.onFailure is not None:
+                self.onFailure(names, e)
+            return
+        self.unsent.clear()
+        self.reaction.append(time.monotonic()-t)
+
+    def pending(self):
+        """Rules whose actions have not been acknowledged yet"""
+        return [self.names[i] for i in self.unsent if self.unsent[i]]
+
+    def ack(self, name=None):
+        """Acknowledge a latched alarm (all if None); it clears once its value is back inside"""
+        sel=np.ones(len(self.rules), bool) if name is None else np.array([n==name for n in self.names])
+        self.acked|=sel&self.raised
+
+    def active(self):
+        return [self.names[i] for i in np.flatnonzero(self.raised)]
+
+    def stats(self):
+        """Reaction times (scan to actions acknowledged) of the last HISTORY alarms, seconds"""
+        r=np.array(list(self.reaction))
+        return {
+            "raised": int(self.raised.sum()),
+            "events": len(self.log),
+            "failures": self.failures,
+            "pending": len(self.pending()),
+            "reactionMean": float(r.mean()) if len(r) else None,
+            "reactionMax": float(r.max()) if len(r) else None}
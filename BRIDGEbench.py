@@ -0,0 +1,246 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+"""
+BRIDGEbench - performance benchmarks for BRIDGEplate.py
+Runs against the attached BRIDGEplate or, with --emulate, against a BRIDGEemulator
+pty. Measures:
+    latency.<PLATE>          median single-command round trip per plate class (ms)
+    polling.rate             commands/second under sustained polling
+    poll.discovery           POLL() time (s)
+    bulk.ADC.getBLOCK        block read throughput (samples/s)
+    bulk.ADC.getSTREAM       stream read throughput (samples/s)
+    bulk.DAQC2.getOSCtraces  oscilloscope trace throughput (samples/s)
+    parse.<N>                parseResp() cost on an N value response (us/value)
+    import                   time to import BRIDGEplate (s)
+Results are written as JSON and can be compared against an earlier run; the exit
+status is 1 when a metric regressed by more than the tolerance.
+
+Usage:
+    python BRIDGEbench.py --emulate --out new.json
+    python BRIDGEbench.py --out new.json --compare baseline.json --tolerance 0.15
+"""
+
+HERE=os.path.dirname(os.path.abspath(__file__))
+
+#Representative data read for each plate class, used for latency and polling rate
+READS={
+    "ADC": ("ADC", "getADC", (0,)),
+    "CURRENT": ("CURRENT", "getI", (1,)),
+    "DAQC": ("DAQC", "getADC", (0,)),
+    "DAQC2": ("DAQC2", "getADC", (0,)),
+    "DIGI": ("DIGI", "getDINall", ()),
+    "RELAY": ("RELAY", "relaySTATE", ()),
+    "RELAY2": ("RELAY2", "relaySTATE", ()),
+    "THERMO": ("THERMO", "getTEMP", (1, "c")),
+}
+SLOW=("THERMO",)						#plates whose reads take most of a second
+
+def _stats(samples):
+    samples=sorted(samples)
+    return {
+        "median": statistics.median(samples),
+        "p95": samples[min(len(samples)-1, int(0.95*len(samples)))],
+        "mean": statistics.fmean(samples),
+        "n": len(samples),
+    }
+
+def _repeat(fn, reps, budget):
+    #Time fn() up to reps times or until budget seconds have passed (at least 3 runs)
+    samples=[]
+    start=time.perf_counter()
+    while len(samples)<reps and (len(samples)<3 or time.perf_counter()-start<budget):
+        t=time.perf_counter()
+        fn()
+        samples.append(time.perf_counter()-t)
+    return samples
+
+class Bench:
+    def __init__(self, bp, reps=200, budget=5.0):
+        self.bp=bp
+        self.reps=reps
+        self.budget=budget
+        self.results={}
+        self.plates={}
+
+    def record(self, name, value, unit, better, **extra):
+        self.results[name]=dict(value=value, unit=unit, better=better, **extra)
+        print(f"{name:28s} {value:14.4f} {unit}")
+
+    def discover(self):
+        for name in READS:
+            for addr in range(8):
+                resp=self.bp._probe(f"{name}.getADDR({addr})")	#same timeout and resync handling as POLL()
+                if resp[:1]==str(addr):
+                    self.plates[name]=addr
+                    break
+        return self.plates
+
+    def read(self, name):
+        plate, func, args=READS[name]
+        return getattr(getattr(self.bp, plate), func)(self.plates[name], *args)
+
+    def latency(self):
+        for name in self.plates:
+            reps=5 if name in SLOW else self.reps
+            s=_stats(_repeat(lambda: self.read(name), reps, self.budget))
+            self.record("latency."+name, s["median"]*1e3, "ms", "lower", p95=s["p95"]*1e3, n=s["n"])
+
+    def polling(self):
+        fast=[name for name in self.plates if name not in SLOW]
+        if not fast:
+            return
+        n=0
+        start=time.perf_counter()
+        while time.perf_counter()-start<self.budget:
+            for name in fast:
+                self.read(name)
+            n+=len(fast)
+        self.record("polling.rate", n/(time.perf_counter()-start), "cmd/s", "higher")
+
+    def discovery(self):
+        def poll():
+            with contextlib.redirect_stdout(io.StringIO()):
+                self.bp.POLL()
+        s=_stats(_repeat(poll, 3, self.budget))
+        self.record("poll.discovery", s["median"], "s", "lower")
+
+    def adcBlock(self, rate, channels, scans):
+        if "ADC" not in self.plates:
+            return
+        ADC=self.bp.ADC
+        addr=self.plates["ADC"]
+        ADC.setMODE(addr, "ADV")
+        for ch in range(channels):
+            ADC.configINPUT(addr, ch, rate, 1)
+        def block():
+            ADC.startBLOCK(addr, scans)
+            return ADC.getBLOCK(addr)
+        samples=0
+        start=time.perf_counter()
+        while samples==0 or time.perf_counter()-start<self.budget:
+            data=block()
+            samples+=len(data) if isinstance(data, list) else 1
+        self.record("bulk.ADC.getBLOCK", samples/(time.perf_counter()-start), "samples/s", "higher")
+        samples=0
+        ADC.startSTREAM(addr)
+        start=time.perf_counter()
+        while time.perf_counter()-start<self.budget:
+            data=ADC.getSTREAM(addr)
+            samples+=len(data) if isinstance(data, list) else (0 if data=="" else 1)
+        ADC.stopSTREAM(addr)
+        self.record("bulk.ADC.getSTREAM", samples/(time.perf_counter()-start), "samples/s", "higher")
+        ADC.initADC(addr)
+
+    def oscTraces(self, sweep):
+        if "DAQC2" not in self.plates:
+            return
+        DAQC2=self.bp.DAQC2
+        addr=self.plates["DAQC2"]
+        DAQC2.startOSC(addr)
+        DAQC2.setOSCchannel(addr, 1, 1)
+        DAQC2.setOSCsweep(addr, sweep)
+        samples=0
+        start=time.perf_counter()
+        while samples==0 or time.perf_counter()-start<self.budget:
+            DAQC2.runOSC(addr)
+            samples+=len(DAQC2.getOSCtraces(addr))
+        DAQC2.stopOSC(addr)
+        self.record("bulk.DAQC2.getOSCtraces", samples/(time.perf_counter()-start), "samples/s", "higher")
+
+    def parse(self):
+        for n in (16, 1024, 8192):
+            line=",".join(f"{0.001*i:.6f}" for i in range(n))
+            s=_stats(_repeat(lambda: self.bp.parseResp(line), 50, self.budget))
+            self.record(f"parse.{n}", s["median"]/n*1e6, "us/value", "lower")
+
+    def importTime(self):
+        code="import time;t=time.perf_counter();import BRIDGEplate;print(time.perf_counter()-t)"
+        runs=[]
+        for i in range(3):
+            out=subprocess.run([sys.executable, "-c", code], cwd=HERE, capture_output=True, text=True)
+            runs.append(float(out.stdout.strip().splitlines()[-1]))
+        self.record("import", min(runs), "s", "lower")
+
+def compare(old, new, tolerance):
+    """Return [(metric, old value, new value, change)] for metrics that got worse by more than tolerance"""
+    regressions=[]
+    for name, cur in new["results"].items():
+        ref=old["results"].get(name)
+        if ref is None or not ref["value"]:
+            continue
+        change=(cur["value"]-ref["value"])/ref["value"]
+        if cur["better"]=="higher":
+            change=-change
+        flag="REGRESSION" if change>tolerance else ""
+        print(f"{name:28s} {ref['value']:14.4f} -> {cur['value']:14.4f} {cur['unit']:10s} {change:+8.1%} {flag}")
+        if change>tolerance:
+            regressions.append((name, ref["value"], cur["value"], change))
+    return regressions
+
+def run(opts):
+    sys.path.insert(0, HERE)
+    emu=None
+    with contextlib.redirect_stdout(io.StringIO()):
+        import BRIDGEplate as bp
+    if opts.emulate:
+        from BRIDGEemulator import Emulator
+        emu=Emulator(speed=opts.speed)
+        emu.connect()
+    elif not bp.matches:
+        print("No BRIDGEplate found, use --emulate to benchmark against the emulator")
+        sys.exit(2)
+    bench=Bench(bp, opts.reps, opts.budget)
+    print("Plates:", bench.discover())
+    bench.latency()
+    bench.polling()
+    bench.discovery()
+    bench.adcBlock(opts.adc_rate, opts.adc_channels, opts.adc_scans)
+    bench.oscTraces(opts.osc_sweep)
+    bench.parse()
+    bench.importTime()
+    if emu is not None:
+        emu.stop()
+    return {
+        "meta": {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "transport": f"emulator(speed={opts.speed})" if opts.emulate else bp.matches,
+            "plates": bench.plates,
+        },
+        "results": bench.results,
+    }
+
+if __name__ == "__main__":
+    parser=argparse.ArgumentParser(description="BRIDGEplate benchmark suite")
+    parser.add_argument("--emulate", action="store_true", help="benchmark against BRIDGEemulator instead of hardware")
+    parser.add_argument("--speed", type=float, default=1.0, help="emulator latency scale (0 = no simulated delays)")
+    parser.add_argument("--reps", type=int, default=200, help="repetitions per latency benchmark")
+    parser.add_argument("--budget", type=float, default=3.0, help="seconds spent per benchmark")
+    parser.add_argument("--adc-rate", type=int, default=15, help="ADC sample rate index for bulk reads")
+    parser.add_argument("--adc-channels", type=int, default=4, help="ADC inputs enabled for bulk reads")
+    parser.add_argument("--adc-scans", type=int, default=256, help="scans per ADC block")
+    parser.add_argument("--osc-sweep", type=int, default=12, help="DAQC2 oscilloscope sweep rate index")
+    parser.add_argument("--out", help="write results to this JSON file")
+    parser.add_argument("--compare", help="baseline JSON file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed fractional regression")
+    opts=parser.parse_args()
+    result=run(opts)
+    if opts.out:
+        with open(opts.out, "w") as f:
+            json.dump(result, f, indent=2)
+    if opts.compare:
+        with open(opts.compare) as f:
+            baseline=json.load(f)
+        print()
+        if compare(baseline, result, opts.tolerance):
+            sys.exit(1)
@@ -0,0 +1,171 @@
+import collections
+import math
+import sys
+import threading
+import time
+try:
+    import numpy as np
+except ImportError:
+    print("Error: numpy package not found. Install with: pip install numpy")
+    sys.exit(1)
+import BRIDGEplate as bp
+
+"""
+BRIDGEcontrol - fixed rate closed loop control on DAQC/DAQC2 plates
+A ControlEngine runs its registered loops on a drift-free schedule: cycle k starts
+at start+k*period on time.monotonic(), however long earlier cycles took. Each
+cycle reads the inputs of every loop that is due with one pipelined window of
+getADC() commands, runs the controllers and writes all setDAC()/setPWM() outputs
+with a second window, so a cycle costs two round trips whatever the number of
+loops. A cycle that runs past the next start is an overrun; the latest start
+that has passed then runs at once and any earlier missed starts are skipped, so
+late cycles never pile up.
+
+stats() reports the achieved period, start jitter (actual minus scheduled
+start), overruns and actuation latency (input read to output acknowledged).
+
+Usage:
+    from BRIDGEplate import *
+    from BRIDGEcontrol import ControlEngine, Loop, PID
+    engine = ControlEngine(period=0.05)
+    engine.add(Loop("oven", "DAQC2", 0, 0, "DAC", 0, PID(1.2, 0.4, 0.0), setpoint=2.5))
+    engine.add(Loop("fan", "DAQC2", 0, 1, "PWM", 0, PID(20, 5, 0), setpoint=1.0, every=4))
+    engine.start()
+    engine.loops["oven"].setpoint=3.0
+    print(engine.stats())
+    engine.stop()
+"""
+
+OUTPUTS={							#output range of each plate and kind
+    ("DAQC", "DAC"): (0.0, 4.095),
+    ("DAQC", "PWM"): (0, 1023),
+    ("DAQC2", "DAC"): (0.0, 4.095),
+    ("DAQC2", "PWM"): (0.0, 100.0)}
+HISTORY=1000							#cycles kept for stats()
+
+class PID:
+    def __init__(self, kp, ki=0.0, kd=0.0):
+        self.kp=kp
+        self.ki=ki
+        self.kd=kd
+        self.integral=0.0
+        self.last=None						#previous process value
+
+    def __call__(self, setpoint, pv, dt, lo, hi):
+        """Output for process value pv, clamped to lo..hi (no integration while clamped)"""
+        err=setpoint-pv
+        deriv=0.0 if self.last is None or dt<=0 else -(pv-self.last)/dt	#on the measurement: no setpoint kick
+        self.last=pv
+        integral=self.integral+err*dt
+        out=self.kp*err+self.ki*integral+self.kd*deriv
+        if lo<out<hi:
+            self.integral=integral
+        return min(max(out, lo), hi)
+
+class Loop:
+    def __init__(self, name, plate, addr, input, kind, output, controller, setpoint=0.0, every=1, limits=None):
+        if (plate, kind) not in OUTPUTS:
+            raise ValueError(f"no {kind} outputs on {plate}")
+        self.name=name
+        self.plate=plate					#"DAQC" or "DAQC2"
+        self.addr=addr
+        self.input=input					#getADC() channel
+        self.kind=kind						#"DAC" or "PWM"
+        self.output=output					#setDAC()/setPWM() channel
+        self.controller=controller				#called (setpoint, pv, dt, lo, hi) -> output
+        self.setpoint=setpoint
+        self.every=every					#run every n-th engine cycle
+        self.limits=limits or OUTPUTS[(plate, kind)]
+        self.pv=None						#last process value
+        self.out=None						#last output
+        self.lastRun=None
+
+    def read(self):
+        return f"{self.plate}.getADC({self.addr},{self.input})"
+
+    def write(self):
+        value=round(self.out) if self.plate=="DAQC" and self.kind=="PWM" else round(self.out, 4)
+        return f"{self.plate}.set{self.kind}({self.addr},{self.output},{value})"
+
+class ControlEngine:
+    def __init__(self, period):
+        self.period=period					#seconds per cycle
+        self.loops={}
+        self.cycles=0
+        self.overruns=0
+        self.errors=0
+        self.lastError=None
+        self.starts=collections.deque(maxlen=HISTORY)		#actual cycle starts
+        self.jitter=collections.deque(maxlen=HISTORY)		#actual minus scheduled start, seconds
+        self.latency=collections.deque(maxlen=HISTORY)		#input read to outputs acknowledged, seconds
+        self.stopEvent=threading.Event()
+        self.thread=None
+
+    def add(self, loop):
+        self.loops[loop.name]=loop
+        return loop
+
+    def start(self):
+        self.stopEvent.clear()
+        self.thread=threading.Thread(target=self._run, name="BRIDGEcontrol", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopEvent.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread=None
+
+    def _run(self):
+        start=time.monotonic()
+        k=0
+        while True:
+            due=start+k*self.period
+            if self.stopEvent.wait(max(due-time.monotonic(), 0.0)):
+                break
+            now=time.monotonic()
+            self.starts.append(now)
+            self.jitter.append(now-due)
+            try:
+                self.cycle(k, now)
+            except (bp.CMDtimeout, ValueError) as e:
+                self.errors+=1
+                self.lastError=e
+            self.cycles+=1
+            late=math.floor((time.monotonic()-start)/self.period)	#last start that has passed
+            if late>k:
+                self.overruns+=1
+                k=late
+            else:
+                k+=1
+
+    def cycle(self, k, now):
+        """Read, compute and write the loops due in cycle k"""
+        loops=[loop for loop in list(self.loops.values()) if k%loop.every==0]
+        if not loops:
+            return
+        resps=bp.CMDS([loop.read() for loop in loops])
+        read=time.monotonic()
+        for loop, resp in zip(loops, resps):
+            loop.pv=float(bp.parseResp(resp))
+            dt=0.0 if loop.lastRun is None else now-loop.lastRun
+            loop.lastRun=now
+            loop.out=loop.controller(loop.setpoint, loop.pv, dt, *loop.limits)
+        bp.CMDS([loop.write() for loop in loops])
+        self.latency.append(time.monotonic()-read)
+
+    def stats(self):
+        """Achieved period, start jitter and actuation latency over the last HISTORY cycles, seconds"""
+        starts=np.array(list(self.starts))
+        jitter=np.array(list(self.jitter))
+        latency=np.array(list(self.latency))
+        return {
+            "cycles": self.cycles,
+            "overruns": self.overruns,
+            "errors": self.errors,
+            "period": float(np.mean(np.diff(starts))) if len(starts)>1 else None,
+            "jitterMean": float(jitter.mean()) if len(jitter) else None,
+            "jitterMax": float(jitter.max()) if len(jitter) else None,
+            "latencyMean": float(latency.mean()) if len(latency) else None,
+            "latencyMax": float(latency.max()) if len(latency) else None}
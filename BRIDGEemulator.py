@@ -0,0 +1,1030 @@
+import math
+import os
+import random
+import select
+import sys
+import threading
+import time
+try:
+    import tty
+except ImportError:
+    print("Error: BRIDGEemulator needs a POSIX pseudo-terminal (Linux or macOS)")
+    sys.exit(1)
+
+"""
+Emulator - a simulated BRIDGEplate on a pseudo-terminal
+Opens a pty and answers the BRIDGEplate line protocol on it: one command line in,
+one value line out ("ADC.getADC(0, 1)\\n" -> "2.50012\\r\\n"), and
+"<<<END>>>"-terminated text blocks for help() and srTable(). A configurable stack
+of ADC/DAQC/DAQC2/CURRENT/DIGI/RELAY/RELAY2/THERMO plates is simulated, each with
+per-command latencies modelled on the real hardware (scaled by speed; 0 answers
+as fast as possible). Inputs are driven by deterministic test signals.
+
+Usage:
+    from BRIDGEplate import *
+    from BRIDGEemulator import Emulator
+    emu = Emulator({"ADC":[0], "DAQC2":[0,1], "RELAY":[2], "THERMO":[0]})
+    emu.start()
+    emu.connect()			#same as openPORT(emu.port)
+    POLL()
+    ...
+    emu.stop()
+
+From a shell (prints the pty path to open with openPORT()):
+    python BRIDGEemulator.py ADC:0 DAQC2:0,1 RELAY:2 --speed 0
+"""
+
+BASE_LATENCY=0.0015						#USB round trip plus plate bus transfer, seconds
+BYTE_TIME=10/115200						#serial time per response byte
+
+#ADCplate sample rate table: index, samples/sec, noise (uV rms), effective resolution (bits)
+SR_TABLE=[
+    (0, 1.25, 0.07, 23.9), (1, 2.5, 0.10, 23.6), (2, 5, 0.14, 23.1), (3, 10, 0.20, 22.6),
+    (4, 16.63, 0.26, 22.2), (5, 20.01, 0.29, 22.1), (6, 49.68, 0.45, 21.4), (7, 59.52, 0.49, 21.3),
+    (8, 100.2, 0.64, 20.9), (9, 200.3, 0.91, 20.4), (10, 381, 1.25, 19.9), (11, 503.8, 1.45, 19.7),
+    (12, 1007, 2.0, 19.2), (13, 2597, 3.2, 18.6), (14, 5208, 4.6, 18.0), (15, 10417, 6.8, 17.5),
+    (16, 15625, 8.5, 17.2), (17, 31250, 12.0, 16.7),
+]
+ADC_MODES={"SLOW": 4, "MED": 9, "FAST": 13}			#legacy modes and the rate index they use
+OSC_SWEEP=[100, 200, 500, 1000, 2000, 5000, 10000, 20000, 50000, 100000, 200000, 500000, 1000000]
+OSC_DEPTH=1024							#samples per trace
+
+#DAQC2 getINTflags() bits
+INT_MOTOR1=0x0100
+INT_MOTOR2=0x0200
+INT_OSC=0x0400
+
+PLATE_NAMES=("ADC", "CURRENT", "DAQC", "DAQC2", "DIGI", "RELAY", "RELAY2", "THERMO")
+
+class EmulatorError(Exception):
+    pass
+
+def _signal(t, ch, lo=-1.0, hi=1.0):
+    #Deterministic per-channel test waveform with a little noise
+    f=0.5+0.37*ch
+    mid=(hi+lo)/2
+    amp=(hi-lo)/2*0.8
+    return mid+amp*math.sin(2*math.pi*f*t+ch)+random.gauss(0, amp*0.001)
+
+def _scale(c, scale):
+    scale=str(scale).lower()
+    if scale=="f":
+        return c*9/5+32
+    if scale=="k":
+        return c+273.15
+    return c
+
+TC_RAW_MV=256.0/2**15						#mV per getRAW() count: signed 16-bit ADC, +/-256 mV full scale
+TC_EMF={							#NIST ITS-90 type J (-210..760 C) and K (0..1372 C) EMF polynomials
+    "j": (0.0, 5.0381187815e-2, 3.0475836930e-5, -8.5681065720e-8, 1.3228195295e-10,
+          -1.7052958337e-13, 2.0948090697e-16, -1.2538395336e-19, 1.5631725697e-23),
+    "k": (-1.7600413686e-2, 3.8921204975e-2, 1.8558770032e-5, -9.9457592874e-8, 3.1840945719e-10,
+          -5.6072844889e-13, 5.6075059059e-16, -3.2020720003e-19, 9.7151147152e-23, -1.2104721275e-26)}
+
+def _tcMV(c, tcType):
+    #Thermocouple EMF (mV) relative to 0 C; the simulated temperatures stay above 0 C
+    e=sum(a*c**i for i, a in enumerate(TC_EMF[tcType]))
+    if tcType=="k":
+        e+=0.1185976*math.exp(-1.183432e-4*(c-126.9686)**2)
+    return e
+
+class Plate:
+    name="PLATE"
+    latency={}							#per command latency override, seconds
+
+    def __init__(self, emu, addr):
+        self.emu=emu
+        self.addr=addr
+        self.led=0
+        self.intFlags=0
+        self.intEnabled=False
+
+    def _now(self):
+        return time.monotonic()-self.emu.t0
+
+    def _srq(self):
+        return self.intEnabled and self.intFlags!=0
+
+    def _delay(self, cmd, args):
+        return self.latency.get(cmd, 0.0)
+
+    def getADDR(self):
+        return self.addr
+
+    def getID(self):
+        return "Pi-Plate "+self.name
+
+    def getHWrev(self):
+        return 1.0
+
+    def getFWrev(self):
+        return 1.2
+
+    def setLED(self, *color):
+        self.led=1 if not color else color[0]
+
+    def clrLED(self):
+        self.led=0
+
+    def toggleLED(self):
+        self.led=0 if self.led else 1
+
+    def getLED(self):
+        return self.led
+
+    def getINTflags(self):
+        flags=self.intFlags
+        self.intFlags=0
+        return flags
+
+    def intEnable(self):
+        self.intEnabled=True
+
+    def intDisable(self):
+        self.intEnabled=False
+
+    intENABLE=intEnable
+    intDISABLE=intDisable
+
+class ADCplate(Plate):
+    name="ADC"
+
+    def __init__(self, emu, addr):
+        super().__init__(emu, addr)
+        self.initADC()
+
+    def initADC(self):
+        self.mode="MED"
+        self.rates=[ADC_MODES["MED"]]*16
+        self.enabled=[False]*16
+        self.pending=None					#(ready time, values) for startSINGLE/startSCAN
+        self.block=[]
+        self.blockTarget=0
+        self.blockStart=0.0
+        self.streaming=False
+        self.streamT=0.0
+        self.trig=None
+        self.trigFreq=0.0
+        self.trigStart=0.0
+        self.trigFired=0
+        self.events=False
+        self.din=0
+
+    def _value(self, ch, t=None):
+        t=self._now() if t is None else t
+        if ch<8:
+            return round(_signal(t, ch, 0.0, 5.0), 6)
+        if ch<12:
+            return round(_signal(t, ch, -5.0, 5.0), 6)
+        return round(_signal(t, ch, 4.0, 20.0), 4)
+
+    def _convTime(self, ch):
+        if self.mode!="ADV":
+            return 1/SR_TABLE[ADC_MODES[self.mode]][1]
+        return 1/SR_TABLE[self.rates[ch]][1]
+
+    def _scanList(self):
+        return [ch for ch in range(16) if self.enabled[ch]]
+
+    def _scanTime(self):
+        return sum(self._convTime(ch) for ch in self._scanList()) or 1/SR_TABLE[-1][1]
+
+    def _scan(self, t=None):
+        return [self._value(ch, t) for ch in self._scanList()]
+
+    def _delay(self, cmd, args):
+        if cmd in ("getADC", "readSINGLE"):
+            return self._convTime(_adcChannel(args[1]))
+        if cmd=="getADCall":
+            return sum(self._convTime(ch) for ch in range(12))
+        if cmd=="getSall":
+            return sum(self._convTime(ch) for ch in range(8))
+        if cmd in ("getDall", "getIall"):
+            return sum(self._convTime(ch) for ch in range(8, 12))
+        if cmd=="readSCAN":
+            return self._scanTime()
+        if cmd in ("getSINGLE", "getSCAN") and self.pending:
+            return max(0.0, self.pending[0]-self._now())
+        if cmd=="getBLOCK" and self.blockTarget and self.trig is None:
+            return max(0.0, self.blockStart+self.blockTarget*self._scanTime()-self._now())
+        return 0.0
+
+    def getADC(self, ch):
+        return self._value(_adcChannel(ch))
+
+    def getADCall(self):
+        return [self._value(ch) for ch in range(12)]
+
+    def getSall(self):
+        return [self._value(ch) for ch in range(8)]
+
+    def getDall(self):
+        return [self._value(ch) for ch in range(8, 12)]
+
+    def getIall(self):
+        return [self._value(ch) for ch in range(12, 16)]
+
+    def setMODE(self, mode):
+        mode=str(mode).upper()
+        if mode not in ADC_MODES and mode!="ADV":
+            raise EmulatorError("invalid mode")
+        self.mode=mode
+
+    def getMODE(self):
+        return self.mode
+
+    def configINPUT(self, ch, rate, enable=1):
+        ch=_adcChannel(ch)
+        rate=int(rate)
+        if not 0<=rate<len(SR_TABLE):
+            raise EmulatorError("invalid sample rate index")
+        self.rates[ch]=rate
+        self.enabled[ch]=bool(enable)
+
+    def enableINPUT(self, ch):
+        self.enabled[_adcChannel(ch)]=True
+
+    def disableINPUT(self, ch):
+        self.enabled[_adcChannel(ch)]=False
+
+    def readSINGLE(self, ch):
+        return self._value(_adcChannel(ch))
+
+    def startSINGLE(self, ch):
+        ch=_adcChannel(ch)
+        self.pending=(self._now()+self._convTime(ch), [self._value(ch)])
+
+    def getSINGLE(self):
+        if not self.pending:
+            raise EmulatorError("no conversion started")
+        values=self.pending[1][0]
+        self.pending=None
+        return values
+
+    def readSCAN(self):
+        return self._scan()
+
+    def startSCAN(self):
+        self.pending=(self._now()+self._scanTime(), self._scan())
+
+    def getSCAN(self):
+        if not self.pending:
+            raise EmulatorError("no scan started")
+        values=self.pending[1]
+        self.pending=None
+        return values
+
+    def startBLOCK(self, num):
+        self.blockTarget=int(num)
+        self.blockStart=self._now()
+        self.block=[]
+
+    def getBLOCK(self):
+        if not self.blockTarget:
+            raise EmulatorError("no block started")
+        if self.trig is None:
+            st=self._scanTime()
+            scans=[self._scan(self.blockStart+i*st) for i in range(self.blockTarget)]
+        else:
+            self._fireTriggers()
+            scans=self.block[:self.blockTarget]
+        self.blockTarget=0
+        return [v for s in scans for v in s]
+
+    def startSTREAM(self, *args):
+        self.streaming=True
+        self.streamT=self._now()
+
+    def getSTREAM(self):
+        if not self.streaming:
+            raise EmulatorError("stream not started")
+        st=self._scanTime()
+        now=self._now()
+        n=min(int((now-self.streamT)/st), 1024)
+        out=[]
+        for i in range(n):
+            out.extend(self._scan(self.streamT+i*st))
+        self.streamT+=n*st if n<1024 else now-self.streamT
+        return out
+
+    def stopSTREAM(self):
+        self.streaming=False
+
+    def getDINbit(self, bit):
+        return (self.din>>int(bit))&1
+
+    def getDINall(self):
+        return self.din
+
+    def enableDINevent(self, *args):
+        pass
+
+    def disableDINevent(self, *args):
+        pass
+
+    def configTRIG(self, source="sw", edge="r"):
+        self.trig=str(source).lower()
+
+    def triggerFREQ(self, freq):
+        freq=float(freq)
+        if freq>self.maxTRIGfreq():
+            raise EmulatorError("trigger frequency too high")
+        self.trigFreq=freq
+
+    def maxTRIGfreq(self):
+        return round(1/self._scanTime(), 3)
+
+    def startTRIG(self):
+        if self.trig is None:
+            raise EmulatorError("trigger not configured")
+        self.trigStart=self._now()
+        self.trigFired=0
+
+    def stopTRIG(self):
+        self._fireTriggers()
+        self.trigFreq=0.0
+
+    def _fireTriggers(self):
+        #Hardware/timer triggers are generated from the shared emulator clock so plates stay aligned
+        if self.trig is None or not self.trigFreq or not self.blockTarget:
+            return
+        n=int((self._now()-self.trigStart)*self.trigFreq)
+        while self.trigFired<n and len(self.block)<self.blockTarget:
+            self.block.append(self._scan(self.trigStart+self.trigFired/self.trigFreq))
+            self.trigFired+=1
+
+    def swTRIGGER(self):
+        if self.blockTarget and len(self.block)<self.blockTarget:
+            self.block.append(self._scan())
+
+    def enableEVENTS(self):
+        self.events=True
+
+    def disableEVENTS(self):
+        self.events=False
+
+    def check4EVENTS(self):
+        return 0
+
+    def getEVENTS(self):
+        return 0
+
+def srTableText():
+    lines=["ADCplate Sample Rate Table", "Index   Rate(SPS)   Noise(uVrms)   ENOB"]
+    for idx, rate, noise, enob in SR_TABLE:
+        lines.append(f"{idx:5d}   {rate:9.2f}   {noise:12.2f}   {enob:4.1f}")
+    return "\n".join(lines)
+
+def _adcChannel(ch):
+    #Accept 0-15 or the 'S0'..'S7', 'D0'..'D3', 'I0'..'I3' input names
+    if isinstance(ch, str):
+        kind=ch[:1].upper()
+        ch=int(ch[1:])+{"S": 0, "D": 8, "I": 12}[kind]
+    ch=int(ch)
+    if not 0<=ch<16:
+        raise EmulatorError("invalid channel")
+    return ch
+
+class CURRENTplate(Plate):
+    name="CURRENT"
+
+    def getI(self, ch):
+        ch=int(ch)
+        if not 1<=ch<=8:
+            raise EmulatorError("invalid channel")
+        return round(_signal(self._now(), ch, 4.0, 20.0), 4)
+
+    def getIall(self):
+        return [self.getI(ch) for ch in range(1, 9)]
+
+class DAQCplate(Plate):
+    name="DAQC"
+    latency={"getTEMP": 1.0, "getRANGE": 0.03}
+    douts=7
+    adcMax=4.095
+
+    def __init__(self, emu, addr):
+        super().__init__(emu, addr)
+        self.dout=0
+        self.pwm=[0, 0]
+        self.dac=[0.0]*4
+        self.dinInt=0
+
+    def getADC(self, ch):
+        ch=int(ch)
+        if ch==8:
+            return 5.0
+        if not 0<=ch<8:
+            raise EmulatorError("invalid channel")
+        return round(_signal(self._now(), ch, 0.0, self.adcMax), 4)
+
+    def getADCall(self):
+        return [self.getADC(ch) for ch in range(8)]
+
+    def getDINbit(self, bit):
+        return (self.getDINall()>>int(bit))&1
+
+    def getDINall(self):
+        return int(self._now()*2)&0xFF
+
+    def enableDINint(self, bit, edge="b"):
+        self.dinInt|=1<<int(bit)
+
+    def disableDINint(self, bit):
+        self.dinInt&=~(1<<int(bit))
+
+    def getTEMP(self, bit, scale="c"):
+        return round(_scale(21.5+0.1*int(bit), scale), 3)
+
+    def setDOUTbit(self, bit):
+        self.dout|=1<<int(bit)
+
+    def clrDOUTbit(self, bit):
+        self.dout&=~(1<<int(bit))
+
+    def toggleDOUTbit(self, bit):
+        self.dout^=1<<int(bit)
+
+    def setDOUTall(self, value):
+        value=int(value)
+        if not 0<=value<(1<<self.douts):
+            raise EmulatorError("invalid value")
+        self.dout=value
+
+    def getDOUTbyte(self):
+        return self.dout
+
+    def setPWM(self, ch, value):
+        self.pwm[int(ch)]=float(value)
+
+    def getPWM(self, ch):
+        return self.pwm[int(ch)]
+
+    def setDAC(self, ch, value):
+        self.dac[int(ch)]=float(value)
+
+    def getDAC(self, ch):
+        return self.dac[int(ch)]
+
+    def getRANGE(self, ch, units="c"):
+        d=50.0+10*math.sin(self._now())
+        return round(d/2.54 if str(units).lower()=="i" else d, 2)
+
+class DAQC2plate(DAQCplate):
+    name="DAQC2"
+    douts=8
+    adcMax=12.0
+
+    def __init__(self, emu, addr):
+        super().__init__(emu, addr)
+        self.srqFlag=False
+        self.fg=[False, 10.0, 1, 4]
+        self.motors={1: Motor(), 2: Motor()}
+        self.osc=False
+        self.oscChannels=(1, 0)
+        self.oscRate=OSC_SWEEP[6]
+        self.oscTrigger=None
+        self.oscReady=None
+        self.oscT=0.0
+
+    def getADC(self, ch):
+        ch=int(ch)
+        if not 0<=ch<8:
+            raise EmulatorError("invalid channel")
+        return round(_signal(self._now(), ch, -self.adcMax, self.adcMax), 4)
+
+    def RESET(self):
+        self.__init__(self.emu, self.addr)
+
+    def _srq(self):
+        self._pollMotors()
+        return self.srqFlag or super()._srq()
+
+    def getSRQ(self):
+        return 1 if self._srq() else 0
+
+    def setSRQ(self):
+        self.srqFlag=True
+
+    def clrSRQ(self):
+        self.srqFlag=False
+
+    def getINTflags(self):
+        self._pollMotors()
+        return super().getINTflags()
+
+    def getFREQ(self):
+        return 1000.0
+
+    def fgON(self):
+        self.fg[0]=True
+
+    def fgOFF(self):
+        self.fg[0]=False
+
+    def fgFREQ(self, freq):
+        self.fg[1]=float(freq)
+
+    def fgTYPE(self, kind):
+        self.fg[2]=int(kind)
+
+    def fgLEVEL(self, level):
+        self.fg[3]=int(level)
+
+    def _motor(self, m):
+        m=int(m)
+        if m not in self.motors:
+            raise EmulatorError("invalid motor")
+        return self.motors[m]
+
+    def _pollMotors(self):
+        now=self._now()
+        for m, mot in self.motors.items():
+            if mot.doneAt is not None and now>=mot.doneAt:
+                mot.doneAt=None
+                if mot.intEnabled:
+                    self.intFlags|=INT_MOTOR1 if m==1 else INT_MOTOR2
+
+    def motorENABLE(self, m):
+        self._motor(m).enabled=True
+
+    def motorDISABLE(self, m):
+        self._motor(m).enabled=False
+
+    def motorOFF(self, m):
+        self._motor(m).doneAt=None
+
+    def motorRATE(self, m, rate, step="w"):
+        self._motor(m).rate=float(rate)
+
+    def motorDIR(self, m, direction):
+        self._motor(m).direction=str(direction)
+
+    def motorMOVE(self, m, steps):
+        mot=self._motor(m)
+        if not mot.enabled:
+            raise EmulatorError("motor not enabled")
+        mot.doneAt=self._now()+abs(int(steps))/max(mot.rate, 1.0)
+
+    def motorJOG(self, m):
+        mot=self._motor(m)
+        if not mot.enabled:
+            raise EmulatorError("motor not enabled")
+        mot.doneAt=float("inf")
+
+    def motorSTOP(self, m):
+        mot=self._motor(m)
+        if mot.doneAt is not None:
+            mot.doneAt=self._now()
+        self._pollMotors()
+
+    def motorINTenable(self, m):
+        self._motor(m).intEnabled=True
+
+    def motorINTdisable(self, m):
+        self._motor(m).intEnabled=False
+
+    def startOSC(self):
+        self.osc=True
+
+    def stopOSC(self):
+        self.osc=False
+        self.oscReady=None
+
+    def setOSCchannel(self, c1, c2):
+        self.oscChannels=(int(c1), int(c2))
+
+    def setOSCsweep(self, rate):
+        self.oscRate=OSC_SWEEP[int(rate)]
+
+    def setOSCtrigger(self, ch, kind="rising", mode="auto", level=2048):
+        self.oscTrigger=(int(ch), str(kind), str(mode), int(level))
+
+    def runOSC(self):
+        if not self.osc:
+            raise EmulatorError("oscilloscope not started")
+        self.oscT=self._now()
+        self.oscReady=self.oscT+OSC_DEPTH/self.oscRate
+
+    def trigOSCnow(self):
+        if self.oscReady is not None:
+            self.oscT=self._now()
+            self.oscReady=self.oscT+OSC_DEPTH/self.oscRate
+
+    def _delay(self, cmd, args):
+        if cmd=="getOSCtraces" and self.oscReady is not None:
+            return max(0.0, self.oscReady-self._now())
+        return super()._delay(cmd, args)
+
+    def getOSCtraces(self):
+        if self.oscReady is None:
+            raise EmulatorError("no sweep started")
+        self.oscReady=None
+        self.intFlags|=INT_OSC
+        out=[]
+        dt=1/self.oscRate
+        for n, on in enumerate(self.oscChannels):
+            if on:
+                f=self.oscRate/64
+                out.extend(int(2048+1500*math.sin(2*math.pi*f*i*dt+n)+random.randint(-2, 2)) for i in range(OSC_DEPTH))
+        return out
+
+class Motor:
+    def __init__(self):
+        self.enabled=False
+        self.rate=100.0
+        self.direction="cw"
+        self.doneAt=None
+        self.intEnabled=False
+
+class DIGIplate(Plate):
+    name="DIGI"
+    periods=(0.2, 0.077, 0.05, 0.0125, 0.01, 0.002, 1.0, 3.0)	#input square wave periods, channels 1-8
+
+    def __init__(self, emu, addr):
+        super().__init__(emu, addr)
+        self.eventsOn=False
+        self.eventMask=0
+        self.eventFlags=0
+        self.lastCheck=0.0
+
+    def _level(self, ch, t):
+        return int(t/(self.periods[ch-1]/2))&1
+
+    def _edges(self):
+        now=self._now()
+        if self.eventsOn:
+            for ch in range(1, 9):
+                if self.eventMask&(1<<(ch-1)) and self._level(ch, now)!=self._level(ch, self.lastCheck):
+                    self.eventFlags|=1<<(ch-1)
+                elif self.eventMask&(1<<(ch-1)) and now-self.lastCheck>=self.periods[ch-1]/2:
+                    self.eventFlags|=1<<(ch-1)
+        self.lastCheck=now
+
+    def _srq(self):
+        self._edges()
+        return self.eventFlags!=0
+
+    def getDINbit(self, bit):
+        bit=int(bit)
+        if not 1<=bit<=8:
+            raise EmulatorError("invalid bit")
+        return self._level(bit, self._now())
+
+    def getDINall(self):
+        now=self._now()
+        return sum(self._level(ch, now)<<(ch-1) for ch in range(1, 9))
+
+    def getFREQ(self, ch):
+        ch=int(ch)
+        if not 1<=ch<=6:
+            raise EmulatorError("invalid channel")
+        return round(1/self.periods[ch-1], 2)
+
+    def getFREQall(self):
+        return [self.getFREQ(ch) for ch in range(1, 7)]
+
+    def enableDINevent(self, bit, *edge):
+        self.eventMask|=1<<(int(bit)-1)
+
+    def disableDINevent(self, bit):
+        self.eventMask&=~(1<<(int(bit)-1))
+
+    def eventEnable(self):
+        self.eventsOn=True
+        self.lastCheck=self._now()
+
+    def eventDisable(self):
+        self.eventsOn=False
+
+    def check4EVENTS(self):
+        self._edges()
+        return 1 if self.eventFlags else 0
+
+    def getEVENTS(self):
+        self._edges()
+        flags=self.eventFlags
+        self.eventFlags=0
+        return flags
+
+class RELAYplate(Plate):
+    name="RELAY"
+    relays=7
+
+    def __init__(self, emu, addr):
+        super().__init__(emu, addr)
+        self.state=0
+
+    def _relay(self, r):
+        r=int(r)
+        if not 1<=r<=self.relays:
+            raise EmulatorError("invalid relay")
+        return 1<<(r-1)
+
+    def relayON(self, r):
+        self.state|=self._relay(r)
+
+    def relayOFF(self, r):
+        self.state&=~self._relay(r)
+
+    def relayTOGGLE(self, r):
+        self.state^=self._relay(r)
+
+    def relayALL(self, value):
+        value=int(value)
+        if not 0<=value<(1<<self.relays):
+            raise EmulatorError("invalid value")
+        self.state=value
+
+    def relaySTATE(self):
+        return self.state
+
+class RELAY2plate(RELAYplate):
+    name="RELAY2"
+    relays=8
+
+class THERMOplate(Plate):
+    name="THERMO"
+    scale="c"							#shared by all THERMOplates, like the firmware
+
+    def __init__(self, emu, addr):
+        super().__init__(emu, addr)
+        self.types=["k"]*8
+        self.lineFreq=60
+        self.smooth=False
+        self.intChannels=0
+
+    def _delay(self, cmd, args):
+        if cmd=="getTEMP":
+            return 1.0 if len(args)>1 and int(args[1])>8 else (0.72 if self.lineFreq==50 else 0.6)
+        if cmd=="getRAW":
+            return 0.72 if self.lineFreq==50 else 0.6
+        return 0.0
+
+    def _tempC(self, ch):
+        ch=int(ch)
+        if not 1<=ch<=12:
+            raise EmulatorError("invalid channel")
+        return 25.0+5*ch+2*math.sin(self._now()/30+ch)
+
+    def _coldC(self):
+        return 24.0+0.5*math.sin(self._now()/300)
+
+    def getTEMP(self, ch, *scale):
+        return round(_scale(self._tempC(ch), scale[0] if scale else THERMOplate.scale), 3)
+
+    def getCOLD(self, *scale):
+        return round(_scale(self._coldC(), scale[0] if scale else THERMOplate.scale), 3)
+
+    def getRAW(self, ch):
+        ch=int(ch)
+        if not 1<=ch<=8:
+            raise EmulatorError("invalid channel")
+        tc=self.types[ch-1]
+        return round((_tcMV(self._tempC(ch), tc)-_tcMV(self._coldC(), tc))/TC_RAW_MV)	#raw ADC counts
+
+    def setTYPE(self, ch, tcType):
+        tcType=str(tcType).lower()
+        if tcType not in ("j", "k"):
+            raise EmulatorError("invalid type")
+        self.types[int(ch)-1]=tcType
+
+    def getTYPE(self, ch):
+        return self.types[int(ch)-1]
+
+    def setLINEFREQ(self, freq):
+        self.lineFreq=int(freq)
+
+    def setSMOOTH(self):
+        self.smooth=True
+
+    def clrSMOOTH(self):
+        self.smooth=False
+
+    def setINTchannel(self, ch):
+        self.intChannels|=1<<int(ch)
+
+    def getSRQ(self):
+        return 1 if self._srq() else 0
+
+    def setINT(self):
+        self.intFlags|=1
+
+    def clrINT(self):
+        self.intFlags=0
+
+    def RESET(self):
+        THERMOplate.scale="c"
+        self.__init__(self.emu, self.addr)
+
+PLATES={"ADC": ADCplate, "CURRENT": CURRENTplate, "DAQC": DAQCplate, "DAQC2": DAQC2plate,
+        "DIGI": DIGIplate, "RELAY": RELAYplate, "RELAY2": RELAY2plate, "THERMO": THERMOplate}
+
+def _parseArgs(argStr):
+    args=[]
+    for a in argStr.split(","):
+        a=a.strip().strip("'\"")
+        if a=="":
+            continue
+        try:
+            args.append(int(a))
+        except ValueError:
+            try:
+                args.append(float(a))
+            except ValueError:
+                args.append(a)
+    return args
+
+def _format(value):
+    if value is None:
+        return "OK"
+    if isinstance(value, (list, tuple)):
+        return ",".join(_format(v) for v in value)
+    if isinstance(value, float):
+        return repr(round(value, 6))
+    return str(value)
+
+class Emulator:
+    def __init__(self, plates=None, speed=1.0):
+        if plates is None:
+            plates={name: [0] for name in PLATE_NAMES}
+        self.speed=speed
+        self.t0=time.monotonic()
+        self.stack={}
+        for name, addrs in plates.items():
+            if name not in PLATES:
+                raise ValueError("unknown plate type "+name)
+            for addr in addrs:
+                if not 0<=addr<=7:
+                    raise ValueError("plate address must be 0-7")
+                self.stack[(name, addr)]=PLATES[name](self, addr)
+        self.master=None
+        self.slave=None
+        self.port=None
+        self.thread=None
+        self.running=False
+        self.commands=0
+        self.drops={}						#command name -> responses still to swallow
+
+    def drop(self, name, count=1):
+        """Swallow the next count responses to name (e.g. "RELAY.relaySTATE") to simulate a lost reply"""
+        self.drops[name]=self.drops.get(name, 0)+count
+
+    def start(self):
+        self.master, self.slave=os.openpty()
+        tty.setraw(self.slave)
+        self.port=os.ttyname(self.slave)
+        self.running=True
+        self.thread=threading.Thread(target=self._serve, name="BRIDGEemulator", daemon=True)
+        self.thread.start()
+        return self.port
+
+    def stop(self):
+        self.running=False
+        if self.thread is not None:
+            self.thread.join(1.0)
+        for fd in (self.master, self.slave):
+            if fd is not None:
+                try:
+                    os.close(fd)
+                except OSError:
+                    pass
+        self.master=self.slave=None
+
+    def unplug(self):
+        """Simulate pulling the USB cable: the pty disappears and open ports fail"""
+        self.stop()
+        self.port=None
+
+    def replug(self, powerCycle=False):
+        """Come back on a new pty, as a re-enumerated device would; powerCycle resets every plate"""
+        if powerCycle:
+            self.t0=time.monotonic()
+            self.stack={key: type(plate)(self, key[1]) for key, plate in self.stack.items()}
+            THERMOplate.scale="c"
+        return self.start()
+
+    def connect(self):
+        """Make this emulator the BRIDGEplate connection used by BRIDGEplate.py"""
+        import BRIDGEplate
+        if self.port is None:
+            self.start()
+        return BRIDGEplate.openPORT(self.port)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _serve(self):
+        pending=b""
+        while self.running:
+            try:
+                ready, _, _=select.select([self.master], [], [], 0.1)
+                if not ready:
+                    continue
+                data=os.read(self.master, 4096)
+            except OSError:
+                break
+            if not data:
+                break
+            pending+=data
+            while b"\n" in pending:
+                line, pending=pending.split(b"\n", 1)
+                line=line.strip(b"\r").decode("utf-8", errors="replace").strip()
+                if line:
+                    self._reply(line)
+
+    def _reply(self, line):
+        t=time.monotonic()
+        delay, text=self.execute(line)
+        name=line.partition("(")[0]
+        if self.drops.get(name):
+            self.drops[name]-=1
+            return
+        out=(text+"\r\n").encode("utf-8")
+        if self.speed:
+            wait=t+(BASE_LATENCY+delay+len(out)*BYTE_TIME)*self.speed-time.monotonic()
+            if wait>0:
+                time.sleep(wait)
+        try:
+            os.write(self.master, out)
+        except OSError:
+            self.running=False
+
+    def execute(self, line):
+        """Run one protocol line, returning (simulated latency, response text)"""
+        self.commands+=1
+        try:
+            head, _, rest=line.partition("(")
+            plateName, _, cmd=head.strip().partition(".")
+            args=_parseArgs(rest.rsplit(")", 1)[0])
+            if cmd=="help":
+                return 0.0, self.help(plateName)+"\n<<<END>>>"
+            if plateName=="BRIDGE":
+                return 0.0, _format(self.bridge(cmd, args))
+            if plateName not in PLATES:
+                raise EmulatorError("unknown command "+head)
+            if cmd=="srTable" and plateName=="ADC":
+                return 0.0, srTableText()+"\n<<<END>>>"
+            if plateName=="THERMO" and cmd in ("setSCALE", "getSCALE"):
+                if cmd=="setSCALE":
+                    THERMOplate.scale=str(args[0]).lower()
+                    return 0.0, "OK"
+                return 0.0, THERMOplate.scale
+            if not args or not isinstance(args[0], int):
+                raise EmulatorError("missing address")
+            plate=self.stack.get((plateName, args[0]))
+            if plate is None:
+                raise EmulatorError(f"no {plateName}plate at address {args[0]}")
+            func=getattr(plate, cmd, None)
+            if func is None or cmd.startswith("_"):
+                raise EmulatorError("unknown command "+head)
+            delay=plate._delay(cmd, args)
+            return delay, _format(func(*args[1:]))
+        except (EmulatorError, TypeError, ValueError, IndexError, KeyError) as e:
+            return 0.0, "ERROR: "+str(e)
+
+    def bridge(self, cmd, args):
+        if cmd=="getSRQ":
+            return 1 if any(p._srq() for p in self.stack.values()) else 0
+        if cmd=="getID":
+            return "Pi-Plates BRIDGEplate"
+        if cmd in ("getHWrev", "getFWrev"):
+            return 1.0
+        if cmd=="getVERSION":
+            return "BRIDGEplate emulator"
+        if cmd in ("resetSTACK", "resetBRIDGE"):
+            return None
+        raise EmulatorError("unknown command BRIDGE."+cmd)
+
+    def help(self, plateName):
+        cls=PLATES.get(plateName)
+        if cls is None:
+            return "BRIDGE Functions: getID, getHWrev, getFWrev, resetSTACK, getSRQ, resetBRIDGE"
+        names=sorted(n for n in dir(cls) if not n.startswith("_") and callable(getattr(cls, n)))
+        return plateName+" Functions: "+", ".join(names)
+
+def _parsePlates(specs):
+    plates={}
+    for spec in specs:
+        name, _, addrs=spec.partition(":")
+        plates[name.upper()]=[int(a) for a in addrs.split(",")] if addrs else [0]
+    return plates
+
+if __name__ == "__main__":
+    import argparse
+    parser=argparse.ArgumentParser(description="Simulated BRIDGEplate on a pseudo-terminal")
+    parser.add_argument("plates", nargs="*", help="plate stack, e.g. ADC:0,1 RELAY:2 (default: one of each at address 0)")
+    parser.add_argument("--speed", type=float, default=1.0, help="latency scale, 0 answers immediately")
+    opts=parser.parse_args()
+    emu=Emulator(_parsePlates(opts.plates) if opts.plates else None, opts.speed)
+    print(emu.start(), flush=True)
+    try:
+        while emu.thread.is_alive():
+            time.sleep(0.5)
+    except KeyboardInterrupt:
+        pass
+    emu.stop()
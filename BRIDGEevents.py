@@ -0,0 +1,185 @@
+import collections
+import sys
+import threading
+import time
+try:
+    import numpy as np
+except ImportError:
+    print("Error: numpy package not found. Install with: pip install numpy")
+    sys.exit(1)
+import BRIDGEplate as bp
+
+"""
+BRIDGEevents - DIGIplate event timeline and debounced counters
+An EventEngine enables the DIN events of DIGIplates and polls the stack-wide
+BRIDGE.getSRQ() in a background thread. When a plate requests service it drains
+getEVENTS() with one CMD() per plate (the read clears the flags, so it must never
+be repeated), reads getDINall() of all plates in one pipelined window and turns
+the event flags into edges: the input level tells rising from falling, and a flag
+with an unchanged level is a pulse (two edges) shorter than the poll interval.
+
+Edges closer than debounce seconds to the last accepted edge of the channel are
+counted as bounces and left out. Accepted edges go into a Timeline, a ring of
+numpy arrays that can be queried by time window, plate and channel without
+touching the hardware; counts and rates come from it as well. With freq set,
+getFREQall() is read in the same windows every freq seconds.
+
+Usage:
+    from BRIDGEplate import *
+    from BRIDGEevents import EventEngine
+    engine = EventEngine({0: [1, 2, 3]}, debounce=0.005).start()
+    time.sleep(10)
+    print(engine.counts[(0, 1)], engine.rate(0, 1, window=5.0))
+    ev = engine.timeline.query(t0=time.monotonic()-1, addr=0, channel=2)
+    print(ev.t, ev.edge)			#arrays: monotonic times, 1 rising / 0 falling
+    engine.stop()
+
+Inputs that change faster than the poll interval lose edges; measure those with
+getFREQ() (channels 1-6) instead.
+"""
+
+RISING=1
+FALLING=0
+Events=collections.namedtuple("Events", "t addr channel edge")
+
+class Timeline:
+    def __init__(self, capacity=65536):
+        self.capacity=capacity
+        self.t=np.zeros(capacity)				#time.monotonic() of the edge
+        self.addr=np.zeros(capacity, np.uint8)
+        self.channel=np.zeros(capacity, np.uint8)
+        self.edge=np.zeros(capacity, np.int8)
+        self.head=0						#next slot to write
+        self.total=0						#edges appended since start
+        self.lock=threading.Lock()
+
+    def append(self, t, addr, channel, edge):
+        with self.lock:
+            i=self.head
+            self.t[i], self.addr[i], self.channel[i], self.edge[i]=t, addr, channel, edge
+            self.head=(i+1)%self.capacity
+            self.total+=1
+
+    def _ordered(self, a):
+        if self.total<=self.capacity:
+            return a[:self.total]
+        return np.concatenate((a[self.head:], a[:self.head]))
+
+    def query(self, t0=None, t1=None, addr=None, channel=None, edge=None):
+        """Edges with t0 <= t < t1, optionally of one plate, channel and edge direction"""
+        with self.lock:
+            t, a, c, e=(self._ordered(x) for x in (self.t, self.addr, self.channel, self.edge))
+        lo=0 if t0 is None else np.searchsorted(t, t0)
+        hi=len(t) if t1 is None else np.searchsorted(t, t1)
+        sel=slice(lo, hi)
+        t, a, c, e=t[sel], a[sel], c[sel], e[sel]
+        keep=np.ones(len(t), bool)
+        if addr is not None:
+            keep&=a==addr
+        if channel is not None:
+            keep&=c==channel
+        if edge is not None:
+            keep&=e==edge
+        return Events(t[keep], a[keep], c[keep], e[keep])
+
+class EventEngine:
+    def __init__(self, plates, debounce=0.0, count="r", interval=0.002, capacity=65536, freq=None):
+        self.plates={addr: sorted(int(ch) for ch in chans) for addr, chans in plates.items()}
+        self.debounce=debounce					#seconds, minimum time between accepted edges
+        self.count={"r": (RISING,), "f": (FALLING,), "b": (RISING, FALLING)}[count]	#edges the counters count
+        self.interval=interval					#seconds between SRQ polls
+        self.freqInterval=freq					#seconds between getFREQall() reads, None for never
+        self.timeline=Timeline(capacity)
+        keys=[(addr, ch) for addr, chans in self.plates.items() for ch in chans]
+        self.counts=dict.fromkeys(keys, 0)			#debounced edges of the counted direction
+        self.bounces=dict.fromkeys(keys, 0)			#edges rejected by the debounce
+        self.level={}						#accepted input level
+        self.last=dict.fromkeys(keys, -np.inf)			#time of the last accepted edge
+        self.freq={}						#addr -> getFREQall() list
+        self.pending=False					#an edge waits for its debounce time
+        self.polls=0
+        self.drains=0
+        self.stopEvent=threading.Event()
+        self.thread=None
+
+    def start(self):
+        for addr, chans in self.plates.items():
+            for ch in chans:
+                bp.DIGI.enableDINevent(addr, ch)
+            bp.DIGI.eventEnable(addr)
+            bp.DIGI.getEVENTS(addr)				#discard flags from before the start
+            levels=int(bp.DIGI.getDINall(addr))
+            for ch in chans:
+                self.level[(addr, ch)]=(levels>>(ch-1))&1
+        self.nextFreq=time.monotonic()
+        self.stopEvent.clear()
+        self.thread=threading.Thread(target=self._run, name="BRIDGEevents", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopEvent.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread=None
+        for addr in self.plates:
+            bp.DIGI.eventDisable(addr)
+
+    def _run(self):
+        while not self.stopEvent.wait(self.interval):
+            try:
+                freq=self.freqInterval is not None and time.monotonic()>=self.nextFreq
+                self.polls+=1
+                if self.pending or freq or int(bp.CMD("BRIDGE.getSRQ()")):
+                    self.drain(freq)
+            except (bp.CMDtimeout, ValueError):
+                continue
+
+    def drain(self, freq=False):
+        """Read the event flags and levels of every plate and record their edges"""
+        cmds=[]
+        for addr in self.plates:
+            cmds.append(f"DIGI.getDINall({addr})")
+            if freq:
+                cmds.append(f"DIGI.getFREQall({addr})")
+        sent=time.monotonic()
+        events=[int(bp.CMD(f"DIGI.getEVENTS({addr})")) for addr in self.plates]	#clears the flags: never re-sent by CMDS()
+        resps=iter(bp.CMDS(cmds))
+        t=(sent+time.monotonic())/2
+        self.drains+=1
+        self.pending=False
+        for (addr, chans), flags in zip(self.plates.items(), events):
+            levels=int(bp.parseResp(next(resps)))
+            if freq:
+                self.freq[addr]=bp.parseResp(next(resps))
+            for ch in chans:
+                self._edges(t, addr, ch, (flags>>(ch-1))&1, (levels>>(ch-1))&1)
+        if freq:
+            self.nextFreq=t+self.freqInterval
+
+    def _edges(self, t, addr, ch, flagged, level):
+        key=(addr, ch)
+        old=self.level[key]
+        if level!=old:
+            edges=(level,)
+        elif flagged:
+            edges=(1-old, old)					#a pulse between two polls
+        else:
+            return
+        if t-self.last[key]<self.debounce:
+            if flagged:						#not a change already waiting
+                self.bounces[key]+=len(edges)
+            self.pending|=level!=old			#take the new level once the debounce time is over
+            return
+        for edge in edges:
+            self.timeline.append(t, addr, ch, edge)
+            if edge in self.count:
+                self.counts[key]+=1
+        self.level[key]=level
+        self.last[key]=t
+
+    def rate(self, addr, ch, window=1.0):
+        """Counted edges per second over the last window seconds"""
+        now=time.monotonic()
+        ev=self.timeline.query(now-window, None, addr, ch)
+        return int(np.isin(ev.edge, self.count).sum())/window
@@ -0,0 +1,129 @@
+import sys
+import time
+try:
+    import numpy as np
+except ImportError:
+    print("Error: numpy package not found. Install with: pip install numpy")
+    sys.exit(1)
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    print("Error: pyarrow package not found. Install with: pip install pyarrow")
+    sys.exit(1)
+
+"""
+BRIDGEexport - columnar export of acquisitions and polls to Parquet or Arrow
+An Exporter collects readings in typed numpy columns (t, plate, addr, channel,
+value) of batch rows. Each full batch is written as one Parquet row group or
+Arrow IPC record batch and the columns are reused, so memory stays at one batch
+however long the export runs. The plate column is dictionary encoded.
+
+Usage:
+    from BRIDGEplate import *
+    from BRIDGEshared import decode
+    from BRIDGEexport import Exporter
+    with Exporter("run.parquet") as ex:			#or "run.arrow"
+        ex.scan("DAQC", 0, DAQC.getADCall(0))		#one value per channel, t=time.monotonic()
+        ex.block("ADC", 1, decode(CMD("ADC.getBLOCK(1)")).reshape(-1, 4), t, channels=[0, 1, 2, 3])	#t: one per row or one for all
+        ex.frame(0, scope.get())			#a BRIDGEscope Frame, traces converted to volts
+    #pandas.read_parquet("run.parquet") or pyarrow.ipc.open_file("run.arrow").read_all()
+
+t is in seconds of the clock the readings came with (time.monotonic() for
+BRIDGEtime, BRIDGEsync and BRIDGEscope, time.time() otherwise); the clock name is
+stored in the schema metadata.
+"""
+
+BATCH_ROWS=65536						#rows per row group / record batch
+PLATES=("ADC", "CURRENT", "DAQC", "DAQC2", "DIGI", "RELAY", "RELAY2", "THERMO")
+SCHEMA=pa.schema([
+    ("t", pa.float64()),
+    ("plate", pa.dictionary(pa.int8(), pa.string())),
+    ("addr", pa.uint8()),
+    ("channel", pa.int16()),
+    ("value", pa.float64())])
+
+class Exporter:
+    def __init__(self, path, format=None, batch=BATCH_ROWS, compression="zstd", clock="monotonic"):
+        self.path=path
+        self.format=format or ("arrow" if path.endswith((".arrow", ".feather", ".ipc")) else "parquet")
+        self.batch=batch
+        self.schema=SCHEMA.with_metadata({"clock": clock})	#"monotonic" or "time"
+        self.now=time.time if clock=="time" else time.monotonic
+        self.plates=pa.array(PLATES, pa.string())		#dictionary of the plate column
+        self.t=np.empty(batch)
+        self.plate=np.empty(batch, np.int8)
+        self.addr=np.empty(batch, np.uint8)
+        self.channel=np.empty(batch, np.int16)
+        self.value=np.empty(batch)
+        self.fill=0
+        self.rows=0						#rows written
+        self.batches=0
+        if self.format=="parquet":
+            self.writer=pa.parquet.ParquetWriter(path, self.schema, compression=compression)
+        elif self.format=="arrow":
+            self.writer=pa.ipc.new_file(path, self.schema, options=pa.ipc.IpcWriteOptions(compression=compression))
+        else:
+            raise ValueError(f"unknown format {self.format!r}, use 'parquet' or 'arrow'")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def add(self, plate, addr, channels, values, t):
+        """Append rows; channels, values and t are scalars or equal length arrays"""
+        values=np.asarray(values, float).reshape(-1)
+        n=len(values)
+        columns=(np.broadcast_to(np.asarray(t, float), (n,)), np.full(n, PLATES.index(plate), np.int8),
+                 np.full(n, addr, np.uint8), np.broadcast_to(np.asarray(channels, np.int16), (n,)), values)
+        i=0
+        while i<n:
+            k=min(n-i, self.batch-self.fill)
+            for buf, col in zip((self.t, self.plate, self.addr, self.channel, self.value), columns):
+                buf[self.fill:self.fill+k]=col[i:i+k]
+            self.fill+=k
+            i+=k
+            if self.fill==self.batch:
+                self.flush()
+
+    def scan(self, plate, addr, values, t=None, channels=None):
+        """One poll such as getADCall() or getIall(): one value per channel, all at time t"""
+        values=np.asarray(values, float).reshape(-1)
+        channels=np.arange(len(values)) if channels is None else channels
+        self.add(plate, addr, channels, values, self.now() if t is None else t)
+
+    def block(self, plate, addr, data, t, channels=None):
+        """Rows of scans such as getBLOCK()/getSTREAM() data, (samples, channels); t is one time per row or one for all"""
+        data=np.asarray(data, float)
+        data=data.reshape(len(data), -1)
+        channels=np.arange(data.shape[1]) if channels is None else np.asarray(channels)
+        t=np.broadcast_to(np.asarray(t, float), (len(data),))
+        self.add(plate, addr, np.tile(channels, len(data)), data, np.repeat(t, data.shape[1]))
+
+    def frame(self, addr, frame):
+        """A BRIDGEscope Frame of DAQC2 oscilloscope traces, stored in volts like every other value"""
+        t=frame.t0+frame.time()
+        for ch, trace in zip(frame.channels, frame.volts()):
+            self.add("DAQC2", addr, ch, trace, t)
+
+    def flush(self):
+        """Write the rows collected so far as one row group / record batch"""
+        if not self.fill:
+            return
+        n=self.fill
+        plate=pa.DictionaryArray.from_arrays(pa.array(self.plate[:n]), self.plates)
+        batch=pa.record_batch([pa.array(self.t[:n]), plate, pa.array(self.addr[:n]), pa.array(self.channel[:n]),
+                               pa.array(self.value[:n])], schema=self.schema)
+        self.writer.write_batch(batch)
+        self.rows+=n
+        self.batches+=1
+        self.fill=0
+
+    def close(self):
+        if self.writer is not None:
+            self.flush()
+            self.writer.close()
+            self.writer=None
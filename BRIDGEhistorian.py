@@ -0,0 +1,245 @@
+import json
+import os
+import sys
+import threading
+import time
+try:
+    import numpy as np
+except ImportError:
+    print("Error: numpy package not found. Install with: pip install numpy")
+    sys.exit(1)
+
+"""
+BRIDGEhistorian - embedded time series historian with rollups
+A Historian stores tagged readings under one directory, with no server. Readings
+are buffered in memory and appended in large blocks to column files (times,
+tag ids and values as raw little-endian arrays), so the SD card sees few, long
+writes. Column files are grouped in segments of at most SEGMENT_ROWS rows; the
+index (index.json) records the time span and tags of every segment, so a query
+only opens the segments it needs.
+
+Minute and hour rollups (count, min, max, sum per tag) are kept up to date as
+readings come in; a bucket is appended to its rollup file when a later reading
+of the tag starts the next bucket.
+
+Usage:
+    from BRIDGEplate import *
+    from BRIDGEhistorian import Historian
+    h = Historian("/home/pi/history")
+    h.write("TT101", THERMO.getTEMP(0, 1, "c"))		#t defaults to time.time()
+    h.writeMany(["I1", "I2"], CURRENT.getIall(0)[:2])
+    t, v = h.query("TT101", time.time()-3600, time.time())
+    r = h.rollups("TT101", time.time()-86400, time.time(), 3600)	#hourly
+    print(r["start"], r["count"], r["min"], r["max"], r["mean"])
+    h.close()
+
+Times are time.time() seconds. Readings stay in memory for up to FLUSH_SECONDS
+(or FLUSH_ROWS rows) before they are written; close() or flush() writes them.
+"""
+
+SEGMENT_ROWS=1000000						#rows per segment
+FLUSH_ROWS=20000						#buffered rows that force a write
+FLUSH_SECONDS=30.0						#oldest buffered row age that forces a write
+PERIODS=(60, 3600)						#rollup periods, seconds
+COLUMNS=(("t", "<f8"), ("tag", "<u4"), ("v", "<f8"))
+ROLLUP=np.dtype([("tag", "<u4"), ("start", "<f8"), ("count", "<u4"), ("min", "<f8"), ("max", "<f8"), ("sum", "<f8")])
+
+class Historian:
+    def __init__(self, root):
+        self.root=root
+        os.makedirs(root, exist_ok=True)
+        self.tags=self._load("tags.json", {})			#tag name -> id
+        self.index=self._load("index.json", [])			#segments: id, t0, t1, rows, tags
+        if not self.index or self.index[-1]["rows"]>=SEGMENT_ROWS:
+            self._newSegment()
+        seg=self.index[-1]
+        for col, dtype in COLUMNS:				#drop rows written after the index was last saved
+            path=self._column(seg["id"], col)
+            if os.path.exists(path):
+                os.truncate(path, seg["rows"]*np.dtype(dtype).itemsize)
+        self.buffer=[]						#(t, ids, values) blocks not yet written
+        self.buffered=0
+        self.oldest=None					#time.monotonic() of the first buffered block
+        self.open={p: self._noRollups(len(self.tags)) for p in PERIODS}	#open bucket per tag id
+        self.lock=threading.RLock()
+
+    def _path(self, name):
+        return os.path.join(self.root, name)
+
+    def _load(self, name, default):
+        try:
+            with open(self._path(name)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return default
+
+    def _save(self, name, data):
+        tmp=self._path(name+".tmp")
+        with open(tmp, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp, self._path(name))			#never leave a half written index
+
+    def _newSegment(self):
+        seg=(self.index[-1]["id"]+1) if self.index else 1
+        for col, dtype in COLUMNS:				#empty files: a crash may have left some behind
+            open(self._column(seg, col), "wb").close()
+        self.index.append({"id": seg, "t0": None, "t1": None, "rows": 0, "tags": []})
+
+    def _column(self, seg, col):
+        return self._path(f"seg{seg:06d}.{col}")
+
+    def _ids(self, names):
+        new=[n for n in dict.fromkeys(names) if n not in self.tags]
+        for n in new:
+            self.tags[n]=len(self.tags)
+        if new:
+            self._save("tags.json", self.tags)
+            for p in PERIODS:
+                grow=self._noRollups(len(self.tags)-len(self.open[p]["count"]))
+                self.open[p]={k: np.concatenate((self.open[p][k], grow[k])) for k in grow}
+        return np.array([self.tags[n] for n in names], np.uint32)
+
+    def _noRollups(self, n):
+        return {"start": np.full(n, np.nan), "count": np.zeros(n, np.uint32), "min": np.full(n, np.inf),
+                "max": np.full(n, -np.inf), "sum": np.zeros(n)}
+
+    def write(self, tag, value, t=None):
+        self.writeMany([tag], [value], t)
+
+    def writeMany(self, tags, values, t=None):
+        """Store one reading per tag, all taken at time t (time.time() if None)"""
+        t=time.time() if t is None else float(t)
+        tags=list(tags)
+        values=np.asarray(values, float).reshape(-1)
+        if len(values)!=len(tags):
+            raise ValueError(f"{len(tags)} tags but {len(values)} values")
+        with self.lock:
+            ids=self._ids(tags)
+            self.buffer.append((t, ids, values))
+            self.buffered+=len(ids)
+            if self.oldest is None:
+                self.oldest=time.monotonic()
+            for p in PERIODS:
+                self._rollup(p, ids, values, t)
+            if self.buffered>=FLUSH_ROWS or time.monotonic()-self.oldest>=FLUSH_SECONDS:
+                self.flush()
+
+    def _rollup(self, period, ids, values, t):
+        #Fold one scan into the open buckets; append buckets the scan closes
+        o=self.open[period]
+        start=np.floor(t/period)*period
+        closing=np.unique(ids[(o["count"][ids]>0)&(o["start"][ids]!=start)])
+        if len(closing):
+            self._appendRollups(period, closing)
+        ok=~np.isnan(values)
+        ids, values=ids[ok], values[ok]
+        o["start"][ids]=start
+        np.add.at(o["count"], ids, 1)				#.at: a tag given twice counts twice
+        np.minimum.at(o["min"], ids, values)
+        np.maximum.at(o["max"], ids, values)
+        np.add.at(o["sum"], ids, values)
+
+    def _records(self, period, ids):
+        o=self.open[period]
+        rec=np.empty(len(ids), ROLLUP)
+        rec["tag"]=ids
+        for k in ("start", "count", "min", "max", "sum"):
+            rec[k]=o[k][ids]
+        return rec
+
+    def _appendRollups(self, period, ids):
+        with open(self._path(f"rollup{period}.dat"), "ab") as f:
+            f.write(self._records(period, ids).tobytes())
+        o=self.open[period]
+        empty=self._noRollups(len(ids))
+        for k in empty:
+            o[k][ids]=empty[k]
+
+    def flush(self):
+        """Write the buffered readings to the current segment"""
+        with self.lock:
+            if not self.buffer:
+                return
+            t=np.concatenate([np.full(len(ids), ts) for ts, ids, vs in self.buffer])
+            tag=np.concatenate([ids for ts, ids, vs in self.buffer])
+            v=np.concatenate([vs for ts, ids, vs in self.buffer])
+            self.buffer=[]
+            self.buffered=0
+            self.oldest=None
+            i=0
+            while i<len(t):
+                seg=self.index[-1]
+                n=min(len(t)-i, SEGMENT_ROWS-seg["rows"])
+                for (col, dtype), data in zip(COLUMNS, (t, tag, v)):
+                    with open(self._column(seg["id"], col), "ab") as f:
+                        f.write(data[i:i+n].astype(dtype).tobytes())
+                part=t[i:i+n]
+                seg["t0"]=float(part.min()) if seg["t0"] is None else min(seg["t0"], float(part.min()))
+                seg["t1"]=float(part.max()) if seg["t1"] is None else max(seg["t1"], float(part.max()))
+                seg["tags"]=sorted(set(seg["tags"]).union(np.unique(tag[i:i+n]).tolist()))
+                seg["rows"]+=n
+                i+=n
+                if seg["rows"]>=SEGMENT_ROWS:
+                    self._newSegment()
+            self._save("index.json", self.index)
+
+    def close(self):
+        """Write the buffered readings and the open rollup buckets"""
+        with self.lock:
+            self.flush()
+            for p in PERIODS:
+                ids=np.flatnonzero(self.open[p]["count"])
+                if len(ids):
+                    self._appendRollups(p, ids)
+
+    def query(self, tag, t0, t1):
+        """Return (times, values) of a tag with t0 <= t < t1, in time order"""
+        with self.lock:
+            if tag not in self.tags:
+                return np.empty(0), np.empty(0)
+            tid=self.tags[tag]
+            ts, vs=[], []
+            for seg in self.index:
+                if not seg["rows"] or tid not in seg["tags"] or seg["t1"]<t0 or seg["t0"]>=t1:
+                    continue
+                cols={col: np.memmap(self._column(seg["id"], col), dtype, "r", shape=(seg["rows"],)) for col, dtype in COLUMNS}
+                sel=np.flatnonzero((cols["tag"]==tid)&(cols["t"]>=t0)&(cols["t"]<t1))
+                ts.append(np.asarray(cols["t"][sel]))
+                vs.append(np.asarray(cols["v"][sel]))
+            for t, ids, values in self.buffer:
+                if t0<=t<t1:
+                    sel=ids==tid
+                    ts.append(np.full(sel.sum(), t))
+                    vs.append(values[sel])
+        t=np.concatenate(ts) if ts else np.empty(0)
+        v=np.concatenate(vs) if vs else np.empty(0)
+        order=np.argsort(t, kind="stable")
+        return t[order], v[order]
+
+    def rollups(self, tag, t0, t1, period=60):
+        """Rollup buckets of a tag starting in t0..t1: structured array with start, count, min, max, sum, mean"""
+        with self.lock:
+            tid=self.tags.get(tag)
+            try:
+                rec=np.fromfile(self._path(f"rollup{period}.dat"), ROLLUP)
+            except FileNotFoundError:
+                rec=np.empty(0, ROLLUP)
+            if tid is not None and self.open[period]["count"][tid]:
+                rec=np.concatenate((rec, self._records(period, np.array([tid], np.uint32))))
+        out=np.empty(0, ROLLUP.descr+[("mean", "<f8")])
+        if tid is None:
+            return out
+        rec=rec[(rec["tag"]==tid)&(rec["start"]>=np.floor(t0/period)*period)&(rec["start"]<t1)]
+        if not len(rec):
+            return out
+        rec=rec[np.argsort(rec["start"], kind="stable")]
+        starts, first=np.unique(rec["start"], return_index=True)	#merge buckets written in parts
+        out=np.empty(len(starts), out.dtype)
+        out["tag"]=tid
+        out["start"]=starts
+        out["count"]=np.add.reduceat(rec["count"], first)
+        out["min"]=np.minimum.reduceat(rec["min"], first)
+        out["max"]=np.maximum.reduceat(rec["max"], first)
+        out["sum"]=np.add.reduceat(rec["sum"], first)
+        out["mean"]=out["sum"]/out["count"]
+        return out
@@ -0,0 +1,156 @@
+import collections
+import threading
+import time
+import BRIDGEplate as bp
+
+"""
+BRIDGEmotion - DAQC2 stepper motion queue with interrupt driven completion
+A MotionQueue keeps a queue of moves for each motor of a DAQC2plate. It enables
+the motor interrupts and, while a motor is moving, polls the stack-wide
+BRIDGE.getSRQ() instead of the motors. When the plate requests service one
+getINTflags() read tells which moves have finished, and the next queued move of
+that motor is sent at once. A watchdog reads getINTflags() every watchdog
+seconds while a move runs in case an interrupt was missed.
+
+Usage:
+    from BRIDGEplate import *
+    from BRIDGEmotion import MotionQueue
+    mq = MotionQueue(0).start()
+    mq.move(1, 400, rate=200, direction="cw")
+    mq.move(1, 400, direction="ccw")
+    mq.dwell(1, 0.5)
+    mq.move(2, 1000, rate=500)
+    mq.wait()					#until both queues are empty
+    print(mq.completed, mq.flags)
+    mq.stop()
+
+getINTflags() clears all interrupt flags of the plate; bits other than the motor
+bits are collected in flags for other users.
+"""
+
+INT_MOTOR={1: 0x0100, 2: 0x0200}				#getINTflags() bits of a finished move
+MOTORS=(1, 2)
+
+Move=collections.namedtuple("Move", "steps rate direction dwell")	#rate, direction None: unchanged
+
+class MotionQueue:
+    def __init__(self, addr, interval=0.005, watchdog=1.0):
+        self.addr=addr
+        self.interval=interval					#seconds between SRQ polls while a motor moves
+        self.watchdog=watchdog					#seconds between getINTflags() reads without SRQ
+        self.queues={m: collections.deque() for m in MOTORS}
+        self.busy=dict.fromkeys(MOTORS, False)
+        self.until=dict.fromkeys(MOTORS, 0.0)			#end of a dwell, time.monotonic()
+        self.completed=dict.fromkeys(MOTORS, 0)			#moves finished
+        self.flags=0						#non-motor interrupt flags seen
+        self.errors=0
+        self.lastError=None
+        self.cond=threading.Condition()
+        self.stopEvent=threading.Event()
+        self.thread=None
+
+    def start(self):
+        for m in MOTORS:
+            bp.DAQC2.motorENABLE(self.addr, m)
+            bp.DAQC2.motorINTenable(self.addr, m)
+        bp.DAQC2.intEnable(self.addr)
+        bp.DAQC2.getINTflags(self.addr)				#discard flags from before the start
+        self.stopEvent.clear()
+        self.thread=threading.Thread(target=self._run, name="BRIDGEmotion", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        """Stop both motors, drop the queued moves and end the queue thread"""
+        self.halt()
+        self.stopEvent.set()
+        with self.cond:
+            self.cond.notify_all()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread=None
+
+    def move(self, motor, steps, rate=None, direction=None):
+        """Queue a move; rate (a number or motorRATE() argument tuple) and direction apply from it on"""
+        self._queue(motor, Move(abs(int(steps)), rate, direction, None))
+
+    def dwell(self, motor, seconds):
+        """Queue a pause between moves"""
+        self._queue(motor, Move(0, None, None, seconds))
+
+    def _queue(self, motor, entry):
+        if motor not in self.queues:
+            raise ValueError(f"invalid motor {motor}")
+        with self.cond:
+            self.queues[motor].append(entry)
+            self.cond.notify_all()
+
+    def halt(self, motor=None):
+        """Stop a motor (both if None) and drop its queued moves"""
+        for m in MOTORS if motor is None else (motor,):
+            with self.cond:					#no move can be sent after the stop
+                self.queues[m].clear()
+                bp.DAQC2.motorSTOP(self.addr, m)
+
+    def idle(self):
+        return not any(self.queues.values()) and not any(self.busy.values()) and time.monotonic()>=max(self.until.values())
+
+    def wait(self, timeout=None):
+        """Wait until both queues are empty and the motors stopped; False on timeout"""
+        with self.cond:
+            return self.cond.wait_for(self.idle, timeout)
+
+    def _dispatch(self, m):
+        #Send the next queued move of motor m; under the lock halt() takes, so a
+        #halt either drops the move or stops it after it was sent
+        with self.cond:
+            if not self.queues[m]:				#halted since it was found ready
+                return
+            entry=self.queues[m].popleft()
+            if entry.dwell is not None:
+                self.until[m]=time.monotonic()+entry.dwell
+                return
+            setup=[]
+            if entry.rate is not None:
+                rate=entry.rate if isinstance(entry.rate, tuple) else (entry.rate,)
+                setup.append(f"DAQC2.motorRATE({', '.join(str(a) for a in (self.addr, m)+rate)})")
+            if entry.direction is not None:
+                setup.append(f"DAQC2.motorDIR({self.addr}, {m}, {entry.direction})")
+            if setup:
+                bp.CMDS(setup)					#absolute settings: safe to pipeline
+            bp.DAQC2.motorMOVE(self.addr, m, entry.steps)	#never repeated after a lost reply
+            self.busy[m]=True
+
+    def _completions(self):
+        flags=int(bp.DAQC2.getINTflags(self.addr))
+        for m in MOTORS:
+            if flags&INT_MOTOR[m] and self.busy[m]:
+                self.busy[m]=False
+                self.completed[m]+=1
+        self.flags|=flags&~sum(INT_MOTOR.values())
+        self.lastCheck=time.monotonic()
+
+    def _run(self):
+        self.lastCheck=time.monotonic()
+        while not self.stopEvent.is_set():
+            try:
+                with self.cond:
+                    now=time.monotonic()
+                    ready=[m for m in MOTORS if self.queues[m] and not self.busy[m] and now>=self.until[m]]
+                    if not ready and not any(self.busy.values()):
+                        self.cond.notify_all()			#for wait()
+                        dwell=max(self.until.values())-now
+                        self.cond.wait(dwell if dwell>0 else None)
+                        continue
+                for m in ready:
+                    self._dispatch(m)
+                if any(self.busy.values()):
+                    if self.stopEvent.wait(self.interval):
+                        break
+                    if int(bp.CMD("BRIDGE.getSRQ()")) or time.monotonic()-self.lastCheck>=self.watchdog:
+                        self._completions()
+            except (bp.CMDtimeout, ValueError) as e:
+                self.errors+=1
+                self.lastError=e
+            with self.cond:
+                self.cond.notify_all()
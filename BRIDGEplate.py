@@ -1,6 +1,11 @@
+import contextlib
+import heapq
+import itertools
+import os
 import serial
 import re
 import sys
+import threading
 import time
 try:
     import serial.tools.list_ports
@@ -50,16 +55,521 @@ def find_ports_by_vid_pid(target_vid, target_pid):
         print(f"Error searching COM ports: {e}") 
     return matching_ports
 
-def CMD(cmd):
+SAFETY=0							#command priority classes, most urgent first
+NORMAL=1
+BULK=2
+SAFETY_CMDS=("relayON", "relayOFF", "relayALL", "relayTOGGLE", "setDOUT", "clrDOUT", "toggleDOUT", "setDAC", "setPWM", "motorSTOP", "motorOFF", "motorDISABLE", "fgOFF")	#outputs that must not wait behind data transfers
+BULK_CMDS=("getBLOCK", "getSTREAM", "getOSCtraces", "srTable", "help")
+
+class PortLock:
+    """Reentrant lock for the BRIDGEplate link, granted to the most urgent waiter first
+    (lowest priority class, then first come first served)"""
+    def __init__(self):
+        self.cond=threading.Condition()
+        self.owner=None
+        self.depth=0
+        self.waiting=[]						#heap of (priority, arrival, thread)
+        self.arrivals=itertools.count()
+        self.maxWait={}						#priority class -> longest wait for the link, seconds
+
+    def acquire(self, priority=None):
+        me=threading.get_ident()
+        with self.cond:
+            if self.owner==me:
+                self.depth+=1
+                return True
+            if priority is None:
+                priority=getattr(_local, "priority", None)
+                priority=NORMAL if priority is None else priority
+            entry=(priority, next(self.arrivals), me)
+            t=time.monotonic()
+            heapq.heappush(self.waiting, entry)
+            while self.owner is not None or self.waiting[0] is not entry:
+                self.cond.wait()
+            heapq.heappop(self.waiting)
+            self.owner=me
+            self.depth=1
+            self.maxWait[priority]=max(self.maxWait.get(priority, 0.0), time.monotonic()-t)
+        return True
+
+    def release(self):
+        with self.cond:
+            self.depth-=1
+            if self.depth==0:
+                self.owner=None
+                self.cond.notify_all()
+
+    def __enter__(self):
+        return self.acquire()
+
+    def __exit__(self, *exc):
+        self.release()
+
+    @contextlib.contextmanager
+    def at(self, priority):
+        self.acquire(priority)
+        try:
+            yield self
+        finally:
+            self.release()
+
+_local=threading.local()					#per-thread priority() class and lastTIMING()
+cancelled=threading.Event()
+_readyWaiters=set()						#events of threads in waitCANCEL(), set by cancelCMD()
+portLock=PortLock()						#one command/response exchange at a time
+supervisor=None							#optional connection Supervisor, see BRIDGEsupervisor.py
+_sent=False
+_stale=None							#a cancelled command's reply may still arrive until this time
+syncID=None							#the BRIDGEplate's reply to SYNC, learned by CMDS()
+_owedSyncs=0							#SYNC replies still owed by commands that were given up on
+_torn=b""							#start of a reply line that was given up on mid-line
+recorder=None							#optional wire-level FlightRecorder, see BRIDGErecorder.py
+
+SLICE=0.05							#serial read timeout; longer waits are built from slices so they can be cancelled
+DEADLINE=0.5							#default time allowed for a response, seconds
+DEADLINES={							#commands that take longer than the default
+    "THERMO.getTEMP": 2.0,					#~0.6 s per thermocouple (0.72 s at 50 Hz), ~1 s per DS18B20
+    "THERMO.getRAW": 1.5,
+    "THERMO.RESET": 3.0,
+    "DAQC.getTEMP": 2.0,					#DS18B20 conversion ~1 s
+    "DAQC.getRANGE": 1.0,
+    "DAQC2.getOSCtraces": 12.0,					#1024 samples at the slowest 100 Hz sweep
+    "DAQC2.RESET": 3.0,
+    "ADC.initADC": 3.0,
+    "BRIDGE.resetSTACK": 5.0,
+    "BRIDGE.resetBRIDGE": 5.0,
+}
+RETRIES=1							#extra attempts for idempotent reads after a timeout
+READS=("get", "read", "check4", "relaySTATE")			#command prefixes that only read state
+NORETRY=("getEVENTS", "getINTflags", "getSINGLE", "getSCAN", "getBLOCK", "getSTREAM", "getOSCtraces")	#reads that consume data
+SYNC="BRIDGE.getID()\n"					#harmless command used to find the end of stale responses
+BYTE_TIME=12/115200						#allowance per expected response byte
+VALUE_BYTES=10							#characters per value in a response, e.g. "-4.123456,"
+LINK_DELAY=0.0							#extra allowance for queueing transports (a shared BRIDGEserver)
+PIPELINE=8							#commands CMDS() keeps in flight
+
+ADCrates=[1.25, 2.5, 5, 10, 16.63, 20.01, 49.68, 59.52, 100.2, 200.3, 381, 503.8, 1007, 2597, 5208, 10417, 15625, 31250]	#samples/s per rate index
+ADCmodes={"SLOW": 4, "MED": 9, "FAST": 13}			#rate index used by the basic modes
+ADCconfig={}							#addr -> tracked ADCplate configuration
+OSCrates=[100, 200, 500, 1000, 2000, 5000, 10000, 20000, 50000, 100000, 200000, 500000, 1000000]	#DAQC2 oscilloscope samples/s per sweep index
+OSC_DEPTH=1024							#samples per oscilloscope trace
+OSCsweep={}							#addr -> tracked DAQC2 sweep index
+READY={}							#(fetch command, addr) -> earliest time its acquisition can be complete
+
+class CMDtimeout(TimeoutError):
+    """No complete response arrived before the command deadline"""
+
+class CMDcancelled(CMDtimeout):
+    """The command was cancelled with cancelCMD()"""
+
+class CMDlost(ConnectionError):
+    """The connection failed after a command that is unsafe to repeat was sent"""
+
+def _tracks(plates, names, nkey, group=None, toggle=None):
+    for p in plates:
+        for n in names:
+            TRACK[p+"."+n]=(p+"."+(group or n), nkey, toggle and p+"."+toggle)
+
+TRACK={}							#setter -> (state group, number of target arguments, toggle base group)
+_tracks(("ADC", "CURRENT", "DAQC", "DIGI", "RELAY", "RELAY2", "THERMO"), ("setLED", "clrLED"), 1, "LED")
+_tracks(("ADC", "CURRENT", "DAQC", "DIGI", "RELAY", "RELAY2", "THERMO"), ("toggleLED",), 1, "LED", "LED")
+_tracks(("DAQC2",), ("setLED",), 1, "LED")
+_tracks(("ADC",), ("setMODE", "configTRIG", "triggerFREQ"), 1)
+_tracks(("ADC",), ("configINPUT",), 2)
+_tracks(("ADC",), ("enableINPUT", "disableINPUT"), 2, "INPUTen")
+_tracks(("ADC",), ("enableEVENTS", "disableEVENTS"), 1, "EVENTS")
+_tracks(("ADC", "DIGI"), ("enableDINevent", "disableDINevent"), 2, "DINevent")
+_tracks(("DAQC", "DAQC2"), ("setDOUTbit", "clrDOUTbit"), 2, "DOUTbit")
+_tracks(("DAQC", "DAQC2"), ("toggleDOUTbit",), 2, "DOUTbit", "setDOUTall")
+_tracks(("DAQC", "DAQC2"), ("setDOUTall",), 1)
+_tracks(("DAQC", "DAQC2"), ("setPWM", "setDAC"), 2)
+_tracks(("DAQC", "DAQC2"), ("enableDINint", "disableDINint"), 2, "DINint")
+_tracks(("DAQC",), ("intENABLE", "intDISABLE"), 1, "INT")
+_tracks(("DAQC2", "THERMO"), ("intEnable", "intDisable"), 1, "INT")
+_tracks(("DAQC2",), ("fgON", "fgOFF"), 1, "fg")
+_tracks(("DAQC2",), ("fgFREQ", "fgTYPE", "fgLEVEL"), 1)
+_tracks(("DAQC2",), ("motorENABLE", "motorDISABLE"), 2, "motorEN")
+_tracks(("DAQC2",), ("motorINTenable", "motorINTdisable"), 2, "motorINT")
+_tracks(("DAQC2",), ("motorRATE", "motorDIR"), 2)
+_tracks(("DIGI",), ("eventEnable", "eventDisable"), 1, "event")
+_tracks(("RELAY", "RELAY2"), ("relayON", "relayOFF"), 2, "relay")
+_tracks(("RELAY", "RELAY2"), ("relayTOGGLE",), 2, "relay", "relayALL")
+_tracks(("RELAY", "RELAY2"), ("relayALL",), 1)
+_tracks(("THERMO",), ("setSCALE",), 0)
+_tracks(("THERMO",), ("setTYPE", "setINTchannel"), 2)
+_tracks(("THERMO",), ("setLINEFREQ",), 1)
+_tracks(("THERMO",), ("setSMOOTH", "clrSMOOTH"), 1, "SMOOTH")
+RESETS={"ADC.initADC": "ADC", "DAQC2.RESET": "DAQC2", "THERMO.RESET": "THERMO", "BRIDGE.resetSTACK": None, "BRIDGE.resetBRIDGE": None}
+NORESEND=("toggleLED", "toggleDOUTbit", "relayTOGGLE", "motorMOVE", "motorJOG", "swTRIGGER", "trigOSCnow")	#unsafe to repeat after a lost connection
+STATE={}							#(group, target args) -> command lines, in the order they last changed
+
+def _track(name, cmd):
+    #Remember the latest absolute setting of every output and configuration item
+    group, nkey, toggle=TRACK[name]
+    args=tuple(a.strip() for a in cmd.partition("(")[2].rstrip(")").split(","))[:nkey]
+    key=(group, args)
+    lines=STATE.pop(key, None)
+    if not toggle:
+        STATE[key]=[cmd]
+    elif lines is not None:					#toggles only replay on top of a known absolute setting
+        if lines[-1]==cmd:
+            lines.pop()
+        else:
+            lines.append(cmd)
+        STATE[key]=lines
+    elif (toggle, args[:1]) in STATE:				#...which may be a whole-port setter
+        STATE[key]=[cmd]
+
+def _reset(name, cmd):
+    plate=RESETS[name]
+    addr=cmd.partition("(")[2].rstrip(")").split(",")[0].strip()
+    for key in list(STATE):
+        if plate is None or (key[0].startswith(plate+".") and key[1][:1]==(addr,)):
+            del STATE[key]
+    if plate=="THERMO":
+        STATE.pop(("THERMO.setSCALE", ()), None)		#RESET returns the scale to Celsius
+
+def replaySTATE():
+    """Re-send the tracked configuration and output settings, oldest change first"""
+    with portLock:
+        for lines in list(STATE.values()):
+            for line in lines:
+                _exchange(line, cmdDEADLINE(line), RETRIES)
+
+@contextlib.contextmanager
+def priority(cls):
+    """Send this thread's commands in priority class cls (SAFETY, NORMAL or BULK) inside the block"""
+    prev=getattr(_local, "priority", None)
+    _local.priority=cls
+    try:
+        yield
+    finally:
+        _local.priority=prev
+
+def cmdPRIORITY(cmd):
+    """Priority class of cmd: the thread's priority() if set, else SAFETY for outputs, BULK for data transfers"""
+    cls=getattr(_local, "priority", None)
+    if cls is not None:
+        return cls
+    func=cmd.partition("(")[0].rpartition(".")[2]
+    if func.startswith(SAFETY_CMDS):
+        return SAFETY
+    if func in BULK_CMDS:
+        return BULK
+    return NORMAL
+
+def _arg0(cmd):
+    return cmd.partition("(")[2].partition(",")[0].rstrip(")").strip()
+
+def _waitREADY(name, cmd):
+    #Keep the link free while a block or sweep is still being acquired; the firmware
+    #would otherwise hold back every other command until the data is complete
+    t=READY.pop((name, _arg0(cmd)), None)
+    if t is not None and waitCANCEL(t-time.monotonic()):
+        raise CMDcancelled(cmd+" cancelled")
+
+def waitCANCEL(seconds):
+    """Wait off the link for up to seconds; True if cancelCMD() was called meanwhile"""
+    if seconds<=0:
+        return False
+    woken=threading.Event()					#own event: no other waiter can clear a cancel meant for this one
+    _readyWaiters.add(woken)
+    try:
+        return woken.wait(seconds)
+    finally:
+        _readyWaiters.discard(woken)
+
+def lastTIMING():
+    """(send time, receive time, response bytes) of this thread's last command, time.monotonic() seconds"""
+    return getattr(_local, "timing", None)
+
+def setSUPERVISOR(sup):
+    """Let sup (a BRIDGEsupervisor.Supervisor) recover from lost connections, None to disable"""
+    global supervisor
+    supervisor=sup
+
+def setRECORDER(rec):
+    """Capture all serial traffic in rec (a BRIDGErecorder.FlightRecorder), None to stop"""
+    global recorder
+    recorder=rec
+
+def cancelCMD():
+    """Abort the command currently waiting for a response (from another thread or a signal handler)"""
+    cancelled.set()
+    for woken in list(_readyWaiters):				#no lock: safe to call from a signal handler
+        woken.set()
+
+def _adc(addr):
+    #None: not seen since the start or an initADC, the plate may be in any state
+    cfg=ADCconfig.get(addr)
+    if cfg is None:
+        cfg=ADCconfig[addr]={"mode": None, "rates": [None]*16, "enabled": [None]*16, "block": 0}
+    return cfg
+
+def _adcArgs(args):
+    vals=[a.strip().strip("'\"") for a in args.rstrip(")").split(",")]
+    return int(vals[0]), vals[1:]
+
+def _adcChannel(ch):
+    if ch[:1].upper() in ("S", "D", "I"):			#'S0'..'S7', 'D0'..'D3', 'I0'..'I3'
+        return int(ch[1:])+{"S": 0, "D": 8, "I": 12}[ch[:1].upper()]
+    return int(ch)
+
+def adcTIME(addr, channels, unset=0):
+    """Predicted conversion time of the given ADCplate channels, seconds; rate index unset
+    (the slowest by default) is assumed for a mode or channel rate not set yet"""
+    cfg=_adc(addr)
+    if cfg["mode"]!="ADV":
+        return len(channels)/ADCrates[ADCmodes.get(cfg["mode"], unset)]
+    return sum(1/ADCrates[unset if cfg["rates"][ch] is None else cfg["rates"][ch]] for ch in channels)
+
+def _adcTrack(name, args):
+    #Follow ADCplate configuration commands so read deadlines match the sample rates
+    addr, vals=_adcArgs(args)
+    cfg=_adc(addr)
+    if name=="ADC.setMODE":
+        cfg["mode"]=vals[0].upper()
+    elif name=="ADC.configINPUT":
+        ch=_adcChannel(vals[0])
+        cfg["rates"][ch]=int(vals[1])
+        cfg["enabled"][ch]=len(vals)<3 or vals[2] not in ("0", "False")
+    elif name=="ADC.enableINPUT":
+        cfg["enabled"][_adcChannel(vals[0])]=True
+    elif name=="ADC.disableINPUT":
+        cfg["enabled"][_adcChannel(vals[0])]=False
+    elif name=="ADC.startBLOCK":
+        cfg["block"]=int(vals[0])
+    elif name=="ADC.initADC":
+        del ADCconfig[addr]
+
+def _adcDeadline(name, args):
+    addr, vals=_adcArgs(args)
+    cfg=_adc(addr)
+    scan=[ch for ch in range(16) if cfg["enabled"][ch] is not False]	#inputs not seen yet may be enabled
+    if name in ("ADC.getADC", "ADC.readSINGLE", "ADC.getSINGLE"):
+        t=adcTIME(addr, [_adcChannel(vals[0])] if vals and vals[0] else range(16))
+        n=1
+    elif name=="ADC.getADCall":
+        t, n=adcTIME(addr, range(12)), 12
+    elif name=="ADC.getSall":
+        t, n=adcTIME(addr, range(8)), 8
+    elif name=="ADC.getDall":
+        t, n=adcTIME(addr, range(8, 12)), 4
+    elif name=="ADC.getIall":
+        t, n=adcTIME(addr, range(12, 16)), 4
+    elif name in ("ADC.readSCAN", "ADC.getSCAN"):
+        t, n=adcTIME(addr, scan), len(scan)
+    elif name=="ADC.getBLOCK":
+        t, n=cfg["block"]*adcTIME(addr, scan), cfg["block"]*len(scan)
+    elif name=="ADC.getSTREAM":
+        t, n=0.0, 1024*max(len(scan), 1)
+    else:
+        return DEADLINE
+    return DEADLINE+1.5*t+n*VALUE_BYTES*BYTE_TIME
+
+ADCtracked=("ADC.setMODE", "ADC.configINPUT", "ADC.enableINPUT", "ADC.disableINPUT", "ADC.startBLOCK", "ADC.initADC")
+
+def cmdDEADLINE(cmd):
+    """Seconds allowed for the response to cmd, e.g. cmdDEADLINE("ADC.getADCall(0)")"""
+    name, _, args=cmd.partition("(")
+    if name.startswith("ADC."):
+        return _adcDeadline(name, args)
+    return DEADLINES.get(name, DEADLINE)
+
+def _owed(cmds, rxds):
+    #Marker replies still due after cmds were answered only by rxds: a lost line shifts
+    #the marker's reply earlier, so count the markers actually seen rather than their places
+    sent=sum(1 for cmd in cmds if cmd.strip()==SYNC.strip())
+    seen=sum(1 for rxd in rxds if syncID is not None and rxd.strip()==syncID.strip())
+    return max(sent-seen, 0)
+
+def resync(pending=0.0):
+    """Discard late responses so the next command starts on a clean line.
+    A marker command is written and every line up to its reply is dropped; the
+    firmware answers in order, so any reply still pending (for up to pending
+    seconds) arrives before the marker's. Marker replies owed by abandoned
+    commands are skipped as well. Raises CMDtimeout if the marker's reply does
+    not arrive in time; the next command then tries again."""
+    global _stale, _owedSyncs, _torn
+    txd=SYNC.encode('utf-8')
+    if recorder is not None:
+        recorder.tx(txd)
+    ser.write(txd)
+    end=time.monotonic()+pending+DEADLINE+LINK_DELAY
+    if syncID is None:					#marker reply unknown: drain for the whole time
+        while time.monotonic()<end:
+            rxd=ser.read_until()
+            if rxd and recorder is not None:
+                recorder.rx(rxd)
+        ser.reset_input_buffer()
+        _owedSyncs=0
+        _torn=b""
+        return
+    need=_owedSyncs+1
+    line, _torn=_torn, b""
+    while time.monotonic()<end:
+        rxd=ser.read_until()
+        if recorder is not None and rxd:
+            recorder.rx(rxd)
+        line+=rxd
+        if line[-1:]!=b"\n":					#partial line: keep reading it
+            continue
+        if line.strip()==syncID.strip():
+            need-=1
+            if need==0:
+                _owedSyncs=0
+                return
+        line=b""
+    _owedSyncs=need-1					#the next resync sends its own marker
+    _stale=time.monotonic()
+    raise CMDtimeout("link out of step: no reply to the resync marker")
+
+def _exchange(cmd, deadline, retries):
+    #Write one command line and return the raw response line
+    global _stale, _sent, _owedSyncs, _torn
+    txd=(cmd+"\n").encode('utf-8')				#add newline character
+    if _stale is not None:
+        resync(max(_stale-time.monotonic(), 0.0))
+        _stale=None
+    cancelled.clear()
+    _sent=False
+    for attempt in range(retries+1):
+        if recorder is not None:
+            recorder.tx(txd)
+        tSend=time.monotonic()
+        ser.write(txd)
+        _sent=True
+        #xresp = str(ser.read_until(expected='\n'),'utf-8')	#this cmd took WAY too long!
+        end=time.monotonic()+deadline
+        rxd=ser.read_until()
+        while rxd[-1:]!=b"\n" and time.monotonic()<end and not cancelled.is_set():
+            rxd+=ser.read_until()
+        if recorder is not None:
+            recorder.rx(rxd)
+        if rxd[-1:]==b"\n":
+            _local.timing=(tSend, time.monotonic(), len(rxd))
+            return rxd
+        _torn=rxd
+        if cancelled.is_set():
+            _stale=end						#next command resyncs first
+            _owedSyncs+=_owed([cmd], [])
+            raise CMDcancelled(cmd+" cancelled")
+        _owedSyncs+=_owed([cmd], [])
+        resync(deadline)
+    raise CMDtimeout(f"no response to {cmd} within {deadline:.3g} s")
+
+def CMD(cmd, deadline=None, retries=None):
     #global ser
-    cmd+="\n"							#add newline character
-    ser.write(cmd.encode('utf-8'))
-    #xresp = str(ser.read_until(expected='\n'),'utf-8')	#this cmd took WAY too long!
-    xresp = str(ser.read_until(),'utf-8')
+    name=cmd.partition("(")[0]
+    if deadline is None:
+        deadline=cmdDEADLINE(cmd)+LINK_DELAY
+    if retries is None:
+        retries=RETRIES if name.rpartition(".")[2].startswith(READS) and not name.endswith(NORETRY) else 0
+    if READY:
+        _waitREADY(name, cmd)
+    with portLock.at(cmdPRIORITY(cmd)):
+        while True:
+            try:
+                rxd=_exchange(cmd, deadline, retries)
+                break
+            except CMDtimeout:
+                raise
+            except (serial.SerialException, OSError) as e:
+                if supervisor is None:
+                    raise
+                sent=_sent
+                supervisor.recover(e)				#returns once reconnected and STATE is replayed
+                if sent and name.endswith(NORESEND):
+                    raise CMDlost(cmd+" may or may not have run before the connection was lost") from e
+        _after(name, cmd)
+    xresp = str(rxd,'utf-8')
     xresp2=xresp.replace("\r", "")		#strip off CR if present
     xresp3=xresp2.replace("\n", "")		#strip off LF if present
     return xresp3
 
+def _after(name, cmd):
+    #Bookkeeping for a command the BRIDGEplate has answered
+    if name in TRACK:
+        _track(name, cmd)
+    elif name in RESETS:
+        _reset(name, cmd)
+    if name in ADCtracked:
+        _adcTrack(name, cmd.partition("(")[2])
+    if name=="ADC.startBLOCK":
+        addr=int(_arg0(cmd))
+        cfg=_adc(addr)
+        READY[("ADC.getBLOCK", str(addr))]=time.monotonic()+cfg["block"]*adcTIME(addr, [ch for ch in range(16) if cfg["enabled"][ch]], len(ADCrates)-1)	#earliest: fastest rate if unknown
+    elif name=="DAQC2.setOSCsweep":
+        OSCsweep[_arg0(cmd)]=int(cmd.rstrip(")").rpartition(",")[2])
+    elif name=="DAQC2.runOSC" and _arg0(cmd) in OSCsweep:
+        READY[("DAQC2.getOSCtraces", _arg0(cmd))]=time.monotonic()+OSC_DEPTH/OSCrates[OSCsweep[_arg0(cmd)]]
+
+def _window(cmds):
+    #Send cmds followed by the SYNC marker and return their response lines, or None when
+    #the replies do not line up with the commands (a lost or extra line)
+    global _stale, syncID, _owedSyncs, _torn
+    if syncID is None:
+        syncID=_exchange(SYNC.rstrip(), DEADLINE, RETRIES)
+    txd="".join(cmd+"\n" for cmd in cmds).encode('utf-8')+SYNC.encode('utf-8')
+    if recorder is not None:
+        recorder.tx(txd)
+    ser.write(txd)
+    rxds=[]
+    for cmd in cmds+[SYNC]:
+        end=time.monotonic()+cmdDEADLINE(cmd.rstrip())+LINK_DELAY	#replies arrive in order, each within its own deadline
+        rxd=ser.read_until()
+        while rxd[-1:]!=b"\n" and time.monotonic()<end and not cancelled.is_set():
+            rxd+=ser.read_until()
+        if recorder is not None:
+            recorder.rx(rxd)
+        if rxd[-1:]!=b"\n":
+            _stale=end+sum(cmdDEADLINE(c) for c in cmds[len(rxds):])	#the rest may still be answered
+            _owedSyncs+=_owed(cmds+[SYNC], rxds)
+            _torn=rxd
+            if cancelled.is_set():
+                raise CMDcancelled(cmd+" cancelled")
+            return None
+        rxds.append(rxd)
+    if rxds[-1]!=syncID:					#an extra line came first: the marker's reply is still due
+        _stale=time.monotonic()
+        _owedSyncs+=_owed(cmds+[SYNC], rxds)
+        return None
+    rxds.pop()
+    return rxds
+
+def CMDS(cmds):
+    """Pipelined CMD(): send commands PIPELINE at a time and return their responses in order.
+    A window whose replies do not line up, time out or hit a lost connection is sent again
+    one command at a time with CMD(); a window holding commands that must not run twice
+    (NORESEND) or that consume data (NORETRY) raises CMDlost instead."""
+    global _stale
+    resps=[]
+    for i in range(0, len(cmds), PIPELINE):		#the link is released between windows
+        window=list(cmds[i:i+PIPELINE])
+        with portLock.at(min(cmdPRIORITY(cmd) for cmd in window)):
+            try:
+                if _stale is not None:
+                    resync(max(_stale-time.monotonic(), 0.0))
+                    _stale=None
+                cancelled.clear()
+                rxds=_window(window)
+            except CMDtimeout:					#a TimeoutError, so an OSError: not a lost connection
+                raise
+            except (serial.SerialException, OSError):
+                if supervisor is None:
+                    raise
+                rxds=None
+            if rxds is None:
+                once=[cmd for cmd in window if cmd.partition("(")[0].endswith(NORESEND+NORETRY)]
+                if once:
+                    raise CMDlost(once[0]+" may or may not have run: its pipelined window went out of step")
+                resps+=[CMD(cmd) for cmd in window]
+                continue
+            for cmd, rxd in zip(window, rxds):
+                _after(cmd.partition("(")[0], cmd)
+                resps.append(str(rxd,'utf-8').replace("\r", "").replace("\n", ""))
+    return resps
+
 def printL(name, pList):
     print(name,end=' ')
     for i in range(7):
@@ -73,7 +583,10 @@ def parseIt(cmd,args):
     #addr=args[0]
     cmdStr=cmd+"("+argStr+")"
     #print(cmdStr)
-    comma_string=CMD(cmdStr)
+    return parseResp(CMD(cmdStr))
+
+def parseResp(comma_string):
+    """Convert a response line to a number, string or list of numbers"""
     if ',' not in comma_string:		# No commas, so just convert to number if possible and return
         return convert_to_number(comma_string.strip())
     elements = [element.strip() for element in comma_string.split(',')]	# Split the string by commas and strip whitespace  
@@ -84,10 +597,37 @@ def parseIt(cmd,args):
     return converted_list
 
 def dispBlock(cmd):
+    with portLock.at(cmdPRIORITY(cmd)):
+        _dispBlock(cmd)
+
+def CMDblock(cmd, timeout=5.0):
+    """Return the text a display command (e.g. "ADC.srTable") prints, instead of printing it"""
+    txd=(cmd+"()\n").encode('utf-8')
+    buffer=b""
+    with portLock.at(cmdPRIORITY(cmd)):
+        if recorder is not None:
+            recorder.tx(txd)
+        ser.write(txd)
+        last=time.monotonic()
+        while b"<<<END>>>" not in buffer and time.monotonic()-last<timeout:
+            rxd=ser.read_until(b"<<<END>>>")
+            if rxd:
+                if recorder is not None:
+                    recorder.rx(rxd)
+                buffer+=rxd
+                last=time.monotonic()
+        if b"<<<END>>>" in buffer:
+            ser.read_until()					#rest of the marker line
+    return buffer.decode('utf-8', errors='replace').partition("<<<END>>>")[0]
+
+def _dispBlock(cmd):
     #global ser
     timeout=5.0
     cmd+="()\n"							#add newline character
-    ser.write(cmd.encode('utf-8'))
+    txd=cmd.encode('utf-8')
+    if recorder is not None:
+        recorder.tx(txd)
+    ser.write(txd)
     #Display output from the RP2350 until <<<END>>> is received
     buffer = ""
     #start_time = time.time()
@@ -95,7 +635,10 @@ def dispBlock(cmd):
     while True:
         if ser.in_waiting > 0:
             # Read and decode data
-            data = ser.read(ser.in_waiting).decode('utf-8', errors='replace')
+            rxd = ser.read(ser.in_waiting)
+            if recorder is not None:
+                recorder.rx(rxd)
+            data = rxd.decode('utf-8', errors='replace')
             buffer += data
             
             # Check if we've received the termination marker
@@ -1572,6 +2115,13 @@ class THERMO:
         resp = parseIt("THERMO.clrINT", myList)
         return resp
     
+def _probe(cmd):
+    #Discovery treats a plate that does not answer in time as absent
+    try:
+        return CMD(cmd)
+    except CMDtimeout:
+        return ""
+
 def POLL():
     #global ser
     ADCplates=['-','-','-','-','-','-','-','-']
@@ -1584,32 +2134,32 @@ def POLL():
     RELAYplate2s=['-','-','-','-','-','-','-','-']
     THERMOplates=['-','-','-','-','-','-','-','-']
     for i in range(8):
-        resp=CMD("ADC.getADDR("+str(i)+")")
-        if (resp[0]==str(i)):
+        resp=_probe("ADC.getADDR("+str(i)+")")
+        if (resp[:1]==str(i)):
             ADCplates[i]=str(i)
-        resp=CMD("CURRENT.getADDR("+str(i)+")")
-        if (resp[0]==str(i)):
+        resp=_probe("CURRENT.getADDR("+str(i)+")")
+        if (resp[:1]==str(i)):
             CURRENTplates[i]=str(i)
-        resp=CMD("DAQC.getADDR("+str(i)+")")
-        if (resp[0]==str(i)):
+        resp=_probe("DAQC.getADDR("+str(i)+")")
+        if (resp[:1]==str(i)):
             DAQCplates[i]=str(i)            
-        resp=CMD("DAQC2.getADDR("+str(i)+")")
-        if (resp[0]==str(i)):
+        resp=_probe("DAQC2.getADDR("+str(i)+")")
+        if (resp[:1]==str(i)):
             DAQC2plates[i]=str(i)
-        resp=CMD("DIGI.getADDR("+str(i)+")")
-        if (resp[0]==str(i)):
+        resp=_probe("DIGI.getADDR("+str(i)+")")
+        if (resp[:1]==str(i)):
             DIGIplates[i]=str(i)
-#         resp=CMD("MOTOR.getADDR("+str(i)+")")
-#         if (resp[0]==str(i)):
+#         resp=_probe("MOTOR.getADDR("+str(i)+")")
+#         if (resp[:1]==str(i)):
 #             MOTORplates[i]=str(i)
-        resp=CMD("RELAY.getADDR("+str(i)+")")
-        if (resp[0]==str(i)):
+        resp=_probe("RELAY.getADDR("+str(i)+")")
+        if (resp[:1]==str(i)):
             RELAYplates[i]=str(i)
-        resp=CMD("RELAY2.getADDR("+str(i)+")")
-        if (resp[0]==str(i)):
+        resp=_probe("RELAY2.getADDR("+str(i)+")")
+        if (resp[:1]==str(i)):
             RELAYplate2s[i]=str(i)
-        resp=CMD("THERMO.getADDR("+str(i)+")")
-        if (resp[0]==str(i)):
+        resp=_probe("THERMO.getADDR("+str(i)+")")
+        if (resp[:1]==str(i)):
             THERMOplates[i]=str(i)            
     printL("ADCplates:    ",ADCplates)
     printL("CURRENTplates:",CURRENTplates)
@@ -1622,12 +2172,32 @@ def POLL():
     printL("THERMOplates: ",THERMOplates)
     return
 
+def openPORT(port, baud=115200):
+    """Use port (a device path or COM name, e.g. a BRIDGEemulator pty) as the BRIDGEplate connection"""
+    return setPORT(serial.Serial(port, baud, timeout=SLICE), port)
+
+def setPORT(port, name=None):
+    """Use an open serial-like object (write, read_until, read, in_waiting) as the BRIDGEplate connection"""
+    global ser, matches, _stale, syncID, _owedSyncs, _torn
+    port.timeout = SLICE	# CMD() waits in short slices up to each command's deadline
+    ser = port
+    _stale = None
+    _owedSyncs = 0
+    _torn = b""
+    syncID = None
+    matches = name if name is not None else getattr(port, "port", None)
+    return ser
+
 pivid="2E8A"
 pipid="10E3"
-matches = find_ports_by_vid_pid(pivid,pipid)
-if (matches):
-    #print ("BRIDGEplate found on "+matches)
-    ser = serial.Serial(matches, 115200, timeout=20) # Open port at 115200 baud, with a 20-second timeout (for slow ADCplate sample rates)
+_server = os.environ.get("BRIDGEPLATE_SERVER")	# socket of a BRIDGEserver that owns the port
+if (_server):
+    import BRIDGEserver
+    BRIDGEserver.connect(_server)	# sets matches to "unix:<socket>"
 else:
-    print ("No COM port found with an attached BRDGEplate.")
-
+    matches = find_ports_by_vid_pid(pivid,pipid)
+    if (matches):
+        #print ("BRIDGEplate found on "+matches)
+        openPORT(matches)	# Open port at 115200 baud; response deadlines are set per command (see cmdDEADLINE)
+    else:
+        print ("No COM port found with an attached BRDGEplate.")
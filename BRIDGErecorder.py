@@ -0,0 +1,170 @@
+import os
+import signal
+import struct
+import sys
+import time
+
+"""
+FlightRecorder - wire-level capture of BRIDGEplate serial traffic
+Every command line written by CMD()/dispBlock() and every response read back is
+stored with a time.monotonic_ns() timestamp in a fixed-size, preallocated ring.
+Nothing is formatted or allocated when a record is logged, so the recorder can
+stay enabled under full polling load. The ring is written to a file with dump(),
+either on demand, from a signal handler, or when an uncaught exception occurs.
+
+Usage:
+    from BRIDGEplate import *
+    from BRIDGErecorder import FlightRecorder
+    rec = FlightRecorder(1<<20)		#1 MB of history
+    rec.autodump("bridge.rec")		#dump on SIGUSR1 and on uncaught exceptions
+    setRECORDER(rec)
+    ...
+    for t, direction, data in readDUMP("bridge.rec"):
+        print(t, "TX" if direction==TX else "RX", data)
+
+Dump file format: the 8 byte MAGIC followed by records, oldest first. Each record
+is a 12 byte little-endian header (uint64 t_ns, uint8 direction, uint8 flags,
+uint16 length) followed by length bytes of payload.
+"""
+
+TX=0								#host -> BRIDGEplate
+RX=1								#BRIDGEplate -> host
+TRUNCATED=1							#flag: payload was cut to maxRecord bytes
+
+MAGIC=b"BPFR\x00\x01\r\n"
+HEADER=struct.Struct("<QBBH")
+_WRAP=0xFF							#direction marker: rest of ring is unused
+
+class FlightRecorder:
+    def __init__(self, size=1<<20, maxRecord=8192):
+        if maxRecord>0xFFFF:
+            maxRecord=0xFFFF
+        if size<4*(HEADER.size+maxRecord):
+            raise ValueError("ring size must hold at least 4 maximum size records")
+        self.size=size
+        self.maxRecord=maxRecord
+        self.buf=bytearray(size)
+        self.mv=memoryview(self.buf)
+        self.head=0					#offset where the next record is written
+        self.tail=0					#offset of the oldest intact record
+        self.wrapped=False
+        self.records=0					#total records logged
+        self.dropped=0					#records overwritten by newer ones
+        self.dumpPath=None
+
+    def log(self, direction, data):
+        n=len(data)
+        flags=0
+        if n>self.maxRecord:
+            n=self.maxRecord
+            flags=TRUNCATED
+        end=self.head+HEADER.size+n
+        if end>self.size:				#no room before the end of the ring, start over at 0
+            if self.head+HEADER.size<=self.size:
+                HEADER.pack_into(self.buf, self.head, 0, _WRAP, 0, 0)
+            if self.wrapped:				#whatever is left of the previous lap is now the oldest data
+                self._release(self.size)
+            self.head=0
+            self.tail=0
+            self.wrapped=True
+            end=HEADER.size+n
+        if self.wrapped:
+            self._release(end)
+        HEADER.pack_into(self.buf, self.head, time.monotonic_ns(), direction, flags, n)
+        self.mv[self.head+HEADER.size:end]=data if flags==0 else data[:n]
+        self.head=end
+        self.records+=1
+
+    def tx(self, data):
+        self.log(TX, data)
+
+    def rx(self, data):
+        self.log(RX, data)
+
+    def _release(self, end):
+        #Drop the records of the previous lap that overlap [head, end)
+        buf=self.buf
+        while self.tail<end:
+            if self.tail+HEADER.size>self.size or buf[self.tail+8]==_WRAP:
+                self.wrapped=False			#previous lap fully overwritten
+                self.tail=0
+                return
+            self.tail+=HEADER.size+(buf[self.tail+10]|(buf[self.tail+11]<<8))
+            self.dropped+=1
+            if self.tail>=self.size:
+                self.wrapped=False
+                self.tail=0
+                return
+
+    def _spans(self):
+        #Return the (start, stop) byte ranges holding records, oldest first
+        if not self.wrapped:
+            return [(0, self.head)]
+        buf=self.buf
+        stop=self.tail
+        while stop+HEADER.size<=self.size and buf[stop+8]!=_WRAP:
+            stop+=HEADER.size+(buf[stop+10]|(buf[stop+11]<<8))
+        return [(self.tail, stop), (0, self.head)]
+
+    def history(self):
+        """Yield (t_ns, direction, data) for every record in the ring, oldest first"""
+        for start, stop in self._spans():
+            yield from _parse(self.mv[start:stop])
+
+    def dump(self, path=None):
+        path=path or self.dumpPath
+        tmp=path+".tmp"
+        with open(tmp, "wb") as f:
+            f.write(MAGIC)
+            for start, stop in self._spans():
+                f.write(self.mv[start:stop])
+        os.replace(tmp, path)
+        return path
+
+    def clear(self):
+        self.head=0
+        self.tail=0
+        self.wrapped=False
+
+    def autodump(self, path, signum=None):
+        """Dump the ring to path on signum (SIGUSR1 by default) and on uncaught exceptions"""
+        self.dumpPath=path
+        if signum is None:
+            signum=getattr(signal, "SIGUSR1", None)
+        if signum is not None:
+            signal.signal(signum, lambda s, f: self.dump())
+        prevHook=sys.excepthook
+        def hook(etype, value, tb):
+            try:
+                self.dump()
+            finally:
+                prevHook(etype, value, tb)
+        sys.excepthook=hook
+
+def _parse(mv):
+    pos=0
+    n=len(mv)
+    while pos+HEADER.size<=n:
+        t, direction, flags, length=HEADER.unpack_from(mv, pos)
+        if direction==_WRAP:
+            break
+        pos+=HEADER.size
+        yield t, direction, bytes(mv[pos:pos+length])
+        pos+=length
+
+def readDUMP(path):
+    """Yield (t_ns, direction, data) from a file written by FlightRecorder.dump()"""
+    with open(path, "rb") as f:
+        blob=f.read()
+    if not blob.startswith(MAGIC):
+        raise ValueError(path+" is not a BRIDGEplate flight recorder dump")
+    yield from _parse(memoryview(blob)[len(MAGIC):])
+
+if __name__ == "__main__":
+    if len(sys.argv)!=2:
+        print("Usage: python BRIDGErecorder.py <dumpfile>")
+        sys.exit(1)
+    t0=None
+    for t, direction, data in readDUMP(sys.argv[1]):
+        t0=t if t0 is None else t0
+        print(f"{(t-t0)/1e6:12.3f} ms  {'>>' if direction==TX else '<<'}  {data!r}")
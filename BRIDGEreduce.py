@@ -0,0 +1,167 @@
+import collections
+import sys
+import time
+try:
+    import numpy as np
+except ImportError:
+    print("Error: numpy package not found. Install with: pip install numpy")
+    sys.exit(1)
+
+"""
+BRIDGEreduce - streaming decimation and windowed aggregation
+Both stages take chunks of rows (samples x channels) as they arrive from ADC
+stream or block reads, oscilloscope traces or periodic getADCall()/getIall()
+polls, keep a constant amount of state between chunks and work on whole chunks
+with numpy.
+
+Decimator keeps every factor-th sample after an optional windowed-sinc low-pass
+filter (anti-aliasing). Aggregator reduces every window of rows to its min, max,
+mean and RMS per channel. Deadband reports polled points by exception: only the
+points that moved past their deadband since they were last reported, or that
+have been silent for their heartbeat time.
+
+Usage:
+    from BRIDGEplate import *
+    from BRIDGEshared import decode
+    from BRIDGEreduce import Aggregator, Decimator
+    agg = Aggregator(window=1000, channels=2)		#one summary per 1000 scans
+    dec = Decimator(factor=10, channels=2)
+    while True:
+        rows = decode(CMD("ADC.getSTREAM(0)"))
+        w = agg.feed(rows)				#None until a window is complete
+        if w is not None:
+            print(w.seq, w.mean, w.rms)		#arrays of (windows, channels)
+        slow = dec.feed(rows)			#1/10 of the rows, low-pass filtered
+
+    polled = Aggregator(window=60, channels=8)		#one per minute of 1 s polls
+    polled.feed(CURRENT.getIall(0))
+
+    db = Deadband(points=8, absolute=0.05, percent=1.0, heartbeat=60)
+    ch = db.feed(CURRENT.getIall(0))			#Changes(t, index, value) to publish
+    print(ch.index, ch.value, db.ratio())
+"""
+
+Windows=collections.namedtuple("Windows", "seq min max mean rms")	#seq: number of the first window
+Changes=collections.namedtuple("Changes", "t index value")		#index: reported points
+
+def lowpass(factor, taps=None):
+    """Windowed-sinc low-pass FIR coefficients for decimating by factor"""
+    taps=taps or 8*factor+1
+    cutoff=0.4/factor					#cycles per input sample, below the new Nyquist of 0.5/factor
+    n=np.arange(taps)-(taps-1)/2
+    h=np.sinc(2*cutoff*n)*np.hamming(taps)
+    return h/h.sum()
+
+class Decimator:
+    def __init__(self, factor, channels=1, filter=True, taps=None):
+        self.factor=factor
+        self.channels=channels
+        self.coeffs=lowpass(factor, taps)[::-1] if filter and factor>1 else np.ones(1)
+        self.hist=None						#last len(coeffs)-1 input rows
+        self.next=0						#offset of the next output in the coming chunk
+
+    def feed(self, rows):
+        """Return the decimated rows of this chunk, (n, channels)"""
+        rows=np.asarray(rows, float).reshape(-1, self.channels)
+        if not len(rows):
+            return rows
+        taps=len(self.coeffs)
+        if self.hist is None:					#start as if the first value had always been there
+            self.hist=np.repeat(rows[:1], taps-1, axis=0)
+        x=np.concatenate((self.hist, rows))
+        picks=np.arange(self.next, len(rows), self.factor)
+        if len(picks):
+            windows=np.lib.stride_tricks.sliding_window_view(x, taps, axis=0)	#(positions, channels, taps)
+            out=windows[picks]@self.coeffs
+            self.next=picks[-1]+self.factor-len(rows)
+        else:
+            out=np.empty((0, self.channels))
+            self.next-=len(rows)
+        self.hist=x[len(x)-(taps-1):]
+        return out
+
+class Aggregator:
+    def __init__(self, window, channels=1, decimator=None, callback=None):
+        self.window=window					#rows per summary
+        self.channels=channels
+        self.decimator=decimator				#optional Decimator applied first
+        self.callback=callback
+        self.buf=np.empty((window, channels))			#rows of the window in progress
+        self.fill=0
+        self.seq=0						#windows completed
+        self.rows=0						#rows consumed
+
+    def _reduce(self, blocks):
+        return (blocks.min(axis=1), blocks.max(axis=1), blocks.mean(axis=1), np.sqrt(np.mean(np.square(blocks), axis=1)))
+
+    def feed(self, rows):
+        """Add a chunk of rows; return Windows for the windows it completes, or None"""
+        rows=np.asarray(rows, float).reshape(-1, self.channels)
+        if self.decimator is not None:
+            rows=self.decimator.feed(rows)
+        self.rows+=len(rows)
+        parts=[]
+        if self.fill:
+            k=min(self.window-self.fill, len(rows))
+            self.buf[self.fill:self.fill+k]=rows[:k]
+            self.fill+=k
+            rows=rows[k:]
+            if self.fill<self.window:
+                return None
+            parts.append(self.buf[None])
+            self.fill=0
+        m=len(rows)//self.window
+        if m:
+            parts.append(rows[:m*self.window].reshape(m, self.window, self.channels))
+        rest=rows[m*self.window:]
+        if not parts:
+            self.buf[:len(rest)]=rest
+            self.fill=len(rest)
+            return None
+        blocks=np.concatenate(parts) if len(parts)>1 else parts[0]
+        w=Windows(self.seq, *self._reduce(blocks))
+        self.buf[:len(rest)]=rest				#after reducing, the buffer may be one of the blocks
+        self.fill=len(rest)
+        self.seq+=len(blocks)
+        if self.callback is not None:
+            self.callback(w)
+        return w
+
+class Deadband:
+    def __init__(self, points, absolute=0.0, percent=0.0, heartbeat=None, callback=None):
+        self.points=points
+        self.absolute=np.broadcast_to(np.asarray(absolute, float), (points,))	#per point, 0 for none
+        self.percent=np.broadcast_to(np.asarray(percent, float), (points,))/100	#of the last reported value
+        self.heartbeat=np.broadcast_to(np.asarray(np.inf if heartbeat is None else heartbeat, float), (points,))
+        self.callback=callback
+        self.last=np.full(points, np.nan)			#last reported values
+        self.sent=np.full(points, -np.inf)			#time.monotonic() they were reported
+        self.started=False
+        self.seen=0						#values fed
+        self.reported=0						#values reported
+
+    def feed(self, values, t=None):
+        """Add one poll of all points; return the Changes to report"""
+        t=time.monotonic() if t is None else t
+        v=np.asarray(values, float).reshape(self.points)
+        band=np.maximum(self.absolute, self.percent*np.abs(self.last))
+        gone=np.isnan(v)!=np.isnan(self.last)			#to or from a missing value
+        with np.errstate(invalid="ignore"):
+            moved=np.abs(v-self.last)>band
+        report=moved|gone|(t-self.sent>=self.heartbeat)
+        if not self.started:
+            report[:]=True
+            self.started=True
+        index=np.flatnonzero(report)
+        self.last[index]=v[index]
+        self.sent[index]=t
+        self.seen+=self.points
+        self.reported+=len(index)
+        changes=Changes(t, index, v[index])
+        if self.callback is not None and len(index):
+            self.callback(changes)
+        return changes
+
+    def ratio(self):
+        """Fraction of the values fed that were reported"""
+        return self.reported/self.seen if self.seen else 0.0
@@ -0,0 +1,199 @@
+import threading
+import time
+from BRIDGErecorder import HEADER, MAGIC, RX, TX, readDUMP
+
+"""
+Record/replay transports for deterministic offline runs
+RecordingPort wraps a live connection and writes the exact byte stream exchanged
+with the BRIDGEplate, with monotonic timestamps, to a file. ReplayPort reads such
+a file and plays the responses back to the unchanged plate classes, either with
+the recorded timing, scaled (speed=0.1 runs ten times faster), or as fast as
+possible (speed=0). Files use the BRIDGErecorder dump format, so a flight
+recorder dump taken in the field can be replayed as well.
+
+Usage:
+    from BRIDGEplate import *
+    import BRIDGEreplay
+    BRIDGEreplay.record("session.rec")		#wrap the current connection
+    ...						#run the application
+    BRIDGEreplay.stop()				#flush the file, restore the connection
+
+    BRIDGEreplay.replay("session.rec", speed=0)	#later, without hardware
+    ...						#run the same application
+"""
+
+class ReplayMismatch(Exception):
+    pass
+
+class RecordingPort:
+    def __init__(self, port, path):
+        self.port=port
+        self.path=path
+        self.lock=threading.Lock()
+        self.f=open(path, "wb")
+        self.f.write(MAGIC)
+
+    def _log(self, direction, data):
+        t=time.monotonic_ns()
+        with self.lock:
+            for i in range(0, max(len(data), 1), 0xFFFF):	#records hold at most 64 KB, split longer payloads
+                chunk=data[i:i+0xFFFF]
+                self.f.write(HEADER.pack(t, direction, 0, len(chunk)))
+                self.f.write(chunk)
+
+    def write(self, data):
+        self._log(TX, data)
+        return self.port.write(data)
+
+    def read_until(self, *args, **kwargs):
+        data=self.port.read_until(*args, **kwargs)
+        self._log(RX, data)
+        return data
+
+    def read(self, size=1):
+        data=self.port.read(size)
+        self._log(RX, data)
+        return data
+
+    def flush(self):
+        with self.lock:
+            self.f.flush()
+        return self.port.flush()
+
+    def reset_input_buffer(self):
+        return self.port.reset_input_buffer()
+
+    @property
+    def in_waiting(self):
+        return self.port.in_waiting
+
+    @property
+    def timeout(self):
+        return self.port.timeout
+
+    @timeout.setter
+    def timeout(self, value):
+        self.port.timeout=value
+
+    def detach(self):
+        """Close the recording file and return the wrapped port"""
+        with self.lock:
+            self.f.close()
+        return self.port
+
+    def close(self):
+        self.detach()
+        self.port.close()
+
+class ReplayPort:
+    def __init__(self, path, speed=1.0, strict=True):
+        self.events=[(t, d, data) for t, d, data in readDUMP(path) if data or d==TX]
+        self.speed=speed
+        self.strict=strict
+        self.timeout=None					#set by BRIDGEplate.setPORT()
+        self.pos=0						#next event to consume
+        self.queue=[]						#[(release time, bytes)] scheduled responses
+        self.buf=b""
+        self.cond=threading.Condition()
+        self.is_open=True
+        self.port=path
+
+    def write(self, data):
+        with self.cond:
+            if self.pos<len(self.events) and self.events[self.pos][1]==RX:
+                self._skipRX()					#responses the application never read
+            if self.pos>=len(self.events):
+                raise ReplayMismatch("recording exhausted at "+repr(data))
+            t0, d, expected=self.events[self.pos]
+            if self.strict and data!=expected:
+                raise ReplayMismatch(f"expected {expected!r}, application wrote {data!r}")
+            self.pos+=1
+            now=time.monotonic()
+            while self.pos<len(self.events) and self.events[self.pos][1]==RX:
+                t, d, payload=self.events[self.pos]
+                self.queue.append((now+(t-t0)/1e9*self.speed, payload))
+                self.pos+=1
+            self.cond.notify_all()
+        return len(data)
+
+    def _skipRX(self):
+        while self.pos<len(self.events) and self.events[self.pos][1]==RX:
+            self.pos+=1
+
+    def _release(self):
+        now=time.monotonic()
+        while self.queue and self.queue[0][0]<=now:
+            self.buf+=self.queue.pop(0)[1]
+        return self.queue[0][0]-now if self.queue else None
+
+    def read_until(self, expected=b"\n", size=None):
+        deadline=None if self.timeout is None else time.monotonic()+self.timeout
+        with self.cond:
+            while True:
+                wait=self._release()
+                i=self.buf.find(expected)
+                if i>=0 or (size is not None and len(self.buf)>=size):
+                    n=i+len(expected) if i>=0 else size
+                    if size is not None:
+                        n=min(n, size)
+                    data, self.buf=self.buf[:n], self.buf[n:]
+                    return data
+                left=None if deadline is None else deadline-time.monotonic()
+                if left is not None and left<=0:
+                    data, self.buf=self.buf, b""
+                    return data
+                if wait is None:
+                    wait=left
+                elif left is not None:
+                    wait=min(wait, left)
+                self.cond.wait(wait)
+
+    def read(self, size=1):
+        with self.cond:
+            self._release()
+            data, self.buf=self.buf[:size], self.buf[size:]
+            return data
+
+    @property
+    def in_waiting(self):
+        with self.cond:
+            self._release()
+            return len(self.buf)
+
+    def reset_input_buffer(self):
+        with self.cond:
+            self._release()
+            self.buf=b""
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.is_open=False
+
+_saved=None
+
+def record(path):
+    """Start recording the current BRIDGEplate connection to path"""
+    global _saved
+    import BRIDGEplate
+    _saved=(BRIDGEplate.ser, BRIDGEplate.matches)
+    return BRIDGEplate.setPORT(RecordingPort(BRIDGEplate.ser, path), BRIDGEplate.matches)
+
+def replay(path, speed=1.0, strict=True):
+    """Replace the BRIDGEplate connection with a replay of path"""
+    global _saved
+    import BRIDGEplate
+    _saved=(getattr(BRIDGEplate, "ser", None), getattr(BRIDGEplate, "matches", None))
+    return BRIDGEplate.setPORT(ReplayPort(path, speed, strict), path)
+
+def stop():
+    """Stop recording or replaying and restore the previous connection"""
+    global _saved
+    import BRIDGEplate
+    port=BRIDGEplate.ser
+    if isinstance(port, RecordingPort):
+        port.detach()
+    if _saved is not None:
+        BRIDGEplate.setPORT(*_saved)
+        _saved=None
@@ -0,0 +1,214 @@
+import collections
+import sys
+import threading
+import time
+try:
+    import numpy as np
+except ImportError:
+    print("Error: numpy package not found. Install with: pip install numpy")
+    sys.exit(1)
+import BRIDGEplate as bp
+
+"""
+BRIDGEschedule - timed relay and DOUT outputs
+A Scheduler runs output actions at given time.monotonic() times on RELAY, RELAY2,
+DAQC and DAQC2 plates. Actions wait in a hashed timer wheel of tick second slots.
+All actions due in the same tick are merged per plate into one relayALL() or
+setDOUTall() write of the whole port, and the writes of all plates go out in one
+pipelined window. The scheduler learns how long a write takes to reach the plate
+and fires that much early, and records the timing error of every action (when
+the plate executed it minus when it was due).
+
+Usage:
+    from BRIDGEplate import *
+    from BRIDGEschedule import Scheduler
+    sched = Scheduler().start()
+    sched.pulse("RELAY", 0, 3, 0.050)			#50 ms pulse on relay 3, now
+    sched.pulse("DAQC2", 1, 0, 0.2, delay=1.0)		#DOUT bit 0, one second from now
+    sched.pattern("DAQC", 0, [(0.0, 0x01), (0.1, 0x03), (0.2, 0x00)])
+    time.sleep(2)
+    print(sched.stats())				#timing error in seconds
+    sched.stop()
+
+The scheduler keeps a copy of each port it drives, read once from the plate;
+changes made to those outputs by other code are overwritten by the next write.
+"""
+
+PORTS={								#write, read, outputs, number of the first output
+    "RELAY": ("relayALL", "relaySTATE", 7, 1),
+    "RELAY2": ("relayALL", "relaySTATE", 8, 1),
+    "DAQC": ("setDOUTall", "getDOUTbyte", 7, 0),
+    "DAQC2": ("setDOUTall", "getDOUTbyte", 8, 0)}
+HISTORY=10000							#timing errors kept for stats()
+ALPHA=0.1							#weight of a new latency measurement
+
+Action=collections.namedtuple("Action", "due plate addr set clear")	#bit masks to set and clear
+
+class TimerWheel:
+    def __init__(self, tick=0.001, slots=4096):
+        self.tick=tick
+        self.slots=[[] for i in range(slots)]
+        self.origin=time.monotonic()
+        self.current=0						#next tick to expire
+        self.count=0
+
+    def add(self, due, item):
+        if not self.count:					#skip the ticks that passed while idle
+            self.current=max(self.current, int((time.monotonic()-self.origin)/self.tick))
+        n=max(round((due-self.origin)/self.tick), self.current)
+        self.slots[n%len(self.slots)].append((n, item))	#ticks further than a turn away wait for their round
+        self.count+=1
+
+    def expire(self, upto):
+        """Remove and return the items of all ticks up to tick upto"""
+        out=[]
+        while self.current<=upto and self.count:
+            slot=self.slots[self.current%len(self.slots)]
+            if slot:
+                keep=[]
+                for n, item in slot:
+                    (out if n<=self.current else keep).append(item)
+                slot[:]=keep
+            self.current+=1
+        self.count-=len(out)
+        if not self.count:
+            self.current=max(self.current, upto+1)
+        return out
+
+    def next(self):
+        """The earliest tick holding an item (count must be > 0)"""
+        size=len(self.slots)
+        for n in range(self.current, self.current+size):	#one turn: the first match is the earliest
+            if any(m==n for m, item in self.slots[n%size]):
+                return n
+        return min(m for slot in self.slots for m, item in slot)	#all due in a later turn
+
+    def time(self, n):
+        return self.origin+n*self.tick
+
+class Scheduler:
+    def __init__(self, tick=0.001, slots=4096):
+        self.wheel=TimerWheel(tick, slots)
+        self.ports={}						#(plate, addr) -> output state
+        self.lead=0.0						#seconds from write to execution on the plate
+        self.errors=collections.deque(maxlen=HISTORY)		#executed minus due, seconds
+        self.writes=0
+        self.actions=0
+        self.failures=0
+        self.lastError=None
+        self.cond=threading.Condition()
+        self.stopEvent=threading.Event()
+        self.thread=None
+
+    def start(self):
+        self.stopEvent.clear()
+        self.thread=threading.Thread(target=self._run, name="BRIDGEschedule", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopEvent.set()
+        with self.cond:
+            self.cond.notify_all()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread=None
+
+    def _mask(self, plate, bit):
+        write, read, outputs, first=PORTS[plate]
+        if not first<=int(bit)<first+outputs:
+            raise ValueError(f"invalid {plate} output {bit}")
+        return 1<<(int(bit)-first)
+
+    def _add(self, action):
+        if action.plate not in PORTS:
+            raise ValueError(f"{action.plate} has no relay or DOUT port")
+        self._state(action.plate, action.addr)			#read now rather than when it is due
+        with self.cond:
+            self.wheel.add(action.due, action)
+            self.cond.notify_all()
+
+    def at(self, t, plate, addr, bit, level):
+        """Set output bit (relay number or DOUT bit) of a plate to level at time t"""
+        mask=self._mask(plate, bit)
+        self._add(Action(t, plate, addr, mask if level else 0, 0 if level else mask))
+
+    def pulse(self, plate, addr, bit, width, start=None, delay=0.0):
+        """Turn an output on at start (now if None) plus delay and off width seconds later"""
+        t=(time.monotonic() if start is None else start)+delay
+        self.at(t, plate, addr, bit, 1)
+        self.at(t+width, plate, addr, bit, 0)
+
+    def pattern(self, plate, addr, steps, start=None):
+        """Write whole port values: steps of (seconds after start, value)"""
+        t0=time.monotonic() if start is None else start
+        full=(1<<PORTS[plate][2])-1
+        for offset, value in steps:
+            self._add(Action(t0+offset, plate, addr, value&full, ~value&full))
+
+    def _state(self, plate, addr):
+        key=(plate, addr)
+        if key not in self.ports:
+            self.ports[key]=int(bp.parseResp(bp.CMD(f"{plate}.{PORTS[plate][1]}({addr})")))
+        return self.ports[key]
+
+    def _fire(self, actions):
+        ports={}
+        for a in sorted(actions, key=lambda a: a.due):		#later actions of a tick win
+            key=(a.plate, a.addr)
+            state=ports.get(key, self.ports[key])
+            ports[key]=(state|a.set)&~a.clear
+        cmds=[f"{plate}.{PORTS[plate][0]}({addr},{state})" for (plate, addr), state in ports.items()]
+        fired=time.monotonic()
+        if len(cmds)==1:
+            bp.CMD(cmds[0])
+            sent, received, size=bp.lastTIMING()
+            executed={next(iter(ports)): sent+(received-sent)/2}
+        else:
+            bp.CMDS(cmds)
+            step=(time.monotonic()-fired)/(len(cmds)+1)		#CMDS closes the window with one more reply
+            executed={key: fired+(i+0.5)*step for i, key in enumerate(ports)}
+        self.ports.update(ports)
+        self.writes+=len(cmds)
+        self.actions+=len(actions)
+        for a in actions:
+            self.errors.append(executed[(a.plate, a.addr)]-a.due)
+        self.lead+=ALPHA*(min(executed.values())-fired-self.lead)
+
+    def _run(self):
+        #Sleep until the earliest occupied tick; _add() and stop() notify, so a sooner
+        #action or a stop is seen at once
+        while not self.stopEvent.is_set():
+            with self.cond:
+                if not self.wheel.count:
+                    self.cond.wait()
+                    continue
+                n=self.wheel.next()
+                delay=self.wheel.time(n)-self.lead-time.monotonic()
+                if delay>0:
+                    self.cond.wait(delay)
+                    continue
+                self.wheel.current=n				#nothing is due before it
+                upto=int((time.monotonic()+self.lead-self.wheel.origin)/self.wheel.tick)
+                actions=self.wheel.expire(upto)
+            if not actions:
+                continue
+            try:
+                self._fire(actions)
+            except (bp.CMDtimeout, ValueError) as e:
+                self.failures+=1
+                self.lastError=e
+
+    def stats(self):
+        """Timing error of the last HISTORY actions (executed minus due), seconds"""
+        err=np.array(list(self.errors))
+        if not len(err):
+            return {"actions": self.actions, "writes": self.writes, "lead": self.lead}
+        return {
+            "actions": self.actions,
+            "writes": self.writes,
+            "failures": self.failures,
+            "lead": self.lead,
+            "errorMean": float(err.mean()),
+            "errorAbsMax": float(np.abs(err).max()),
+            "errorRMS": float(np.sqrt(np.mean(np.square(err))))}
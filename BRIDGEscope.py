@@ -0,0 +1,145 @@
+import sys
+import threading
+import time
+try:
+    import numpy as np
+except ImportError:
+    print("Error: numpy package not found. Install with: pip install numpy")
+    sys.exit(1)
+import BRIDGEplate as bp
+
+"""
+BRIDGEscope - continuous DAQC2 oscilloscope capture
+A Scope runs the startOSC/runOSC/getOSCtraces sequence in a background thread.
+As soon as a sweep's traces have been transferred, the next sweep is armed;
+the traces are decoded into one of two preallocated buffers while the plate
+acquires the next sweep. Frames carry their timebase and are handed to a
+callback or picked up with get(). Frames nobody took before the next one was
+ready are counted as dropped.
+
+Usage:
+    from BRIDGEplate import *
+    from BRIDGEscope import Scope
+    scope = Scope(0, channels=(1, 1), sweep=10, fps=10).start()
+    frame = scope.get(timeout=1.0)		#frame.traces: (2, 1024) int16 counts
+    print(frame.seq, frame.t0, frame.dt, frame.time()[:4], frame.volts()[:, :4])
+    print(scope.frames, scope.dropped, scope.fps)
+    scope.stop()
+
+A frame's traces live in one of the two buffers and are overwritten two frames
+later; copy them to keep them longer.
+"""
+
+OSC_ZERO=2048							#trace count of 0 V: 12-bit samples of the +/-12 V inputs
+OSC_VOLTS=24/4096						#volts per trace count
+
+class Frame:
+    def __init__(self, seq, t0, dt, channels, traces):
+        self.seq=seq						#frame number since start()
+        self.t0=t0						#time.monotonic() when the sweep was armed
+        self.dt=dt						#seconds between samples
+        self.channels=channels					#oscilloscope channel numbers of the rows
+        self.traces=traces					#(channels, samples) int16 counts
+
+    def time(self):
+        """Sample times relative to t0, seconds"""
+        return np.arange(self.traces.shape[1])*self.dt
+
+    def volts(self):
+        """The traces in volts, (channels, samples) float"""
+        return (self.traces-OSC_ZERO)*OSC_VOLTS
+
+class Scope:
+    def __init__(self, addr, channels=(1, 1), sweep=6, trigger=None, fps=None, callback=None):
+        self.addr=addr
+        self.enabled=tuple(int(c) for c in channels)		#setOSCchannel flags for channel 1 and 2
+        self.channels=tuple(n+1 for n, on in enumerate(self.enabled) if on)
+        if not self.channels:
+            raise ValueError("enable at least one oscilloscope channel")
+        self.sweep=sweep					#setOSCsweep index, see BRIDGEplate.OSCrates
+        self.dt=1/bp.OSCrates[sweep]
+        self.trigger=trigger					#setOSCtrigger arguments, None for free running
+        self.period=1/fps if fps else 0.0			#minimum time between sweeps
+        self.callback=callback
+        self.buffers=np.zeros((2, len(self.channels), bp.OSC_DEPTH), np.int16)
+        self.frame=None						#latest decoded frame
+        self.taken=True
+        self.cond=threading.Condition()
+        self.stopEvent=threading.Event()
+        self.thread=None
+        self.frames=0						#frames captured
+        self.dropped=0						#frames replaced before get() took them
+        self.errors=0						#sweeps lost to timeouts or bad data
+        self.fps=0.0						#achieved frame rate
+        self.lastError=None
+
+    def start(self):
+        bp.DAQC2.startOSC(self.addr)
+        bp.DAQC2.setOSCchannel(self.addr, *self.enabled)
+        bp.DAQC2.setOSCsweep(self.addr, self.sweep)
+        if self.trigger is not None:
+            bp.DAQC2.setOSCtrigger(self.addr, *self.trigger)
+        self.stopEvent.clear()
+        self.thread=threading.Thread(target=self._run, name="BRIDGEscope", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        """Stop capturing; returns once the sweep in progress has been read"""
+        self.stopEvent.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread=None
+        bp.DAQC2.stopOSC(self.addr)
+
+    def _arm(self):
+        bp.CMD(f"DAQC2.runOSC({self.addr})")
+        return time.monotonic()
+
+    def _decode(self, line, buf):
+        data=np.fromstring(line, dtype=np.int16, sep=",")
+        if data.size!=buf.size:
+            raise ValueError(f"expected {buf.size} samples, got {data.size}")
+        buf[:]=data.reshape(buf.shape)
+        return buf
+
+    def _run(self):
+        start=time.monotonic()
+        armed=None
+        while not self.stopEvent.is_set():
+            try:
+                if armed is None:
+                    armed=self._arm()
+                line=bp.CMD(f"DAQC2.getOSCtraces({self.addr})")	#waits off the link until the sweep is due
+                t0=armed
+                wait=t0+self.period-time.monotonic()
+                if wait>0 and self.stopEvent.wait(wait):
+                    break
+                armed=self._arm()				#next sweep runs while this one is decoded
+                traces=self._decode(line, self.buffers[self.frames%2])
+            except (bp.CMDtimeout, ValueError) as e:
+                if self.stopEvent.is_set():
+                    break
+                self.errors+=1
+                self.lastError=e
+                armed=None
+                continue
+            frame=Frame(self.frames, t0, self.dt, self.channels, traces)
+            with self.cond:
+                if not self.taken:
+                    self.dropped+=1
+                self.frame=frame
+                self.taken=self.callback is not None
+                self.frames+=1
+                self.fps=self.frames/(time.monotonic()-start)
+                self.cond.notify_all()
+            if self.callback is not None:
+                self.callback(frame)
+
+    def get(self, timeout=None):
+        """Return the next frame not yet taken, waiting up to timeout seconds (None if none came)"""
+        with self.cond:
+            if self.taken and not self.cond.wait_for(lambda: not self.taken, timeout):
+                return None
+            self.taken=True
+            return self.frame
@@ -0,0 +1,296 @@
+import os
+import queue
+import select
+import socket
+import sys
+import threading
+import time
+import BRIDGEplate as bp
+
+"""
+BRIDGEserver - share one BRIDGEplate between several processes
+Only one process can own the serial port. The server owns it and accepts
+command lines from any number of local clients over a Unix domain socket.
+Requests from all clients are queued, consecutive reads are pipelined onto
+the serial link with CMDS(), and repeated reads of the same point within
+CACHE_TTL seconds are answered from a cache (any other command clears it).
+Deadlines, retries, state tracking and a Supervisor all run in the server.
+
+Clients keep the normal API: the socket is installed as the BRIDGEplate
+connection with setPORT(), so ADC, DAQC, THERMO, ... work unchanged.
+
+Usage:
+    python BRIDGEserver.py [--socket /tmp/bridgeplate.sock]	#owns the port
+
+    BRIDGEPLATE_SERVER=/tmp/bridgeplate.sock python app.py	#any client, or:
+    from BRIDGEplate import *
+    import BRIDGEserver
+    BRIDGEserver.connect("/tmp/bridgeplate.sock")
+"""
+
+SOCKET="/tmp/bridgeplate.sock"
+CACHE_TTL=0.05							#seconds a read response may be reused
+LINK_DELAY=2.0							#client allowance for commands queued behind other clients
+BLOCKS=("help", "srTable")					#display commands answered with text up to <<<END>>>
+
+def cacheable(name):
+    """True for commands that only read state and can be shared between clients"""
+    func=name.rpartition(".")[2]
+    return func.startswith(bp.READS) and not func.startswith("check4") and not name.endswith(bp.NORETRY)
+
+class SocketPort:
+    """Serial-like client end of a BRIDGEserver connection, for BRIDGEplate.setPORT()"""
+    def __init__(self, path=SOCKET):
+        self.sock=socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(path)
+        self.port=SocketPort.name(path)
+        self.timeout=None					#set by BRIDGEplate.setPORT()
+        self.buf=b""
+        self.is_open=True
+
+    @staticmethod
+    def name(path):
+        return "unix:"+path
+
+    def _fill(self, timeout):
+        ready, _, _=select.select([self.sock], [], [], timeout)
+        if not ready:
+            return False
+        data=self.sock.recv(65536)
+        if not data:
+            raise ConnectionResetError("BRIDGEserver closed the connection")
+        self.buf+=data
+        return True
+
+    def write(self, data):
+        self.sock.sendall(data)
+        return len(data)
+
+    def read_until(self, expected=b"\n", size=None):
+        end=None if self.timeout is None else time.monotonic()+self.timeout
+        while True:
+            i=self.buf.find(expected)
+            if i>=0 or (size is not None and len(self.buf)>=size):
+                n=i+len(expected) if i>=0 else size
+                if size is not None:
+                    n=min(n, size)
+                data, self.buf=self.buf[:n], self.buf[n:]
+                return data
+            left=None if end is None else end-time.monotonic()
+            if left is not None and left<=0:
+                data, self.buf=self.buf, b""
+                return data
+            self._fill(left)
+
+    def read(self, size=1):
+        end=None if self.timeout is None else time.monotonic()+self.timeout
+        while len(self.buf)<size:
+            left=None if end is None else end-time.monotonic()
+            if (left is not None and left<=0) or not self._fill(left):
+                break
+        data, self.buf=self.buf[:size], self.buf[size:]
+        return data
+
+    @property
+    def in_waiting(self):
+        while self._fill(0):
+            pass
+        return len(self.buf)
+
+    def reset_input_buffer(self):
+        self.in_waiting
+        self.buf=b""
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.is_open=False
+        self.sock.close()
+
+def connect(path=SOCKET, linkDelay=LINK_DELAY):
+    """Make the BRIDGEserver listening on path the BRIDGEplate connection of this process"""
+    bp.LINK_DELAY=linkDelay
+    return bp.setPORT(SocketPort(path))
+
+class Server:
+    def __init__(self, path=SOCKET, ttl=CACHE_TTL):
+        self.path=path
+        self.ttl=ttl
+        self.requests=queue.Queue()				#(client socket, command line) in arrival order
+        self.cache={}						#command line -> (time read, response)
+        self.sock=None
+        self.running=False
+        self.threads=[]
+        self.served=0						#requests answered
+        self.hits=0						#...of which from the cache or a shared read
+        self.sent=0						#commands sent to the BRIDGEplate
+
+    def start(self):
+        if os.path.exists(self.path):
+            probe=socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(self.path)
+            except (ConnectionRefusedError, FileNotFoundError):
+                if os.path.exists(self.path):
+                    os.unlink(self.path)			#stale: left over from a previous run
+            else:
+                raise OSError(f"a BRIDGEserver is already listening on {self.path}")
+            finally:
+                probe.close()
+        self.sock=socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.bind(self.path)
+        self.sock.listen()
+        self.running=True
+        for target in (self._accept, self._worker):
+            t=threading.Thread(target=target, name="BRIDGEserver", daemon=True)
+            t.start()
+            self.threads.append(t)
+        return self
+
+    def stop(self):
+        self.running=False
+        self.sock.close()
+        for t in self.threads:
+            t.join(1.0)
+        self.threads=[]
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    def serve_forever(self):
+        if not self.running:
+            self.start()
+        try:
+            while self.running:
+                time.sleep(1.0)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+    def _accept(self):
+        while self.running:
+            ready, _, _=select.select([self.sock], [], [], 0.1)
+            if not ready:
+                continue
+            try:
+                conn, _=self.sock.accept()
+            except OSError:
+                break
+            threading.Thread(target=self._client, args=(conn,), name="BRIDGEserver client", daemon=True).start()
+
+    def _client(self, conn):
+        pending=b""
+        with conn:
+            while self.running:
+                try:
+                    data=conn.recv(4096)
+                except OSError:
+                    break
+                if not data:
+                    break
+                pending+=data
+                while b"\n" in pending:
+                    line, pending=pending.split(b"\n", 1)
+                    line=line.strip(b"\r").decode('utf-8', errors='replace').strip()
+                    if line:
+                        self.requests.put((conn, line))
+
+    def _worker(self):
+        while self.running:
+            try:
+                batch=[self.requests.get(timeout=0.1)]
+            except queue.Empty:
+                continue
+            while len(batch)<4*bp.PIPELINE:
+                try:
+                    batch.append(self.requests.get_nowait())
+                except queue.Empty:
+                    break
+            reads=[]
+            for conn, line in batch:
+                if cacheable(line.partition("(")[0]):
+                    reads.append((conn, line))
+                else:
+                    self._reads(reads)			#keep each client's replies in order
+                    reads=[]
+                    self._write(conn, line)
+            self._reads(reads)
+
+    def _reads(self, reads):
+        if not reads:
+            return
+        now=time.monotonic()
+        lines=[]
+        for conn, line in reads:
+            hit=self.cache.get(line)
+            if (hit is None or now-hit[0]>self.ttl) and line not in lines:
+                lines.append(line)
+        self.hits+=len(reads)-len(lines)
+        self.sent+=len(lines)
+        try:
+            resps=bp.CMDS(lines)
+        except bp.CMDtimeout:
+            resps=[self._one(line) for line in lines]
+        except Exception as e:
+            resps=["ERROR: "+str(e)]*len(lines)
+        now=time.monotonic()
+        for line, resp in zip(lines, resps):
+            if resp is None:
+                self.cache.pop(line, None)
+            else:
+                self.cache[line]=(now, resp)
+        for conn, line in reads:
+            hit=self.cache.get(line)
+            self._reply(conn, None if hit is None else hit[1])
+
+    def _one(self, line):
+        try:
+            return bp.CMD(line)
+        except bp.CMDtimeout:
+            return None
+        except Exception as e:
+            return "ERROR: "+str(e)
+
+    def _write(self, conn, line):
+        self.cache.clear()
+        self.sent+=1
+        name=line.partition("(")[0]
+        if name.rpartition(".")[2] in BLOCKS:
+            try:
+                resp=bp.CMDblock(name)+"<<<END>>>"
+            except Exception as e:
+                resp="ERROR: "+str(e)
+        else:
+            resp=self._one(line)
+        self._reply(conn, resp)
+
+    def _reply(self, conn, resp):
+        self.served+=1
+        if resp is None:					#timed out: the client times out and resyncs as on a direct link
+            return
+        try:
+            conn.sendall((resp+"\r\n").encode('utf-8'))
+        except OSError:
+            pass						#client went away
+
+if __name__ == "__main__":
+    import argparse
+    parser=argparse.ArgumentParser(description="Share the BRIDGEplate with local client processes")
+    parser.add_argument("--socket", default=SOCKET, help="Unix domain socket path")
+    parser.add_argument("--ttl", type=float, default=CACHE_TTL, help="seconds a read response is reused (0 disables the cache)")
+    parser.add_argument("--emulate", action="store_true", help="serve a BRIDGEemulator instead of hardware")
+    opts=parser.parse_args()
+    if opts.emulate:
+        from BRIDGEemulator import Emulator
+        Emulator().connect()
+    elif not bp.matches:
+        sys.exit(2)
+    server=Server(opts.socket, opts.ttl)
+    try:
+        server.start()
+    except OSError as e:
+        print("Error:", e)
+        sys.exit(1)
+    print("Serving", bp.matches, "on", opts.socket)
+    server.serve_forever()
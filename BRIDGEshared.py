@@ -0,0 +1,224 @@
+import sys
+import threading
+import time
+from multiprocessing import resource_tracker, shared_memory
+try:
+    import numpy as np
+except ImportError:
+    print("Error: numpy package not found. Install with: pip install numpy")
+    sys.exit(1)
+
+"""
+Shared-memory fan-out of acquisition streams
+A Publisher decodes samples once (ADCplate streams, DAQC2 oscilloscope traces or
+any other source) and writes them into a multiprocessing.shared_memory ring of
+rows x channels. Any number of Subscribers in other processes attach by name and
+read zero-copy numpy views of the rows they have not seen yet. Every row has a
+sequence number; a subscriber that falls more than the ring size behind skips
+ahead and counts the rows it lost.
+
+Writes are bracketed by a sequence word (a seqlock): the publisher makes it odd
+before it touches the ring and even again once the rows and the head are in
+place, so subscribers retry a header read or copy that overlapped a write
+instead of returning a torn record. BRIDGEplate is only imported by the sources
+and Publisher.run(), so consumer processes never open the serial layer.
+
+Usage:
+    #acquisition process
+    from BRIDGEplate import *
+    from BRIDGEshared import Publisher, adcSTREAM
+    ADC.setMODE(0, "ADV"); ADC.configINPUT(0, 0, 11, 1); ADC.configINPUT(0, 1, 11, 1)
+    ADC.startSTREAM(0)
+    pub = Publisher("adc0", channels=2, capacity=1<<16)
+    pub.run(adcSTREAM(0))
+
+    #any number of consumer processes
+    from BRIDGEshared import Subscriber
+    sub = Subscriber("adc0")
+    while True:
+        seq, rows = sub.read(timeout=1.0)	#rows is a (n, 2) view into shared memory
+        process(rows)
+        if not sub.intact():			#overwritten while in use, use sub.read(copy=True)
+            ...
+        print(sub.lost)
+"""
+
+MAGIC=int.from_bytes(b"BPSHRNG2", "little")			#identifies a ring (2: with a sequence word)
+HEADER=128							#bytes; 16 uint64 words
+_MAGIC, _CAPACITY, _CHANNELS, _DTYPE, _HEAD, _FRAMES, _TIME, _CLOSED, _SEQ, _NEXT=range(10)
+POLL=0.001							#subscriber wait granularity, seconds
+STUCK=0.1							#longest wait for a write in progress, seconds
+
+def decode(line):
+    """Decode a comma separated response line to a float array without going through parseResp()"""
+    if not line:
+        return np.empty(0)
+    if line.startswith("ERROR"):
+        raise ValueError(line)
+    return np.array(line.split(","), dtype=float)
+
+_published=set()						#rings created by this process
+
+def _attach(name):
+    shm=shared_memory.SharedMemory(name)
+    if shm.name not in _published:
+        resource_tracker.unregister(shm._name, "shared_memory")	#the publisher owns and unlinks the block
+    return shm
+
+class Publisher:
+    def __init__(self, name, channels, capacity=1<<16, dtype="f8"):
+        self.dtype=np.dtype(dtype)
+        self.channels=channels
+        self.capacity=capacity
+        self.shm=shared_memory.SharedMemory(name, create=True, size=HEADER+capacity*channels*self.dtype.itemsize)
+        self.name=self.shm.name
+        _published.add(self.name)
+        self.header=np.ndarray(HEADER//8, np.uint64, self.shm.buf)
+        self.data=np.ndarray((capacity, channels), self.dtype, self.shm.buf, HEADER)
+        self.header[:]=0
+        self.header[:_CLOSED+1]=(MAGIC, capacity, channels, ord(self.dtype.char), 0, 0, 0, 0)
+        self.thread=None
+        self.stopEvent=threading.Event()
+        self.errors=0
+
+    @property
+    def head(self):
+        return int(self.header[_HEAD])
+
+    def publish(self, samples):
+        """Append samples (rows x channels, or a flat array of whole rows) and return the first row's sequence number"""
+        rows=np.asarray(samples, self.dtype).reshape(-1, self.channels)
+        head=self.head
+        n=len(rows)
+        if n>self.capacity:					#only the newest rows fit
+            head+=n-self.capacity
+            rows=rows[-self.capacity:]
+            n=self.capacity
+        start=head%self.capacity
+        first=min(n, self.capacity-start)
+        self.header[_NEXT]=head+n				#rows up to here may be changing
+        self.header[_SEQ]+=1					#odd: write in progress
+        self.data[start:start+first]=rows[:first]
+        self.data[:n-first]=rows[first:]
+        self.header[_TIME]=time.time_ns()
+        self.header[_FRAMES]+=1
+        self.header[_HEAD]=head+n				#publish the rows only once they are written
+        self.header[_SEQ]+=1					#even: ring consistent again
+        return head
+
+    def run(self, source, interval=0.0):
+        """Publish whatever source() returns, in a background thread, until stop()"""
+        import BRIDGEplate as bp
+        def loop():
+            while not self.stopEvent.is_set():
+                try:
+                    rows=source()
+                    if rows is not None and len(rows):
+                        self.publish(rows)
+                except (bp.CMDtimeout, ValueError, TypeError):	#a failed read or rows that do not fit the ring
+                    self.errors+=1
+                if interval:
+                    self.stopEvent.wait(interval)
+        self.stopEvent.clear()
+        self.thread=threading.Thread(target=loop, name="BRIDGEshared "+self.name, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopEvent.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread=None
+
+    def close(self):
+        """Stop publishing and remove the ring; attached subscribers see closed"""
+        self.stop()
+        self.header[_CLOSED]=1
+        del self.header, self.data
+        self.shm.close()
+        self.shm.unlink()
+        _published.discard(self.name)
+
+class Subscriber:
+    def __init__(self, name, fromStart=False):
+        self.shm=_attach(name)
+        self.header=np.ndarray(HEADER//8, np.uint64, self.shm.buf)
+        if int(self.header[_MAGIC])!=MAGIC:
+            self.shm.close()
+            raise ValueError(name+" is not a BRIDGEshared ring")
+        self.capacity=int(self.header[_CAPACITY])
+        self.channels=int(self.header[_CHANNELS])
+        self.dtype=np.dtype(chr(int(self.header[_DTYPE])))
+        self.data=np.ndarray((self.capacity, self.channels), self.dtype, self.shm.buf, HEADER)
+        head=self._head()[1]
+        self.cursor=max(head-self.capacity, 0) if fromStart else head	#sequence number of the next row to read
+        self.last=self.cursor					#first row of the last view returned
+        self.lost=0						#rows overwritten before they were read
+
+    @property
+    def closed(self):
+        return bool(self.header[_CLOSED])
+
+    @property
+    def available(self):
+        return self._head()[1]-self.cursor
+
+    def _head(self):
+        #(sequence word, head) read between writes; retried while a write is in progress,
+        #for at most STUCK seconds in case the publisher died in the middle of one
+        end=time.monotonic()+STUCK
+        while True:
+            version=int(self.header[_SEQ])
+            head=int(self.header[_HEAD])
+            if not version&1 and int(self.header[_SEQ])==version or time.monotonic()>=end:
+                return version, head
+            time.sleep(0)
+
+    def read(self, maxRows=None, timeout=0.0, copy=False):
+        """Return (sequence number, rows) of unread rows, waiting up to timeout for some.
+        rows is a view into the ring up to its end; the next call continues after the wrap."""
+        end=time.monotonic()+timeout
+        version, head=self._head()
+        while head==self.cursor and time.monotonic()<end and not self.closed:
+            time.sleep(POLL)
+            version, head=self._head()
+        if head-self.cursor>self.capacity:			#fell behind, skip to the oldest row still there
+            self.lost+=head-self.capacity-self.cursor
+            self.cursor=head-self.capacity
+        start=self.cursor%self.capacity
+        n=min(head-self.cursor, self.capacity-start)
+        if maxRows is not None:
+            n=min(n, maxRows)
+        seq=self.cursor
+        rows=self.data[start:start+n]
+        self.last=seq
+        self.cursor+=n
+        if copy:
+            rows=rows.copy()
+            if int(self.header[_SEQ])!=version and not self.intact():	#a write overlapped the copy
+                self.cursor=seq
+                return self.read(maxRows, 0.0, True)
+        return seq, rows
+
+    def intact(self):
+        """True while the rows of the last read() have not been (and are not being) overwritten by the publisher"""
+        return max(int(self.header[_HEAD]), int(self.header[_NEXT]))-self.last<=self.capacity
+
+    def close(self):
+        del self.header, self.data
+        self.shm.close()
+
+def adcSTREAM(addr):
+    """Source for Publisher.run(): ADCplate stream data (call startSTREAM first), one row per scan"""
+    import BRIDGEplate as bp
+    def source():
+        return decode(bp.CMD(f"ADC.getSTREAM({addr})"))
+    return source
+
+def oscTRACES(addr, channels=2):
+    """Source for Publisher.run(): one DAQC2 oscilloscope sweep per call, one row per sample"""
+    import BRIDGEplate as bp
+    def source():
+        bp.CMD(f"DAQC2.runOSC({addr})")
+        return decode(bp.CMD(f"DAQC2.getOSCtraces({addr})")).reshape(channels, -1).T
+    return source
@@ -0,0 +1,126 @@
+import sys
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+try:
+    import numpy as np
+except ImportError:
+    print("Error: numpy package not found. Install with: pip install numpy")
+    sys.exit(1)
+
+"""
+BRIDGEspectrum - incremental Welch power spectral density
+A Welch analyzer takes chunks of rows (samples x channels) from ADC stream or
+block reads or DAQC2 traces as they arrive, cuts them into overlapping Hann
+windowed segments (carrying the unfinished segment over to the next chunk) and
+keeps a running average of their periodograms. With workers > 0 the FFTs run in
+a process pool and feed() returns at once, so acquisition does not wait for the
+analysis; at most backlog chunks are in flight, beyond that feed() waits for the
+oldest. psd() returns the frequency axis and the PSD of every channel.
+
+Pool workers import this module, so it imports BRIDGEplate only inside the
+functions that need it: a worker never opens the serial port.
+
+Usage:
+    from BRIDGEplate import *
+    from BRIDGEshared import decode
+    from BRIDGEspectrum import Welch, adcRATE
+    w = Welch(fs=adcRATE(0), nperseg=1024, channels=2, workers=2)
+    while running:
+        w.feed(decode(CMD("ADC.getSTREAM(0)")))
+    f, pxx = w.psd()				#f: (513,) Hz, pxx: (513, 2) units^2/Hz
+    w.close()
+"""
+
+def adcRATE(addr):
+    """Scan rate of an ADCplate's enabled inputs (startBLOCK/startSTREAM data), scans/s.
+    Raises ValueError unless the mode, the enabled inputs and (in ADV mode) their rates
+    were set in this session."""
+    import BRIDGEplate as bp
+    cfg=bp._adc(addr)
+    if cfg["mode"]!="ADV" and cfg["mode"] not in bp.ADCmodes:
+        raise ValueError(f"mode of ADCplate {addr} unknown: call ADC.setMODE() first")
+    channels=[ch for ch in range(16) if cfg["enabled"][ch]]
+    if not channels:
+        raise ValueError(f"no input of ADCplate {addr} is known to be enabled: call ADC.configINPUT() or ADC.enableINPUT() first")
+    if cfg["mode"]=="ADV" and any(cfg["rates"][ch] is None for ch in channels):
+        raise ValueError(f"sample rate of an enabled ADCplate {addr} input unknown: call ADC.configINPUT() first")
+    return 1/bp.adcTIME(addr, channels)
+
+def oscRATE(sweep):
+    """Sample rate of DAQC2 oscilloscope traces at a setOSCsweep index"""
+    import BRIDGEplate as bp
+    return bp.OSCrates[sweep]
+
+def _periodograms(segments, window):
+    #Summed |FFT|^2 of mean-removed, windowed segments (nseg, channels, nperseg)
+    segments=segments-segments.mean(axis=2, keepdims=True)
+    spec=np.fft.rfft(segments*window, axis=2)
+    return np.square(np.abs(spec)).sum(axis=0).T, len(segments)
+
+class Welch:
+    def __init__(self, fs, nperseg=1024, overlap=0.5, channels=1, workers=0, backlog=None):
+        self.fs=float(fs)					#samples per second
+        self.nperseg=nperseg
+        self.hop=max(1, int(nperseg*(1-overlap)))
+        self.channels=channels
+        self.window=np.hanning(nperseg+1)[:-1]		#periodic Hann
+        self.scale=1/(self.fs*np.square(self.window).sum())
+        self.sum=np.zeros((nperseg//2+1, channels))
+        self.segments=0
+        self.tail=np.empty((0, channels))			#samples the next segment starts with
+        self.pool=ProcessPoolExecutor(workers) if workers else None
+        self.pending=set()
+        self.backlog=backlog or 2*workers			#chunks submitted but not finished
+
+    def _add(self, result):
+        power, n=result
+        self.sum+=power
+        self.segments+=n
+
+    def _collect(self, wait):
+        #Add the results of finished pool work (all of it when wait)
+        for future in list(self.pending):
+            if wait or future.done():
+                self.pending.remove(future)
+                self._add(future.result())
+
+    def _throttle(self):
+        #Wait for pool work to finish while backlog chunks are in flight
+        self._collect(False)
+        while len(self.pending)>=self.backlog:
+            wait(self.pending, return_when=FIRST_COMPLETED)
+            self._collect(False)
+
+    def feed(self, rows):
+        """Add a chunk of samples; returns the number of complete segments it finished"""
+        rows=np.asarray(rows, float).reshape(-1, self.channels)
+        x=np.concatenate((self.tail, rows)) if len(self.tail) else rows
+        if len(x)<self.nperseg:
+            self.tail=x
+            return 0
+        n=(len(x)-self.nperseg)//self.hop+1
+        segments=np.lib.stride_tricks.sliding_window_view(x, self.nperseg, axis=0)[:n*self.hop:self.hop]
+        self.tail=x[n*self.hop:].copy()
+        if self.pool is None:
+            self._add(_periodograms(segments, self.window))
+        else:
+            self._throttle()
+            self.pending.add(self.pool.submit(_periodograms, np.ascontiguousarray(segments), self.window))
+        return n
+
+    def psd(self, wait=True):
+        """Return (frequencies, PSD) averaged over all segments so far; wait for pool work first"""
+        self._collect(wait)
+        pxx=self.sum*self.scale/max(self.segments, 1)
+        pxx[1:-1 if self.nperseg%2==0 else None]*=2		#one-sided: fold negative frequencies
+        return np.fft.rfftfreq(self.nperseg, 1/self.fs), pxx
+
+    def reset(self):
+        self._collect(True)
+        self.sum[:]=0
+        self.segments=0
+        self.tail=np.empty((0, self.channels))
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool=None
@@ -0,0 +1,99 @@
+import threading
+import time
+import BRIDGEplate as bp
+
+"""
+Supervisor - hot-plug aware reconnection for the BRIDGEplate connection
+When the BRIDGEplate is unplugged or re-enumerates, the next command fails with a
+serial error. An installed Supervisor then looks for the BRIDGEplate again with
+find_ports_by_vid_pid() (exponential backoff), reopens the port, replays the
+tracked configuration and output state (ADC modes/inputs, THERMO types/scale,
+relays, DOUTs, PWM/DAC, ... see BRIDGEplate.STATE) and lets the failed command
+continue. Commands issued by other threads wait on the port lock meanwhile and
+resume afterwards. An optional heartbeat thread finds a lost connection while
+the application is idle.
+
+Usage:
+    from BRIDGEplate import *
+    from BRIDGEsupervisor import Supervisor
+    sup = Supervisor(heartbeat=2.0)
+    sup.start()				#installs itself with setSUPERVISOR()
+    ...
+    print(sup.disconnects, sup.downtime)
+"""
+
+def findBRIDGE():
+    return bp.find_ports_by_vid_pid(bp.pivid, bp.pipid)
+
+class Supervisor:
+    def __init__(self, finder=findBRIDGE, backoff=0.1, maxBackoff=5.0, giveUp=None, heartbeat=None, log=print):
+        self.finder=finder					#returns the port to open, or a false value
+        self.backoff=backoff
+        self.maxBackoff=maxBackoff
+        self.giveUp=giveUp					#seconds before recover() raises, None waits forever
+        self.heartbeat=heartbeat
+        self.log=log
+        self.disconnects=0
+        self.downtime=0.0					#total seconds spent reconnecting
+        self.lastError=None
+        self.stopEvent=threading.Event()
+        self.thread=None
+
+    def start(self):
+        bp.setSUPERVISOR(self)
+        if self.heartbeat:
+            self.stopEvent.clear()
+            self.thread=threading.Thread(target=self._beat, name="BRIDGEsupervisor", daemon=True)
+            self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopEvent.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread=None
+        if bp.supervisor is self:
+            bp.setSUPERVISOR(None)
+
+    def _beat(self):
+        while not self.stopEvent.wait(self.heartbeat):
+            try:
+                bp.CMD("BRIDGE.getID()")
+            except bp.CMDtimeout:
+                pass
+            except ConnectionError as e:
+                self.lastError=e
+
+    def _close(self):
+        try:
+            bp.ser.close()
+        except Exception:
+            pass
+
+    def recover(self, exc):
+        """Reconnect and replay STATE; called by CMD() with the port lock held"""
+        t0=time.monotonic()
+        self.disconnects+=1
+        self.lastError=exc
+        if self.log:
+            self.log(f"BRIDGEplate connection lost ({exc}), reconnecting")
+        self._close()
+        delay=self.backoff
+        while True:
+            port=self.finder()
+            if port:
+                try:
+                    bp.openPORT(port)
+                    bp.replaySTATE()
+                    self.downtime+=time.monotonic()-t0
+                    if self.log:
+                        self.log(f"BRIDGEplate reconnected on {port} after {time.monotonic()-t0:.2f} s")
+                    return
+                except (bp.serial.SerialException, OSError) as e:
+                    self.lastError=e
+                    self._close()
+            if self.giveUp is not None and time.monotonic()-t0>self.giveUp:
+                self.downtime+=time.monotonic()-t0
+                raise ConnectionError("BRIDGEplate did not come back") from exc
+            time.sleep(delay)
+            delay=min(delay*2, self.maxBackoff)
@@ -0,0 +1,123 @@
+import sys
+import time
+try:
+    import numpy as np
+except ImportError:
+    print("Error: numpy package not found. Install with: pip install numpy")
+    sys.exit(1)
+import BRIDGEplate as bp
+import BRIDGEadc
+from BRIDGEshared import decode
+
+"""
+BRIDGEsync - synchronized triggered acquisition on several ADCplates
+A TriggerGroup configures up to eight ADCplates to take one scan of their inputs
+per trigger, checks the trigger rate against every plate's maxTRIGfreq(), starts
+all plates with one pipelined write so their trigger clocks start within a
+command time of each other, and merges the blocks into one array with a common
+time axis. The estimated start offset of each plate is kept in offsets.
+
+With clock=True (default) each plate's own trigger clock runs at rate. With
+clock=False the plates wait for a trigger given by the configTRIG arguments in
+trig and rate is the trigger rate: for an external trigger the expected rate,
+for the software trigger (trig=("sw",), the default without a clock) the rate
+at which acquire() sends it. Every plate is armed first; each software trigger
+then goes to all plates in one pipelined write, so they sample within a
+command time of each other, and the blocks are collected once complete.
+
+Usage:
+    from BRIDGEplate import *
+    from BRIDGEsync import TriggerGroup
+    group = TriggerGroup({0: range(8), 1: range(8), 2: ["D0", "D1"]}, rate=1000)
+    t, data = group.acquire(2000)		#t: (2000,) seconds, data: (2000, 18)
+    print(group.columns)			#[(addr, input), ...] for the columns of data
+"""
+
+MAX_PLATES=8
+HEADROOM=1.25							#scan time is planned at most 1/(HEADROOM*rate)
+
+class TriggerGroup:
+    def __init__(self, plates, rate, trig=None, clock=True):
+        if not plates or len(plates)>MAX_PLATES:
+            raise ValueError(f"a trigger group has 1 to {MAX_PLATES} ADCplates")
+        self.plates={addr: sorted({bp._adcChannel(str(ch)) for ch in chans}) for addr, chans in plates.items()}
+        self.rate=float(rate)					#triggers per second
+        self.clock=clock
+        self.trig=tuple(trig) if trig is not None else (() if clock else ("sw",))	#configTRIG arguments (source, edge)
+        self.software=not clock and self.trig[:1]==("sw",)	#acquire() sends the triggers
+        self.columns=[(addr, ch) for addr, chans in self.plates.items() for ch in chans]
+        self.plans={}
+        self.maxRate=None
+        self.offsets={}						#addr -> estimated trigger start after the first plate, seconds
+        self.missed={}						#addr -> triggers missing from the last block
+        self.times=None						#software trigger times of the last acquire()
+        self.configured=False
+
+    def configure(self):
+        """Set up the inputs and triggers of every plate and validate the rate"""
+        for addr, chans in self.plates.items():
+            self.plans[addr]=BRIDGEadc.plan(addr, chans, rate=self.rate*HEADROOM).apply()
+        self.maxRate=min(float(bp.ADC.maxTRIGfreq(addr)) for addr in self.plates)
+        if self.rate>self.maxRate:
+            raise ValueError(f"trigger rate {self.rate:.4g}/s exceeds maxTRIGfreq {self.maxRate:.4g}/s of the group")
+        for addr in self.plates:
+            bp.ADC.configTRIG(addr, *self.trig)
+        self.configured=True
+        return self
+
+    def acquire(self, scans, timeout=0.0):
+        """Take scans triggered scans on all plates; return (t, data) with one row per trigger.
+        t is the time.monotonic() of each trigger on the first plate; timeout is extra time
+        allowed for external triggers."""
+        if not self.configured:
+            self.configure()
+        addrs=list(self.plates)
+        for addr in addrs:					#arm: nothing is sampled before the first trigger
+            if self.clock:
+                bp.ADC.triggerFREQ(addr, self.rate)		#stopTRIG() stops the trigger clock
+            bp.ADC.startBLOCK(addr, scans)
+            if not self.clock:
+                bp.ADC.startTRIG(addr)
+        blocks=[]
+        try:
+            if self.software:
+                t0, step=self._trigger(scans)
+                wait=0.0
+            else:
+                t0=time.monotonic()
+                if self.clock:
+                    bp.CMDS([f"ADC.startTRIG({addr})" for addr in addrs])	#one write: the clocks start back to back
+                step=(time.monotonic()-t0)/(len(addrs)+1)	#CMDS closes the window with one more command
+                wait=(scans+1)/self.rate+step*len(addrs)+timeout	#the last plate's last trigger
+            self.offsets={addr: i*step for i, addr in enumerate(addrs)}
+            if bp.waitCANCEL(t0+wait-time.monotonic()):	#acquire off the link
+                raise bp.CMDcancelled("triggered acquisition cancelled")
+            for addr in addrs:					#getBLOCK consumes the data: one CMD each
+                blocks.append(decode(bp.CMD(f"ADC.getBLOCK({addr})")).reshape(-1, len(self.plates[addr])))
+        finally:
+            for addr in addrs:
+                bp.ADC.stopTRIG(addr)
+        n=min(len(b) for b in blocks)
+        self.missed={addr: scans-len(b) for addr, b in zip(addrs, blocks)}
+        t=self.times[:n] if self.software else t0+np.arange(n)/self.rate
+        return t, np.hstack([b[:n] for b in blocks])
+
+    def _trigger(self, scans):
+        #Send scans software triggers, each to every plate in one write, paced at rate;
+        #returns the first trigger time and the spacing of the plates within a write
+        cmds=[f"ADC.swTRIGGER({addr})" for addr in self.plates]
+        scan=max(self.plans[addr].scanTime for addr in self.plates)
+        self.times=np.empty(scans)
+        steps=[]
+        start=time.monotonic()
+        for i in range(scans):
+            due=start+i/self.rate
+            if bp.waitCANCEL(due-time.monotonic()):
+                raise bp.CMDcancelled("triggered acquisition cancelled")
+            sent=time.monotonic()
+            bp.CMDS(cmds)					#never re-sent: CMDlost if the window goes out of step
+            done=time.monotonic()
+            steps.append((done-sent)/(len(cmds)+1))
+            self.times[i]=sent+steps[-1]/2
+        time.sleep(scan)					#the last scan converts after its trigger
+        return self.times[0], float(np.median(steps))
@@ -0,0 +1,113 @@
+import collections
+import sys
+try:
+    import numpy as np
+except ImportError:
+    print("Error: numpy package not found. Install with: pip install numpy")
+    sys.exit(1)
+import BRIDGEplate as bp
+
+"""
+BRIDGEtags - engineering unit scaling of 4-20 mA loops
+A TagTable maps each 4-20 mA input of CURRENTplates (channels 1-8) and ADCplates
+(I0-I3) to a process value with a linear or piecewise linear scaling. read()
+fetches every plate it needs with one pipelined getIall() each; scale() converts
+all loops at once with numpy and checks them:
+    OK          within 4-20 mA
+    UNDER/OVER  outside 4-20 mA but within the loop fault limits (value extrapolated)
+    FAULT_LOW   below 3.8 mA: open loop or failed transmitter (value NaN)
+    FAULT_HIGH  above 20.5 mA: shorted loop or failed transmitter (value NaN)
+
+Usage:
+    from BRIDGEplate import *
+    from BRIDGEtags import Tag, TagTable, linear, OK
+    table = TagTable([
+        Tag("PT101", "CURRENT", 0, 1, linear(0, 10)),		#0-10 bar
+        Tag("TT102", "CURRENT", 0, 2, linear(-50, 150)),		#-50..150 C
+        Tag("LT103", "ADC", 1, "I0", [(4, 0), (12, 40), (20, 100)]),	#piecewise, %
+    ])
+    values, status = table.read()		#arrays in the order of the tags
+    print(dict(zip(table.names, values)), table.faults(status))
+    values, status = table.scale(ma)		#ma: (loops,) or (samples, loops) in mA
+"""
+
+OK=0
+UNDER=1
+OVER=2
+FAULT_LOW=3
+FAULT_HIGH=4
+STATUS=("OK", "UNDER", "OVER", "FAULT_LOW", "FAULT_HIGH")
+SPAN=(4.0, 20.0)						#live zero and full scale, mA
+FAULT=(3.8, 20.5)						#loop fault limits, mA
+PLATES={"CURRENT": 8, "ADC": 4}					#getIall() values per plate
+
+Tag=collections.namedtuple("Tag", "name plate addr channel points")	#points: [(mA, value), ...] ascending mA
+
+def linear(lo, hi):
+    """Scaling points for a transmitter ranged lo at 4 mA to hi at 20 mA"""
+    return ((SPAN[0], lo), (SPAN[1], hi))
+
+def _index(plate, channel):
+    #Position of a channel in the plate's getIall() response
+    if plate=="CURRENT":
+        i=int(channel)-1
+    elif plate=="ADC":
+        i=bp._adcChannel(str(channel))
+        i=i-12 if i>=12 else i				#'I0'..'I3', 12..15 or 0..3
+    else:
+        raise ValueError(f"{plate} has no 4-20 mA inputs")
+    if not 0<=i<PLATES[plate]:
+        raise ValueError(f"invalid {plate} current input {channel}")
+    return i
+
+class TagTable:
+    def __init__(self, tags, span=SPAN, fault=FAULT):
+        self.tags=[t if isinstance(t, Tag) else Tag(*t) for t in tags]
+        self.names=[t.name for t in self.tags]
+        self.span=span
+        self.fault=fault
+        self.sources=sorted({(t.plate, t.addr) for t in self.tags})	#one getIall() each
+        offset={}
+        n=0
+        for source in self.sources:
+            offset[source]=n
+            n+=PLATES[source[0]]
+        self.picks=np.array([offset[(t.plate, t.addr)]+_index(t.plate, t.channel) for t in self.tags], int)
+        k=max(len(t.points) for t in self.tags)
+        self.x=np.full((len(self.tags), k), np.inf)		#breakpoints in mA, padded with inf
+        self.y=np.zeros((len(self.tags), k))
+        self.last=np.empty(len(self.tags), int)			#index of the last segment of each tag
+        for i, t in enumerate(self.tags):
+            points=np.asarray(t.points, float)
+            if len(points)<2 or np.any(np.diff(points[:, 0])<=0):
+                raise ValueError(f"tag {t.name}: need two or more points in ascending mA")
+            self.x[i, :len(points)]=points[:, 0]
+            self.y[i, :len(points)]=points[:, 1]
+            self.last[i]=len(points)-2
+        self.rows=np.arange(len(self.tags))
+
+    def scale(self, ma):
+        """Return (values, status) for raw currents in mA, one column per tag"""
+        ma=np.asarray(ma, float)
+        seg=np.minimum((ma[..., None]>=self.x[:, 1:]).sum(axis=-1), self.last)	#extrapolate on the end segments
+        x0=self.x[self.rows, seg]
+        x1=self.x[self.rows, seg+1]
+        y0=self.y[self.rows, seg]
+        y1=self.y[self.rows, seg+1]
+        values=y0+(ma-x0)*(y1-y0)/(x1-x0)
+        status=np.select([ma<self.fault[0], ma>self.fault[1], ma<self.span[0], ma>self.span[1]],
+                         [FAULT_LOW, FAULT_HIGH, UNDER, OVER], OK).astype(np.int8)
+        values[status>=FAULT_LOW]=np.nan
+        return values, status
+
+    def raw(self):
+        """Currents of all tags in mA, read with one pipelined getIall() per plate"""
+        resps=bp.CMDS([f"{plate}.getIall({addr})" for plate, addr in self.sources])
+        return np.array([v for r in resps for v in bp.parseResp(r)], float)[self.picks]
+
+    def read(self):
+        return self.scale(self.raw())
+
+    def faults(self, status):
+        """{tag name: status name} of the tags that are not OK"""
+        return {self.names[i]: STATUS[status[i]] for i in np.flatnonzero(status)}
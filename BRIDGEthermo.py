@@ -0,0 +1,177 @@
+import sys
+try:
+    import numpy as np
+except ImportError:
+    print("Error: numpy package not found. Install with: pip install numpy")
+    sys.exit(1)
+import BRIDGEplate as bp
+
+"""
+BRIDGEthermo - host side thermocouple linearization
+getTEMPS() reads every thermocouple of a THERMOplate with one pipelined window of
+getRAW() commands plus one getCOLD(), then does the cold junction compensation
+and the NIST ITS-90 type J/K inverse polynomials on the host for all channels at
+once. Any scale comes back without setSCALE() round trips. Thermocouple types
+are read once with getTYPE() and cached; types set with THERMO.setTYPE() in this
+session are picked up without asking the plate.
+
+Usage:
+    from BRIDGEplate import *
+    from BRIDGEthermo import calibrate, getTEMPS, validate
+    calibrate(0)				#fit the plate's mV per getRAW() count once
+    temps = getTEMPS(0)				#channels 1-8 in C, numpy array
+    temps = getTEMPS(0, [1, 2, 3], "f")
+    print(validate(0))				#host minus getTEMP() per channel, C
+
+getRAW() returns the raw ADC value of the thermocouple input (user guide,
+THERMO.getRAW: "Returns: Raw ADC value"); the user guide does not give its scale.
+calibrate() fits the millivolts per count of each plate from getTEMP()/getRAW()
+pairs and getCOLD(), and keeps it only if every channel then agrees with
+getTEMP() within TOLERANCE_C. getTEMPS() refuses to run until that check has
+passed. After THERMO.RESET() call types(addr, refresh=True) to read the types again.
+"""
+
+SCALE={}							#addr -> mV per getRAW() count, set by calibrate()
+MIN_MV=0.2							#channels closer to the cold junction do not set the scale
+TOLERANCE_C=0.5							#largest host minus getTEMP() difference calibrate() accepts
+CHANNELS=range(1, 9)						#thermocouple inputs
+TYPES={}							#(addr, channel) -> "j" or "k" read with getTYPE()
+
+#NIST ITS-90 polynomials, coefficients in increasing powers
+EMF={								#t (C) -> E (mV): [(upper t, coefficients)]
+    "j": [(760.0, (0.0, 5.0381187815e-2, 3.0475836930e-5, -8.5681065720e-8, 1.3228195295e-10,
+                   -1.7052958337e-13, 2.0948090697e-16, -1.2538395336e-19, 1.5631725697e-23)),
+          (1200.0, (2.9645625681e2, -1.4976127786, 3.1787103924e-3, -3.1847686701e-6,
+                    1.5720819004e-9, -3.0691369056e-13))],
+    "k": [(0.0, (0.0, 3.9450128025e-2, 2.3622373598e-5, -3.2858906784e-7, -4.9904828777e-9,
+                 -6.7509059173e-11, -5.7410327428e-13, -3.1088872894e-15, -1.0451609365e-17,
+                 -1.9889266878e-20, -1.6322697486e-23)),
+          (1372.0, (-1.7600413686e-2, 3.8921204975e-2, 1.8558770032e-5, -9.9457592874e-8,
+                    3.1840945719e-10, -5.6072844889e-13, 5.6075059059e-16, -3.2020720003e-19,
+                    9.7151147152e-23, -1.2104721275e-26))]}
+K_EXP=(0.118597600000, -1.18343200000e-4, 126.968600000)	#type K above 0 C: a0*exp(a1*(t-a2)^2)
+INVERSE={							#E (mV) -> t (C): [(upper E, coefficients)]
+    "j": [(0.0, (0.0, 1.9528268e1, -1.2286185, -1.0752178, -5.9086933e-1, -1.7256713e-1,
+                 -2.8131513e-2, -2.3963370e-3, -8.3823321e-5)),
+          (42.919, (0.0, 1.978425e1, -2.001204e-1, 1.036969e-2, -2.549687e-4, 3.585153e-6,
+                    -5.344285e-8, 5.099890e-10)),
+          (69.553, (-3.11358187e3, 3.00543684e2, -9.94773230, 1.70276630e-1, -1.43033468e-3,
+                    4.73886084e-6))],
+    "k": [(0.0, (0.0, 2.5173462e1, -1.1662878, -1.0833638, -8.9773540e-1, -3.7342377e-1,
+                 -8.6632643e-2, -1.0450598e-2, -5.1920577e-4)),
+          (20.644, (0.0, 2.508355e1, 7.860106e-2, -2.503131e-1, 8.315270e-2, -1.228034e-2,
+                    9.804036e-4, -4.413030e-5, 1.057734e-6, -1.052755e-8)),
+          (54.886, (-1.318058e2, 4.830222e1, -1.646031, 5.464731e-2, -9.650715e-4, 8.802193e-6,
+                    -3.110810e-8))]}
+
+def _piecewise(x, ranges):
+    #Evaluate the polynomial of the range each x falls in (the last one beyond the top)
+    x=np.asarray(x, float)
+    bounds=[upper for upper, coeffs in ranges[:-1]]
+    pick=np.searchsorted(bounds, x)
+    out=np.empty_like(x)
+    for i, (upper, coeffs) in enumerate(ranges):
+        sel=pick==i
+        out[sel]=np.polynomial.polynomial.polyval(x[sel], coeffs)
+    return out
+
+def emf(t, tcType):
+    """Thermocouple EMF in mV at t degrees C (vectorized)"""
+    tcType=str(tcType).lower()
+    e=_piecewise(t, EMF[tcType])
+    if tcType=="k":
+        a0, a1, a2=K_EXP
+        t=np.asarray(t, float)
+        e=e+np.where(t>0, a0*np.exp(a1*np.square(t-a2)), 0.0)
+    return e
+
+def temperature(mv, tcType):
+    """Temperature in C of a thermocouple EMF in mV relative to 0 C (vectorized)"""
+    return _piecewise(mv, INVERSE[str(tcType).lower()])
+
+def convert(c, scale):
+    """Degrees C to scale c, f or k"""
+    scale=str(scale).lower()
+    if scale=="f":
+        return c*9/5+32
+    if scale=="k":
+        return c+273.15
+    if scale=="c":
+        return c
+    raise ValueError(f"invalid scale {scale!r}")
+
+def types(addr, channels=CHANNELS, refresh=False):
+    """Thermocouple type of each channel, from setTYPE() calls, the cache or getTYPE()"""
+    out={}
+    ask=[]
+    for ch in channels:
+        lines=bp.STATE.get(("THERMO.setTYPE", (str(addr), str(ch))))
+        if lines:
+            TYPES[(addr, ch)]=lines[-1].rstrip(")").rpartition(",")[2].strip(" '\"").lower()
+        elif refresh or (addr, ch) not in TYPES:
+            ask.append(ch)
+    for ch, resp in zip(ask, bp.CMDS([f"THERMO.getTYPE({addr},{ch})" for ch in ask])):
+        TYPES[(addr, ch)]=str(bp.parseResp(resp)).strip(" '\"").lower()
+    for ch in channels:
+        out[ch]=TYPES[(addr, ch)]
+    return out
+
+def _linearize(addr, channels, raws, cold):
+    #Cold junction compensated temperatures in C from getRAW() and getCOLD() responses
+    if addr not in SCALE:
+        raise ValueError(f"raw scale of THERMOplate {addr} unknown: call calibrate({addr}) first")
+    tc=types(addr, channels)
+    mv=np.array([float(bp.parseResp(r)) for r in raws])*SCALE[addr]
+    cold=float(bp.parseResp(cold))
+    c=np.empty(len(channels))
+    for tcType in set(tc.values()):
+        sel=np.array([tc[ch]==tcType for ch in channels])
+        c[sel]=temperature(mv[sel]+emf(cold, tcType), tcType)
+    return c
+
+def getTEMPS(addr, channels=CHANNELS, scale="c"):
+    """Temperatures of thermocouple channels from getRAW() and getCOLD(), numpy array in scale"""
+    channels=list(channels)
+    if addr not in SCALE:
+        raise ValueError(f"raw scale of THERMOplate {addr} unknown: call calibrate({addr}) first")
+    types(addr, channels)
+    resps=bp.CMDS([f"THERMO.getRAW({addr},{ch})" for ch in channels]+[f"THERMO.getCOLD({addr},c)"])
+    return convert(_linearize(addr, channels, resps[:-1], resps[-1]), scale)
+
+def _pairs(addr, channels):
+    #getTEMP() in C, getRAW() and getCOLD() responses; each getRAW() directly follows
+    #the channel's getTEMP() so both see the same temperature
+    cmds=[]
+    for ch in channels:
+        cmds+=[f"THERMO.getTEMP({addr},{ch},c)", f"THERMO.getRAW({addr},{ch})"]
+    resps=bp.CMDS(cmds+[f"THERMO.getCOLD({addr},c)"])
+    return np.array([float(bp.parseResp(r)) for r in resps[0:-1:2]]), resps[1:-1:2], resps[-1]
+
+def calibrate(addr, channels=CHANNELS):
+    """Fit the mV per getRAW() count of a THERMOplate to its own getTEMP() readings.
+    Needs a channel at least MIN_MV from the cold junction; the scale is kept only if
+    every channel then agrees with getTEMP() within TOLERANCE_C. Returns the scale."""
+    channels=list(channels)
+    tc=types(addr, channels)
+    plate, raws, cold=_pairs(addr, channels)
+    counts=np.array([float(bp.parseResp(r)) for r in raws])
+    coldC=float(bp.parseResp(cold))
+    mv=np.array([float(emf(t, tc[ch])-emf(coldC, tc[ch])) for ch, t in zip(channels, plate)])
+    use=np.abs(mv)>=MIN_MV
+    if not use.any():
+        raise ValueError(f"no channel of THERMOplate {addr} is {MIN_MV} mV from the cold junction: cannot fit the raw scale")
+    SCALE.pop(addr, None)
+    scale=float(np.dot(mv[use], counts[use])/np.dot(counts[use], counts[use]))	#least squares through zero
+    SCALE[addr]=scale
+    worst=np.max(np.abs(_linearize(addr, channels, raws, cold)-plate))
+    if not worst<=TOLERANCE_C:
+        del SCALE[addr]
+        raise ValueError(f"THERMOplate {addr} raw readings disagree with getTEMP() by {worst:.3g} C: raw scale not set")
+    return scale
+
+def validate(addr, channels=CHANNELS):
+    """Host temperatures minus the plate's getTEMP() in C, one per channel"""
+    channels=list(channels)
+    types(addr, channels)
+    plate, raws, cold=_pairs(addr, channels)
+    return _linearize(addr, channels, raws, cold)-plate
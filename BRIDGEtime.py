@@ -0,0 +1,116 @@
+import collections
+import statistics
+import sys
+try:
+    import numpy as np
+except ImportError:
+    print("Error: numpy package not found. Install with: pip install numpy")
+    sys.exit(1)
+import BRIDGEplate as bp
+
+"""
+BRIDGEtime - timestamped readings and time alignment across plates
+timed() calls any plate function and returns a Reading with the value, the
+time.monotonic() the command was sent and its response received, and an
+estimate of when the plate actually took the sample. The estimate is the
+midpoint of the time the plate was busy with the command: the round trip minus
+the link cost of the command and its response.
+
+The link is USB CDC, where the baud rate setting does nothing and the round trip
+is set by USB frame scheduling rather than by bit times. calibrate() therefore
+fits the link cost from measured lastTIMING() round trips of commands the plate
+answers at once: a fixed latency plus a per-byte cost of the response, found by
+a least squares fit over the response sizes seen (latency only when the sizes
+hardly differ). fit() takes round trips collected elsewhere.
+
+resample() interpolates series from several plates onto one common timebase.
+
+Usage:
+    from BRIDGEplate import *
+    from BRIDGEtime import timed, calibrate, series, resample, timebase
+    calibrate()				#fit the link latency once
+    r = timed(THERMO.getTEMP, 0, 1, "c")
+    print(r.value, r.t, r.rtt)
+    temps = [timed(THERMO.getTEMP, 0, 1, "c") for i in range(20)]
+    amps = [timed(CURRENT.getIall, 0) for i in range(200)]
+    t = timebase([series(temps), series(amps)], rate=10)
+    temp, current = resample([series(temps), series(amps)], t)
+"""
+
+class Reading(collections.namedtuple("Reading", "value sent received t")):	#t: estimated acquisition time
+    __slots__=()
+
+    @property
+    def rtt(self):
+        return self.received-self.sent
+
+QUICK=("BRIDGE.getSRQ()", "BRIDGE.getFWrev()", "BRIDGE.getID()")	#answered at once, responses of different sizes
+MIN_SPREAD=8							#response size range, bytes, needed to fit a per-byte cost
+
+class LinkModel:
+    def __init__(self, latency=0.0, perByte=0.0):
+        self.latency=latency					#round trip of an empty response, seconds
+        self.perByte=perByte					#added round trip per response byte, seconds
+        self.samples=0
+
+    def calibrate(self, n=20, cmds=QUICK):
+        """Fit the link cost to n round trips of each quick command; returns the latency in seconds"""
+        timings=[]
+        for i in range(n):
+            for cmd in cmds:
+                bp.CMD(cmd)
+                timings.append(bp.lastTIMING())
+        return self.fit(timings)
+
+    def fit(self, timings):
+        """Fit latency and perByte to lastTIMING() tuples (sent, received, size) of commands the
+        plate answers at once; returns the latency in seconds"""
+        a=np.asarray(timings, float).reshape(-1, 3)
+        rtt, size=a[:, 1]-a[:, 0], a[:, 2]
+        sizes=np.unique(size)
+        self.perByte=0.0
+        if len(sizes)>1 and sizes[-1]-sizes[0]>=MIN_SPREAD:
+            typical=[np.median(rtt[size==n]) for n in sizes]	#medians: a slow USB frame is not a slope
+            self.perByte=max(np.polyfit(sizes, typical, 1)[0], 0.0)
+        self.latency=max(statistics.median(rtt-self.perByte*size), 0.0)
+        self.samples=len(a)
+        return self.latency
+
+    def acquired(self, sent, received, size):
+        """Estimated time the plate took the sample of a command sent and answered at these times"""
+        busy=max(received-sent-self.latency-size*self.perByte, 0.0)
+        return sent+self.latency/2+busy/2
+
+LINK=LinkModel()
+
+def calibrate(n=20):
+    return LINK.calibrate(n)
+
+def timed(func, *args, model=LINK):
+    """Call a plate function, e.g. timed(ADC.getADC, 0, 1), and return a Reading"""
+    value=func(*args)
+    sent, received, size=bp.lastTIMING()
+    return Reading(value, sent, received, model.acquired(sent, received, size))
+
+def series(readings):
+    """Return (times, values) arrays from a list of Readings; list values become columns"""
+    t=np.fromiter((r.t for r in readings), float, len(readings))
+    return t, np.asarray([r.value for r in readings], float)
+
+def timebase(data, rate):
+    """Common sample times at rate per second over the span all series cover"""
+    start=max(t[0] for t, v in data)
+    stop=min(t[-1] for t, v in data)
+    if stop<=start:
+        raise ValueError("the series do not overlap in time")
+    return start+np.arange(int((stop-start)*rate)+1)/rate
+
+def resample(data, t):
+    """Linearly interpolate each (times, values) series onto times t; returns one array per series"""
+    out=[]
+    for ts, vs in data:
+        if vs.ndim==1:
+            out.append(np.interp(t, ts, vs))
+        else:
+            out.append(np.column_stack([np.interp(t, ts, vs[:, i]) for i in range(vs.shape[1])]))
+    return out
@@ -0,0 +1,84 @@
+import os
+import sys
+import threading
+import unittest
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import BRIDGEplate as bp
+from BRIDGEemulator import Emulator
+from BRIDGEsupervisor import Supervisor
+
+"""
+Regression tests for the command transport: after a command or a pipelined window
+is cancelled, times out or loses a reply, the next responses must still belong to
+the next commands. Runs against BRIDGEemulator at real-time latencies (THERMO.getTEMP
+takes about 0.6 s), so the slow reads below are still pending when they are abandoned.
+
+Usage:
+    python -m pytest -q tests
+"""
+
+TEMPS=[f"THERMO.getTEMP(0,{ch},c)" for ch in range(1, 5)]
+
+class Transport(unittest.TestCase):
+    def setUp(self):
+        self.emu=Emulator({"THERMO": [0], "RELAY": [1]})
+        self.emu.connect()
+        self.assertEqual(bp.CMD("RELAY.getADDR(1)"), "1")
+
+    def tearDown(self):
+        bp.setSUPERVISOR(None)
+        self.emu.stop()
+
+    def cancelAfter(self, seconds):
+        timer=threading.Timer(seconds, bp.cancelCMD)
+        timer.start()
+        self.addCleanup(timer.cancel)
+
+    def assertInStep(self):
+        #Each reply must answer its own command, however late the abandoned ones are
+        for i in range(3):
+            self.assertEqual(bp.CMD("RELAY.getADDR(1)"), "1")
+            self.assertEqual(bp.CMD("BRIDGE.getID()"), "Pi-Plates BRIDGEplate")
+        self.assertEqual(bp.CMDS(["RELAY.getADDR(1)", "THERMO.getTYPE(0,1)"]), ["1", "k"])
+
+    def test_cancelled_command(self):
+        self.cancelAfter(0.2)
+        with self.assertRaises(bp.CMDcancelled):
+            bp.CMD("THERMO.getTEMP(0,1,c)")
+        self.assertInStep()
+
+    def test_timed_out_command(self):
+        with self.assertRaises(bp.CMDtimeout):
+            bp.CMD("THERMO.getTEMP(0,1,c)", deadline=0.1, retries=0)
+        self.assertInStep()
+
+    def test_lost_reply(self):
+        self.emu.drop("RELAY.getADDR", bp.RETRIES+1)
+        with self.assertRaises(bp.CMDtimeout):
+            bp.CMD("RELAY.getADDR(1)")
+        self.assertInStep()
+
+    def test_cancelled_window(self):
+        self.cancelAfter(0.2)
+        with self.assertRaises(bp.CMDcancelled):
+            bp.CMDS(TEMPS)
+        self.assertInStep()
+
+    def test_cancelled_window_supervised(self):
+        Supervisor(finder=lambda: self.emu.port, log=lambda *args: None).start()
+        self.cancelAfter(0.2)
+        with self.assertRaises(bp.CMDcancelled):
+            bp.CMDS(TEMPS)
+        self.assertInStep()
+
+    def test_window_lost_reply(self):
+        self.emu.drop("THERMO.getTEMP")
+        resps=bp.CMDS(TEMPS[:2]+["RELAY.getADDR(1)"])
+        self.assertEqual(len(resps), 3)
+        self.assertEqual(resps[2], "1")
+        for resp in resps[:2]:
+            self.assertGreater(float(resp), 0.0)
+        self.assertInStep()
+
+if __name__ == "__main__":
+    unittest.main()